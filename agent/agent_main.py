@@ -6,10 +6,20 @@ import argparse
 import logging
 import sounddevice as sd
 from threading import Thread
+from typing import Callable, Optional
 from agent import server as controller_server
-from agent.memory.wp_client import get_latest_brain_post
+from agent.memory import brain_cache, wp_client
+from agent import decision_engine
 from agent.decision_engine import respond
-from agent.speech.voice_loop import run_voice_loop, AssemblyAIClient
+from agent.config.settings import (
+    CANNED_MIN_SCORE, KNOWLEDGE_MIN_SCORE, MEMORY_FLUSH_ITEMS, MEMORY_FLUSH_S, MEMORY_SYNC_S, MEMORY_WRITE_BACK,
+)
+from agent.intents import ROUTER
+from agent.memory.dialogue_index import DialogueIndex
+from agent.speech.voice_loop import run_voice_loop, AssemblyAIClient, listen_once_auto_v2
+from agent.speech.offline_queue import describe as describe_offline_queue
+from agent.speech.stt_backends import WHISPER_AVAILABLE
+from agent.speech.wake_spotter import ENROLL_CLIPS, WakeSpotter
 from agent.utils.logger import get_logger
 
 log = get_logger("agent_main")
@@ -20,12 +30,15 @@ os.makedirs(LOG_DIR, exist_ok=True)
 LOG_PATH = os.path.join(LOG_DIR, "agent.log")
 SETTINGS_PATH = os.path.join(LOG_DIR, "settings.json")
 HISTORY_PATH = os.path.join(LOG_DIR, "history.json")
+WAKE_TEMPLATES_PATH = os.path.join(LOG_DIR, "wake_templates.npz")
 
 _last_transcript = None  # type: ignore
 _last_reply = None       # type: ignore
 _history: list[tuple[str, str]] = []
 _macros: list[tuple[re.Pattern[str], str]] = []
 STATUS_LINE = ""         # set in main()
+DIALOGUE = DialogueIndex(min_score=CANNED_MIN_SCORE, knowledge_min_score=KNOWLEDGE_MIN_SCORE)
+MEMORY_WRITER: Optional[wp_client.MemoryWriter] = None   # set in main() when WordPress credentials are configured
 RUNTIME_STATE = {
     "mode": None,
     "wake_word": None,
@@ -107,83 +120,118 @@ def reload_macros_from_files() -> int:
     _macros = _load_macros()
     return len(_macros)
 
-def generate_text(user_text: str) -> str:
-    """Generate a response to the user's input using the decision engine."""
+def _cmd_repeat(slots: dict) -> str:
+    if _last_transcript or _last_reply:
+        return (
+            "[repeat] Previous transcript:\n"
+            + f"[you ] {_last_transcript or ''}\n"
+            + "[repeat] Previous reply:\n"
+            + f"[agent] {_last_reply or ''}"
+        )
+    return "[repeat] Nothing to repeat yet."
+
+
+def _cmd_help(slots: dict) -> str:
+    return (
+        "[help] Say 'agent status' | 'agent repeat last' | "
+        "'set threshold to 1100' | 'disable wake word'.\n"
+        "[help] You can also say 'agent history last 5' or 'agent audio device' or 'agent save settings'.\n"
+        "[help] Custom macros: edit agent/config/macros.json or logs/macros.json and say 'agent reload macros'."
+    )
+
+
+def _cmd_history(slots: dict) -> str:
+    n = int(slots.get("n") or 5)
+    items = _history[-n:]
+    if not items:
+        return "[history] No interactions yet."
+    lines = ["[history] Recent interactions:"]
+    for i, (q, a) in enumerate(items, 1):
+        lines.append(f"{i}. you: {q}")
+        lines.append(f"   agent: {a}")
+    return "\n".join(lines)
+
+
+def _cmd_save_settings(slots: dict) -> str:
     try:
-        global _last_transcript, _last_reply, _history
+        s = _load_settings()
+        s.update({
+            "wake_word": RUNTIME_STATE.get("wake_word"),
+            "threshold": RUNTIME_STATE.get("threshold"),
+            "device": RUNTIME_STATE.get("device"),
+        })
+        _save_settings(s)
+        return "[settings] Saved current settings to settings.json"
+    except Exception:
+        return "[settings] Failed to save settings"
 
-        # Handle built-in commands locally (no model call)
-        t_norm = (user_text or "").strip().lower()
-        if t_norm in ("agent repeat", "agent repeat last", "repeat last", "repeat"):
-            if _last_transcript or _last_reply:
-                return (
-                    "[repeat] Previous transcript:\n"
-                    + f"[you ] {_last_transcript or ''}\n"
-                    + "[repeat] Previous reply:\n"
-                    + f"[agent] {_last_reply or ''}"
-                )
-            return "[repeat] Nothing to repeat yet."
-
-        if t_norm in ("agent status", "status"):
-            return build_status()
-
-        if t_norm in ("agent help", "help"):
-            return (
-                "[help] Say 'agent status' | 'agent repeat last' | "
-                "'set threshold to 1100' | 'disable wake word'.\n"
-                "[help] You can also say 'agent history last 5' or 'agent audio device' or 'agent save settings'.\n"
-                "[help] Custom macros: edit agent/config/macros.json or logs/macros.json and say 'agent reload macros'."
-            )
 
-        # History: 'agent history last N' or 'agent history'
-        import re as _re
-        m = _re.match(r"^(?:agent\s+)?history(?:\s+last\s+(\d+))?$", t_norm)
-        if m:
-            try:
-                n = int(m.group(1)) if m.group(1) else 5
-            except Exception:
-                n = 5
-            items = _history[-n:]
-            if not items:
-                return "[history] No interactions yet."
-            lines = ["[history] Recent interactions:"]
-            for i, (q, a) in enumerate(items, 1):
-                lines.append(f"{i}. you: {q}")
-                lines.append(f"   agent: {a}")
-            return "\n".join(lines)
-
-        if t_norm in ("agent save settings", "save settings"):
-            try:
-                s = _load_settings()
-                s.update({
-                    "wake_word": RUNTIME_STATE.get("wake_word"),
-                    "threshold": RUNTIME_STATE.get("threshold"),
-                    "device": RUNTIME_STATE.get("device"),
-                })
-                _save_settings(s)
-                return "[settings] Saved current settings to settings.json"
-            except Exception:
-                return "[settings] Failed to save settings"
+def _cmd_reload_macros(slots: dict) -> str:
+    try:
+        global _macros
+        _macros = _load_macros()
+        return f"[macros] Reloaded {_macros and len(_macros) or 0} macro(s)"
+    except Exception:
+        return "[macros] Failed to reload macros"
 
-        if t_norm in ("agent reload macros", "reload macros"):
-            try:
-                global _macros
-                _macros = _load_macros()
-                return f"[macros] Reloaded {_macros and len(_macros) or 0} macro(s)"
-            except Exception:
-                return "[macros] Failed to reload macros"
 
-        if t_norm in ("agent audio device", "audio device"):
-            try:
-                idx = RUNTIME_STATE.get("device")
-                name = 'default'
-                if idx is not None:
-                    name = sd.query_devices(idx)['name']
-                else:
-                    name = sd.query_devices(None)['name']
-                return f"[audio] Input device: {name} (index={idx if idx is not None else 'default'})"
-            except Exception:
-                return "[audio] Input device: default"
+def _cmd_stop(slots: dict) -> str:
+    if decision_engine.cancel():
+        return "[stop] Stopped the current reply."
+    return "[stop] Nothing to stop."
+
+
+def _cmd_new_conversation(slots: dict) -> str:
+    decision_engine.reset_session()
+    return "[conversation] Starting a new conversation."
+
+
+def _cmd_audio_device(slots: dict) -> str:
+    try:
+        idx = RUNTIME_STATE.get("device")
+        name = 'default'
+        if idx is not None:
+            name = sd.query_devices(idx)['name']
+        else:
+            name = sd.query_devices(None)['name']
+        return f"[audio] Input device: {name} (index={idx if idx is not None else 'default'})"
+    except Exception:
+        return "[audio] Input device: default"
+
+
+# Handlers for the "builtin" intents in agent/intents.py
+BUILTINS: dict[str, Callable[[dict], str]] = {
+    "repeat": _cmd_repeat,
+    "status": lambda slots: build_status(),
+    "help": _cmd_help,
+    "history": _cmd_history,
+    "save_settings": _cmd_save_settings,
+    "reload_macros": _cmd_reload_macros,
+    "stop": _cmd_stop,
+    "new_conversation": _cmd_new_conversation,
+    "audio_device": _cmd_audio_device,
+}
+
+
+_NOT_REMEMBERED = (decision_engine.ERROR_REPLY, decision_engine.TIMEOUT_REPLY, decision_engine.MISSING_REPLY,
+                   decision_engine.CANCELLED_REPLY)
+
+
+def generate_text(user_text: str, on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """Generate a response to the user's input using the decision engine.
+
+    on_chunk, if given, receives the model's reply sentence by sentence as it
+    is generated (built-in commands and canned replies answer without calling it).
+    """
+    try:
+        global _last_transcript, _last_reply, _history
+
+        # Built-in commands are answered locally (no model call); see agent/intents.py
+        m = ROUTER.match(user_text, group="builtin")
+        ROUTER.record(m)
+        RUNTIME_STATE.setdefault('perf', {})['intents'] = ROUTER.stats()
+        if m is not None:
+            return BUILTINS[m.intent](m.slots)
 
         # Apply macros (regex rewrite) before fetching memory or calling model
         text_for_model = user_text
@@ -196,10 +244,29 @@ def generate_text(user_text: str) -> str:
                     text_for_model = user_text
                 break
 
-        brain = get_latest_brain_post()
-        mood = (brain.get("acf") or {}).get("agent_emotions")
-        persona = (brain.get("acf") or {}).get("agent_personality")
-        reply = respond(text_for_model, mood=mood, persona=persona)
+        brain = brain_cache.get_brain()      # last good snapshot; refreshed in the background
+        acf = brain.get("acf") or {}
+        mood = acf.get("agent_emotions")
+        persona = acf.get("agent_personality")
+
+        # Close matches to agent_dialogue / agent_knowledge are answered from the post itself
+        hit = None
+        try:
+            DIALOGUE.update(acf)
+            hit = DIALOGUE.lookup(text_for_model)
+            RUNTIME_STATE.setdefault('perf', {})['canned'] = DIALOGUE.stats()
+        except Exception as e:
+            log.warning(f"Dialogue index unavailable: {e}")
+        if hit is not None:
+            log.info(f"Canned reply from {hit.field} (score {hit.score:.2f}, {hit.us:.0f} us)")
+            reply = hit.reply
+        else:
+            reply = respond(text_for_model, mood=mood, persona=persona, on_chunk=on_chunk,
+                            deadline_s=RUNTIME_STATE.get('gen_deadline_s'))
+            try:
+                RUNTIME_STATE.setdefault('perf', {})['context'] = decision_engine.session_stats()
+            except Exception:
+                pass
 
         # Save last + log the interaction
         _last_transcript = user_text
@@ -210,6 +277,8 @@ def generate_text(user_text: str) -> str:
         if len(_history) > 20:
             _history = _history[-20:]
         _save_history(_history, limit=50)
+        if MEMORY_WRITER is not None and reply not in _NOT_REMEMBERED:
+            MEMORY_WRITER.add(user_text, reply)     # queued; written to WordPress in the background
 
         return reply
     except Exception as e:
@@ -240,10 +309,55 @@ def main():
                       help='Use webrtcvad for voice activity detection when available')
     parser.add_argument('--verbosity', choices=['quiet','normal','verbose'], default='normal',
                       help='Console verbosity for prompts and cues')
+    parser.add_argument('--stt', choices=['batch','stream','local'], default='batch',
+                      help='Speech-to-text mode: batch (upload after capture), stream (real-time WebSocket) '
+                           'or local (offline CPU model, needs faster-whisper). Default: batch')
+    parser.add_argument('--stt-threads', type=int, default=None,
+                      help='CPU threads for --stt local (default: up to 4)')
+    parser.add_argument('--stt-completion', choices=['adaptive','fixed','webhook'], default='adaptive',
+                      help='How batch transcripts are awaited: adaptive polling, fixed 800 ms polling, or '
+                           'webhook callbacks to /api/stt/webhook (needs AAI_WEBHOOK_URL). Default: adaptive')
+    parser.add_argument('--stt-deadline', type=float, default=24.0,
+                      help='Seconds a batch STT turn may take (upload + transcription) before it is dropped. Default: 24')
+    parser.add_argument('--no-stt-hedge', action='store_true',
+                      help='Never send a duplicate transcript job for a slow batch STT request')
+    parser.add_argument('--no-offline-queue', action='store_true',
+                      help='Drop utterances when AssemblyAI is unreachable instead of saving them to logs/stt_queue '
+                           'and running them once the connection returns')
+    parser.add_argument('--stt-encoding', choices=['wav','flac','mulaw'], default='wav',
+                      help='Upload format for batch STT: wav (16-bit), flac (lossless, needs soundfile) '
+                           'or mulaw (8-bit, half size). Default: wav')
+    parser.add_argument('--no-trim', action='store_true',
+                      help='Upload utterances untrimmed (keep leading/trailing silence)')
+    parser.add_argument('--no-persistent-capture', action='store_true',
+                      help='Open the microphone per utterance instead of keeping one stream open for the session')
+    parser.add_argument('--no-stream-reply', action='store_true',
+                      help='Print the reply only once it is complete instead of sentence by sentence')
+    parser.add_argument('--gen-deadline', type=float, default=None,
+                      help='Seconds the model may take for one reply before it is stopped. Default: ENGINE_TIMEOUT_S (120)')
+    parser.add_argument('--no-barge-in', action='store_true',
+                      help="Let a reply finish even when a new 'agent ...' command is spoken meanwhile")
+    parser.add_argument('--no-pipeline', action='store_true',
+                      help='Run listen -> transcribe -> generate strictly in sequence (no overlapping turns; '
+                           'needs --no-barge-in, since nothing is heard while a reply is generated)')
+    parser.add_argument('--no-native-rate', action='store_true',
+                      help='Open the microphone at 16 kHz instead of its native rate (resampled in-process)')
+    parser.add_argument('--preroll-ms', type=int, default=300,
+                      help='Audio kept from before speech onset / PTT key press (ms). Default: 300')
+    parser.add_argument('--fixed-threshold', action='store_true',
+                      help='Use --threshold as a fixed speech level instead of tracking the noise floor (auto mode)')
+    parser.add_argument('--no-adaptive-endpoint', action='store_true',
+                      help='Always wait the fixed 800 ms of silence to end an utterance (auto mode)')
+    parser.add_argument('--enroll-wake', action='store_true',
+                      help=f'Record the wake word {ENROLL_CLIPS} times to enable on-device wake spotting, then exit')
+    parser.add_argument('--no-wake-spotter', action='store_true',
+                      help='Do not gate uploads with the enrolled on-device wake spotter')
     parser.add_argument('--training', action='store_true',
                       help='Show a short training walkthrough and exit')
     
     args = parser.parse_args()
+    if args.no_pipeline and not args.no_barge_in:
+        parser.error("barge-in needs the pipelined loop: use --no-pipeline together with --no-barge-in")
     
     # Set up logging (console via basicConfig already in get_logger)
     # Add rotating file handler for agent.log
@@ -266,8 +380,43 @@ def main():
     except Exception:
         pass
 
-    # Check for AssemblyAI API key
-    if not os.getenv("ASSEMBLYAI_API_KEY"):
+    # Optional: enroll the on-device wake spotter (no API key needed)
+    if args.enroll_wake:
+        try:
+            saved = {} if args.no_settings else _load_settings()
+            word = args.wake_word
+            if word == 'agent' and saved.get('wake_word'):
+                word = saved['wake_word']
+            if not word:
+                print("[enroll] No wake word set; pass --wake-word.")
+                return
+            threshold = args.threshold
+            if threshold == 900 and isinstance(saved.get('threshold'), int):
+                threshold = saved['threshold']
+            print(f"\n[enroll] Say '{word}' on its own after each prompt ({ENROLL_CLIPS} times).")
+            clips = []
+            while len(clips) < ENROLL_CLIPS:
+                print(f"[enroll] {len(clips) + 1}/{ENROLL_CLIPS}: say '{word}'")
+                audio = listen_once_auto_v2(device=args.device, threshold=threshold, verbosity='quiet')
+                if len(audio) < 16000 * 0.2:
+                    print("[enroll] Too short, try again.")
+                    continue
+                clips.append(audio)
+            spotter = WakeSpotter.enroll(word, clips)
+            spotter.save(WAKE_TEMPLATES_PATH)
+            print(f"[enroll] Saved wake templates to {WAKE_TEMPLATES_PATH} (threshold {spotter.threshold:.2f})")
+        except Exception as e:
+            log.error(f"Wake enrollment failed: {e}")
+            print(f"[enroll] Error: {e}")
+        return
+
+    # Check for AssemblyAI API key (not needed for offline STT, unless it would fall back to batch)
+    if args.stt == 'local' and not WHISPER_AVAILABLE and not os.getenv("ASSEMBLYAI_API_KEY"):
+        log.error("faster-whisper not installed and ASSEMBLYAI_API_KEY not set")
+        print("\nError: --stt local needs faster-whisper (pip install faster-whisper);")
+        print("without it the agent falls back to AssemblyAI, which needs ASSEMBLYAI_API_KEY.")
+        return
+    if args.stt != 'local' and not os.getenv("ASSEMBLYAI_API_KEY"):
         log.error("ASSEMBLYAI_API_KEY environment variable not set")
         print("\nError: ASSEMBLYAI_API_KEY environment variable is required.")
         print("Please set it in your .env file or environment variables.")
@@ -278,12 +427,19 @@ def main():
         try:
             print("\n[calibrate] Sampling ambient audio for 2 seconds...")
             import numpy as _np
+            from agent.speech.resample import resample
             dur_s = 2.0
             sr = 16000
-            n = int(sr * dur_s)
-            data = sd.rec(n, samplerate=sr, channels=1, dtype='int16', device=args.device)
+            rate = sr
+            if not args.no_native_rate:  # measure the same signal the voice loop sees
+                try:
+                    rate = int(sd.query_devices(args.device, 'input')['default_samplerate'])
+                except Exception:
+                    pass
+            n = int(rate * dur_s)
+            data = sd.rec(n, samplerate=rate, channels=1, dtype='int16', device=args.device)
             sd.wait()
-            x = data.reshape(-1).astype(_np.int32)
+            x = resample(data.reshape(-1), rate, sr).astype(_np.int32)
             rms = float((_np.sqrt(_np.mean((x * x)))))
             # Suggest threshold as 2.5x ambient RMS, clamped
             rec = int(max(600, min(2000, rms * 2.5)))
@@ -313,8 +469,8 @@ def main():
         print("[help] Say 'agent status' or 'agent repeat last'.")
         print("[help] Adjust sensitivity with 'set threshold to 1100' or change wake word.")
 
-        # Spoken-friendly status line for screen readers
-        global STATUS_LINE, RUNTIME_STATE
+        # Spoken-friendly status line for screen readers (module-level, so 'agent status' and /api/status can rebuild it)
+        global STATUS_LINE, RUNTIME_STATE, build_status, MEMORY_WRITER
 
         def _device_name(idx):
             try:
@@ -331,9 +487,14 @@ def main():
             inp = _device_name(RUNTIME_STATE.get("device"))
             vad = 'webrtc' if args.use_webrtcvad else 'amplitude'
             vb = args.verbosity
+            stt = RUNTIME_STATE.get("stt") or args.stt
+            if RUNTIME_STATE.get("adaptive_threshold"):
+                th = f"auto (~{(RUNTIME_STATE.get('perf') or {}).get('vad', {}).get('start', th)})"
+            queued = describe_offline_queue((RUNTIME_STATE.get('perf') or {}).get('stt_queue'))
             return (
                 f"[status] Mode: {mode}  | Wake word: {ww or 'OFF'}  | TTS: OFF  | "
-                f"Model: qwen2.5 via Goose  | Input: {inp}  | Threshold: {th}  | VAD: {vad}  | Verbosity: {vb}"
+                f"Model: {decision_engine.describe()}  | Input: {inp}  | Threshold: {th}  | VAD: {vad}  | STT: {stt}  | Verbosity: {vb}"
+                + (f"  | Offline: {queued}" if queued else "")
             )
 
         # Initialize runtime state (apply persisted settings if present and not overridden)
@@ -367,7 +528,11 @@ def main():
             "device": device,
             "use_webrtcvad": use_vad,
             "verbosity": verbosity,
-            "perf": {"stt": {"count":0, "total_ms":0, "last_ms":0}, "gen": {"count":0, "total_ms":0, "last_ms":0}},
+            "stt": args.stt,
+            "adaptive_threshold": not args.fixed_threshold,
+            "gen_deadline_s": args.gen_deadline,
+            "perf": {"stt": {"count":0, "total_ms":0, "last_ms":0}, "gen": {"count":0, "total_ms":0, "last_ms":0},
+                     "upload": {"count":0, "raw_bytes":0, "sent_bytes":0, "saved_bytes":0}},
         })
 
         STATUS_LINE = build_status()
@@ -386,6 +551,24 @@ def main():
             print("[settings] Saved current settings to settings.json. Exiting.")
             return
 
+        wake_spotter = None
+        if not args.no_wake_spotter and os.path.isfile(WAKE_TEMPLATES_PATH):
+            try:
+                wake_spotter = WakeSpotter.load(WAKE_TEMPLATES_PATH)
+            except Exception as e:
+                log.warning(f"Could not load wake templates: {e}")
+
+        # Start the decision-engine worker(s) now, so the model is loaded before the first command
+        Thread(target=decision_engine.start, daemon=True).start()
+        brain_cache.start()
+        memory = decision_engine.get_memory()
+        if memory is not None:
+            memory.start(MEMORY_SYNC_S)
+        if MEMORY_WRITE_BACK and wp_client.can_write():
+            MEMORY_WRITER = wp_client.MemoryWriter(MEMORY_FLUSH_ITEMS, MEMORY_FLUSH_S,
+                                                   on_written=memory.upsert if memory is not None else None)
+            MEMORY_WRITER.start()
+
         # Start controller server in background
         try:
             Thread(target=controller_server.run, daemon=True).start()
@@ -403,12 +586,33 @@ def main():
             state=RUNTIME_STATE,
             use_webrtcvad=args.use_webrtcvad,
             verbosity=args.verbosity,
+            stt_mode=args.stt,
+            persistent_capture=not args.no_persistent_capture,
+            preroll_ms=args.preroll_ms,
+            stt_completion=args.stt_completion,
+            trim_silence=not args.no_trim,
+            stt_encoding=args.stt_encoding,
+            stt_threads=args.stt_threads,
+            wake_spotter=wake_spotter,
+            adaptive_endpoint=not args.no_adaptive_endpoint,
+            adaptive_threshold=not args.fixed_threshold,
+            native_rate=not args.no_native_rate,
+            pipelined=not args.no_pipeline,
+            stt_deadline_s=args.stt_deadline,
+            stt_hedge=not args.no_stt_hedge,
+            offline_dir=None if args.no_offline_queue else os.path.join(LOG_DIR, "stt_queue"),
+            stream_reply=not args.no_stream_reply,
+            cancel_generation=None if args.no_barge_in else decision_engine.cancel,
         )
 
     except KeyboardInterrupt:
         log.info("Shutting down...")
     except Exception as e:
         log.error(f"Fatal error: {e}", exc_info=True)
+    finally:
+        if MEMORY_WRITER is not None:
+            MEMORY_WRITER.stop(flush=True)
+        decision_engine.stop()
 
 if __name__ == "__main__":
     main()
@@ -26,12 +26,30 @@ def _secret(name: str, default: str = "") -> str:
 GOOSE_PROVIDER = os.getenv("GOOSE_PROVIDER", "ollama")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5")
+ENGINE_BACKEND = os.getenv("ENGINE_BACKEND", "ollama")      # ollama | goose | echo
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", "1"))
+ENGINE_TIMEOUT_S = float(os.getenv("ENGINE_TIMEOUT_S", "120"))
+ENGINE_CONTEXT_TOKENS = int(os.getenv("ENGINE_CONTEXT_TOKENS", "2048"))   # 0: every turn starts fresh
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))      # 0 disables the reply cache
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join("logs", "response_cache.json"))  # empty: memory only
+RESPONSE_CACHE_BYPASS = os.getenv("RESPONSE_CACHE_BYPASS", "no cache")
+CANNED_MIN_SCORE = float(os.getenv("CANNED_MIN_SCORE", "0.8"))         # agent_dialogue match needed to skip the model; >1 disables
+KNOWLEDGE_MIN_SCORE = float(os.getenv("KNOWLEDGE_MIN_SCORE", "0.7"))   # the same for agent_knowledge topics
 GEMINI_API_KEY = _secret("GEMINI_API_KEY", "")
 
 WP_BASE_URL = os.getenv("WP_BASE_URL", "http://localhost:8080")
 WP_JWT_TOKEN = _secret("WP_JWT_TOKEN", "")
 WP_USERNAME = os.getenv("WP_USERNAME", "")
 WP_APP_PASSWORD = _secret("WP_APP_PASSWORD", "")
+BRAIN_REFRESH_S = float(os.getenv("BRAIN_REFRESH_S", "30"))         # how often the brain post is re-checked
+BRAIN_COOLDOWN_S = float(os.getenv("BRAIN_COOLDOWN_S", "30"))       # pause after WordPress fails 3 times (doubles, max 10 min)
+MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", os.path.join("logs", "memory.db"))   # empty: no local memory mirror
+MEMORY_SYNC_S = float(os.getenv("MEMORY_SYNC_S", "300"))
+MEMORY_RECALL = int(os.getenv("MEMORY_RECALL", "3"))                 # memory snippets added to a prompt; 0 adds none
+MEMORY_WRITE_BACK = os.getenv("MEMORY_WRITE_BACK", "0") == "1"       # opt-in: write interactions to agent_memory (needs WP auth)
+MEMORY_FLUSH_ITEMS = int(os.getenv("MEMORY_FLUSH_ITEMS", "20"))      # flush after this many interactions...
+MEMORY_FLUSH_S = float(os.getenv("MEMORY_FLUSH_S", "60"))            # ...or once the oldest has waited this long
 
 ASSEMBLYAI_API_KEY = _secret("ASSEMBLYAI_API_KEY", "")
 ELEVENLABS_API_KEY = _secret("ELEVENLABS_API_KEY", "")
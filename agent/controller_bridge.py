@@ -4,6 +4,7 @@ A thin, defensive bridge from the web controller to your existing decision engin
 It will call these optional functions in agent/decision_engine.py if present:
 - start() -> None
 - stop() -> None
+- cancel() -> int          (abort the reply being generated)
 - is_running() -> bool
 - handle_text(command: str) -> dict | str | None
 - status() -> dict | str
@@ -12,7 +13,7 @@ If a function is missing, the bridge safely no-ops or returns sensible defaults.
 """
 
 from __future__ import annotations
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 try:
     # Your existing engine
@@ -55,6 +56,15 @@ class AgentBridge:
             self._last_error = f"stop() error: {e}"
             return False
 
+    def cancel(self) -> int:
+        """Abort the reply being generated, if any; returns how many were cancelled."""
+        try:
+            if de and hasattr(de, "cancel"):
+                return int(de.cancel() or 0)  # type: ignore[attr-defined]
+        except Exception as e:
+            self._last_error = f"cancel() error: {e}"
+        return 0
+
     # --- queries -----------------------------------------------
     def is_running(self) -> bool:
         try:
@@ -84,7 +94,8 @@ class AgentBridge:
         return base
 
     # --- commands ----------------------------------------------
-    def handle_text(self, text: str) -> dict[str, Any]:
+    def handle_text(self, text: str, on_chunk: Optional[Callable[[str], None]] = None) -> dict[str, Any]:
+        """Run one command; with on_chunk, respond() streams the reply into it as it is generated."""
         try:
             if de and hasattr(de, "handle_text"):
                 out = de.handle_text(text)  # type: ignore[attr-defined]
@@ -95,7 +106,10 @@ class AgentBridge:
                 return {"ok": True, "result": out}
             # Fallback: use respond(user_text, ...) if present
             if de and hasattr(de, "respond"):
-                out = de.respond(text)  # type: ignore[attr-defined]
+                if on_chunk is not None:
+                    out = de.respond(text, on_chunk=on_chunk)  # type: ignore[attr-defined]
+                else:
+                    out = de.respond(text)  # type: ignore[attr-defined]
                 return {"ok": True, "result": out}
             return {"ok": False, "error": "No handle_text(text), handle(text), or respond(text) found"}
         except Exception as e:
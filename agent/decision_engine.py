@@ -1,29 +1,673 @@
+import contextlib
+import json
+import os
+import queue
+import signal
 import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from agent.config.settings import (
+    ENGINE_BACKEND, ENGINE_CONTEXT_TOKENS, ENGINE_TIMEOUT_S, ENGINE_WORKERS,
+    MEMORY_DB_PATH, MEMORY_RECALL, OLLAMA_MODEL,
+    RESPONSE_CACHE_BYPASS, RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_S,
+)
+from agent.memory.memory_store import MemoryStore
+from agent.response_cache import ResponseCache, cache_key
 from agent.utils.logger import get_logger
 
 log = get_logger("decision_engine")
 
+STARTUP_TIMEOUT_S = 150     # worker start incl. loading the model into Ollama
+ERROR_REPLY = "I hit an error in the decision engine."
+TIMEOUT_REPLY = "The decision engine took too long to answer."
+MISSING_REPLY = "Decision engine unavailable: Goose CLI not installed."
+CANCELLED_REPLY = "Stopped."
+KEEP_TURNS = 3              # turns repeated word for word when a conversation is compacted
+RECAP_CHARS = 600           # budget for the one-line recap of older turns
+SESSION_IDLE_S = 1800       # a conversation idle this long starts over (from a recap)
+
+
+class EngineError(RuntimeError):
+    """The worker answered with an error; unreachable means its backend is down/missing."""
+
+    def __init__(self, message: str, unreachable: bool = False):
+        super().__init__(message)
+        self.unreachable = unreachable
+
+
+class GenerationCancelled(RuntimeError):
+    """cancel() stopped the request (barge-in or a stop from the controller) before it was answered."""
+
+
+_goose_procs: set = set()      # `goose run` processes in flight, so cancel() can kill them
+
+
+def _own_group() -> dict:
+    """Popen arguments that give the child its own process group (console Ctrl+C stays out), for _kill_tree()."""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    """Kill proc and anything it started, e.g. goose runs (they would keep its output pipes open)."""
+    with contextlib.suppress(OSError, subprocess.SubprocessError):
+        if os.name != "nt":
+            os.killpg(proc.pid, signal.SIGKILL)
+            return
+        # Windows can't kill a process group; taskkill /T kills proc and its descendants
+        if subprocess.run(["taskkill", "/T", "/F", "/PID", str(proc.pid)],
+                          capture_output=True, timeout=10).returncode == 0:
+            return
+    with contextlib.suppress(OSError):
+        proc.kill()
 
-def goose_prompt(prompt: str) -> str:
-    """Run Goose CLI safely with args list (no shell)."""
+
+def goose_prompt(prompt: str, timeout: Optional[float] = ENGINE_TIMEOUT_S) -> str:
+    """Run Goose CLI safely with args list (no shell). Raises GenerationCancelled if cancel() killed it."""
     try:
-        proc = subprocess.run(
-            ["goose", "run", prompt],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        return (proc.stdout or "").strip()
+        proc = subprocess.Popen(["goose", "run", prompt], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                **_own_group())
     except FileNotFoundError:
         log.error("Goose CLI not found on PATH. Install or configure Goose.")
-        return "Decision engine unavailable: Goose CLI not installed."
-    except subprocess.CalledProcessError as e:
-        log.error(f"Goose failed (exit {e.returncode}): {e.stderr or e.stdout}")
-        return "I hit an error in the decision engine."
+        return MISSING_REPLY
+    proc.cancelled = False
+    _goose_procs.add(proc)
+    try:
+        out, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_tree(proc)
+        proc.communicate()
+        log.error(f"Goose timed out after {timeout}s")
+        return TIMEOUT_REPLY
+    finally:
+        _goose_procs.discard(proc)
+    if proc.cancelled:
+        raise GenerationCancelled("goose run cancelled")
+    if proc.returncode != 0:
+        log.error(f"Goose failed (exit {proc.returncode}): {err or out}")
+        return ERROR_REPLY
+    return (out or "").strip()
+
+
+class EngineWorker:
+    """One agent/engine_worker.py process and its stdin/stdout pipes.
+
+    ask() sends one prompt and waits up to timeout for the reply; on timeout
+    or if the process died, the worker is killed and started again on the
+    next request. With on_chunk, the reply is streamed and on_chunk gets
+    each sentence as soon as the model has produced it. cancel() (from any
+    thread) ends the request in flight the same way a timeout does, and a
+    replacement process is started right away so the next turn finds it warm.
+    """
+
+    def __init__(self, backend: str, index: int = 0):
+        self.backend = backend
+        self.index = index
+        self._proc: Optional[subprocess.Popen] = None
+        self._replies: "queue.Queue[dict]" = queue.Queue()
+        self._next_id = 0
+        self.starts = 0
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancels = 0
+        self._active: Optional[int] = None    # id of the request in flight
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        self.last_ms = 0
+        self.warm_ms = 0
+        self.last_ttft_ms: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        self.kill()
+        self._stopped = False
+        self._replies = queue.Queue()
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "agent.engine_worker", "--backend", self.backend],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            **_own_group(),     # so kill() takes its goose runs with it
+        )
+        self.starts += 1
+        threading.Thread(target=self._read, args=(self._proc, self._replies),
+                         name=f"engine-worker-{self.index}", daemon=True).start()
+        ready = self._wait(None, STARTUP_TIMEOUT_S)
+        self.warm_ms = int(ready.get("warm_ms", 0))
+        log.info(f"Engine worker {self.index} ready (backend={self.backend}, pid={ready.get('pid')}, "
+                 f"warm-up {self.warm_ms} ms)")
+
+    def _ensure_started(self, restart: bool = False) -> None:
+        with self._start_lock:
+            if not self.alive and not (restart and self._stopped):
+                self.start()
+
+    def _restart_soon(self) -> None:
+        """Start a replacement in the background after killing a busy worker."""
+        def run():
+            try:
+                self._ensure_started(restart=True)
+            except Exception as e:
+                self.last_error = str(e)
+                log.warning(f"Engine worker {self.index} failed to restart: {e}")
+        threading.Thread(target=run, name=f"engine-restart-{self.index}", daemon=True).start()
+
+    def cancel(self) -> bool:
+        """Abort the request in flight, if any; its caller gets GenerationCancelled at once."""
+        rid = self._active
+        if rid is None:
+            return False
+        self._replies.put({"cancel": rid})
+        return True
+
+    @staticmethod
+    def _read(proc: subprocess.Popen, replies: "queue.Queue[dict]") -> None:
+        for line in proc.stdout:
+            try:
+                replies.put(json.loads(line))
+            except ValueError:
+                continue
+        replies.put({"eof": True})
+
+    def _wait(self, rid: Optional[int], timeout: float,
+              on_chunk: Optional[Callable[[str], None]] = None) -> dict:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                msg = self._replies.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                self.timeouts += 1
+                self.kill()
+                if rid is not None:
+                    self._restart_soon()
+                raise TimeoutError(f"engine worker {self.index} did not answer within {timeout:g}s")
+            if "cancel" in msg:
+                if msg["cancel"] != rid:    # left over from a request that finished first
+                    continue
+                self.cancels += 1
+                self.kill()                 # closes its connection, so Ollama stops generating too
+                self._restart_soon()
+                raise GenerationCancelled(f"engine worker {self.index} request cancelled")
+            if msg.get("eof"):
+                self.kill()
+                raise EngineError(f"engine worker {self.index} exited")
+            if rid is not None and msg.get("id") == rid and "chunk" in msg:
+                if on_chunk is not None:
+                    on_chunk(msg["chunk"])
+                continue
+            if rid is None and msg.get("ready") or rid is not None and msg.get("id") == rid:
+                return msg
+
+    def ask(self, prompt: str, timeout: float = ENGINE_TIMEOUT_S,
+            on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        return self.request(prompt, timeout, on_chunk)["text"]
+
+    def request(self, prompt: str, timeout: float = ENGINE_TIMEOUT_S,
+                on_chunk: Optional[Callable[[str], None]] = None, context: Optional[list] = None) -> dict:
+        """Like ask(), but returns the whole reply message (text, context, prompt_eval_*, ...)."""
+        self._ensure_started()
+        self._next_id += 1
+        self.requests += 1
+        t0 = time.time()
+        req = {"id": self._next_id, "prompt": prompt, "timeout": timeout}
+        if on_chunk is not None:
+            req["stream"] = True
+        if context:
+            req["context"] = context
+        self._active = self._next_id
+        try:
+            self._proc.stdin.write(json.dumps(req) + "\n")
+            self._proc.stdin.flush()
+            msg = self._wait(self._next_id, timeout, on_chunk)
+        except GenerationCancelled:
+            raise
+        except (TimeoutError, EngineError) as e:
+            self.errors += 1
+            self.last_error = str(e)
+            raise
+        except OSError as e:     # the worker died before reading the request
+            self.errors += 1
+            self.last_error = str(e)
+            self.kill()
+            raise EngineError(f"engine worker {self.index} pipe closed: {e}") from e
+        finally:
+            self._active = None
+            self.last_ms = int((time.time() - t0) * 1000)
+        if not msg.get("ok"):
+            self.errors += 1
+            self.last_error = msg.get("error")
+            raise EngineError(msg.get("error") or "engine error", bool(msg.get("unreachable")))
+        if "ttft_ms" in msg:
+            self.last_ttft_ms = int(msg["ttft_ms"])
+        msg["text"] = msg.get("text") or ""
+        return msg
+
+    def kill(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            _kill_tree(proc)
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+
+    def stop(self) -> None:
+        """Kill the process for good (no background restart); the next request starts it again."""
+        with self._start_lock:
+            self._stopped = True
+            self.kill()
+
+    def status(self) -> dict:
+        return {
+            "pid": self._proc.pid if self.alive else None,
+            "alive": self.alive,
+            "starts": self.starts,
+            "restarts": max(0, self.starts - 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancels": self.cancels,
+            "last_ms": self.last_ms,
+            "warm_ms": self.warm_ms,
+            "last_ttft_ms": self.last_ttft_ms,
+            "last_error": self.last_error,
+        }
+
+
+class EnginePool:
+    """A few warm workers; each request takes an idle one (or waits for it)."""
+
+    def __init__(self, backend: str = ENGINE_BACKEND, size: int = ENGINE_WORKERS,
+                 timeout_s: float = ENGINE_TIMEOUT_S):
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self.workers = [EngineWorker(backend, i) for i in range(max(1, size))]
+        self._idle: "queue.Queue[EngineWorker]" = queue.Queue()
+        for w in self.workers:
+            self._idle.put(w)
+        self._busy: set = set()
+
+    def start(self) -> None:
+        """Start (and warm) every worker now instead of on first use."""
+        for w in self.workers:
+            try:
+                w._ensure_started()     # under the worker's lock, so a first turn can't race it
+            except Exception as e:
+                w.last_error = str(e)
+                log.warning(f"Engine worker {w.index} failed to start: {e}")
+
+    def ask(self, prompt: str, timeout: Optional[float] = None,
+            on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        return self.request(prompt, timeout, on_chunk)["text"]
+
+    def request(self, prompt: str, timeout: Optional[float] = None,
+                on_chunk: Optional[Callable[[str], None]] = None, context: Optional[list] = None) -> dict:
+        timeout = self.timeout_s if timeout is None else timeout
+        t0 = time.time()
+        try:
+            w = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("all engine workers busy")
+        self._busy.add(w)
+        try:
+            return w.request(prompt, max(0.1, timeout - (time.time() - t0)), on_chunk, context)
+        finally:
+            self._busy.discard(w)
+            self._idle.put(w)
+
+    def cancel(self) -> int:
+        """Abort every request in flight; returns how many were cancelled."""
+        return sum(w.cancel() for w in list(self._busy))
+
+    def stop(self) -> None:
+        for w in self.workers:
+            w.stop()
+
+    def status(self) -> dict:
+        return {
+            "backend": self.backend,
+            "size": len(self.workers),
+            "busy": len(self.workers) - self._idle.qsize(),
+            "timeout_s": self.timeout_s,
+            "workers": [w.status() for w in self.workers],
+        }
+
+
+class ConversationSession:
+    """One ongoing conversation, continued turn to turn with the model's own context.
+
+    Ollama returns the token context of the whole exchange with each reply;
+    sending it back with the next prompt lets the model skip re-reading the
+    earlier turns, so each turn's prompt evaluation (prefill) covers only the
+    new message. When the context would grow past budget_tokens, or the
+    conversation sat idle for idle_s, the context is dropped and the next
+    prompt starts from a short recap of the older turns plus the last
+    keep_turns word for word: one larger prefill, then flat again.
+
+    lock only guards the session state, not the generation: callers hold it
+    for build() and again for record(), so turns from different callers run
+    side by side. A turn that finishes after another one was recorded since
+    its build() (record() gets the version it built from) cannot continue
+    that context, so the session is compacted into a recap of both instead.
+    """
+
+    def __init__(self, budget_tokens: int = ENGINE_CONTEXT_TOKENS, keep_turns: int = KEEP_TURNS,
+                 idle_s: float = SESSION_IDLE_S):
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.idle_s = idle_s
+        self.lock = threading.Lock()
+        self.version = 0                    # bumped when a turn is recorded or the session reset
+        self.overlaps = 0
+        self.context: list = []
+        self.turns: deque = deque(maxlen=50)    # (user text, reply)
+        self._recap = ""
+        self.compactions = 0
+        self.last_used = 0.0
+        self._evals: deque = deque(maxlen=20)   # (prompt_eval_count, prompt_eval_ms) per turn
+
+    def build(self, prompt: str) -> tuple[str, list]:
+        """The prompt to send for this turn and the context to send with it."""
+        if self.context and time.time() - self.last_used > self.idle_s:
+            self._compact()
+        elif self.context and len(self.context) + len(prompt) // 4 > self.budget_tokens:   # ~4 chars/token
+            self._compact()
+        return (f"{self._recap}\n{prompt}" if self._recap else prompt), self.context
+
+    @property
+    def active(self) -> bool:
+        """Earlier turns would shape this turn's prompt (context, recap, or turns within idle_s)."""
+        return bool(self.context or self._recap or (self.turns and time.time() - self.last_used <= self.idle_s))
+
+    def _summary(self) -> str:
+        turns = list(self.turns)
+        older, recent = turns[:-self.keep_turns], turns[-self.keep_turns:]
+        recap = ""
+        for user, reply in reversed(older):     # newest first, until the recap budget is used
+            item = f"you asked '{user[:80]}' and I said '{reply[:80]}'"
+            if len(recap) + len(item) > RECAP_CHARS:
+                break
+            recap = f"{item}; {recap}" if recap else item
+        lines = [f"Earlier in this conversation: {recap}."] if recap else []
+        lines += [f"USER: {u}\nASSISTANT: {r}" for u, r in recent]
+        return "\n".join(lines)
+
+    def _compact(self) -> None:
+        self._recap = self._summary()
+        self.context = []
+        self.compactions += 1
+        log.info(f"Conversation compacted ({max(0, len(self.turns) - self.keep_turns)} turn(s) summarized, "
+                 f"{min(len(self.turns), self.keep_turns)} kept)")
+
+    def record(self, user_text: str, msg: dict, base: Optional[int] = None) -> None:
+        """Add a finished turn; base is the version its build() saw (None: it did not overlap)."""
+        self.turns.append((user_text, msg.get("text") or ""))
+        if base is not None and base != self.version:
+            self.overlaps += 1
+            self._compact()             # its context misses the turn recorded meanwhile
+        elif msg.get("cached"):
+            self.context = []           # no model context for a cached reply: carry the turns as text
+            self._recap = self._summary()
+        else:
+            self.context = msg.get("context") or []
+            self._recap = ""
+        self.version += 1
+        self._evals.append((int(msg.get("prompt_eval_count") or 0), int(msg.get("prompt_eval_ms") or 0)))
+        self.last_used = time.time()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.context, self._recap = [], ""
+            self.turns.clear()
+            self.last_used = 0.0
+            self.version += 1
+
+    def stats(self) -> dict:
+        evals = list(self._evals)
+        return {
+            "turns": len(self.turns),
+            "context_tokens": len(self.context),
+            "budget_tokens": self.budget_tokens,
+            "compactions": self.compactions,
+            "overlaps": self.overlaps,
+            "last_prompt_eval_tokens": evals[-1][0] if evals else 0,
+            "last_prompt_eval_ms": evals[-1][1] if evals else 0,
+            "avg_prompt_eval_ms": int(sum(ms for _, ms in evals) / len(evals)) if evals else 0,
+            "recent_prompt_eval_ms": [ms for _, ms in evals],
+        }
+
+
+_pool: Optional[EnginePool] = None
+_pool_lock = threading.Lock()
+_session: Optional[ConversationSession] = ConversationSession() if ENGINE_CONTEXT_TOKENS > 0 else None
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+_memory: Optional[MemoryStore] = None
+_memory_lock = threading.Lock()
+
+
+def get_pool() -> Optional[EnginePool]:
+    """The process-wide worker pool, or None when ENGINE_BACKEND=goose (spawn per turn)."""
+    global _pool
+    if ENGINE_BACKEND == "goose":
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = EnginePool()
+        return _pool
+
+
+def start() -> None:
+    pool = get_pool()
+    if pool is not None:
+        pool.start()
+
+
+def stop() -> None:
+    if _pool is not None:
+        _pool.stop()
+
+
+def is_running() -> bool:
+    return _pool is not None and any(w.alive for w in _pool.workers)
+
+
+def status() -> dict:
+    if ENGINE_BACKEND == "goose":
+        return {"engine": {"backend": "goose", "mode": "spawn per turn", "timeout_s": ENGINE_TIMEOUT_S}}
+    out = {"engine": _pool.status() if _pool is not None else {"backend": ENGINE_BACKEND, "workers": []}}
+    if _session is not None:
+        out["session"] = _session.stats()
+    if _memory is not None:
+        out["memory"] = _memory.stats()
+    return out
+
+
+def describe() -> str:
+    """The engine in a few words, for the status line."""
+    if ENGINE_BACKEND == "goose":
+        return "Goose (goose run per command)"
+    if ENGINE_BACKEND == "ollama":
+        return f"{OLLAMA_MODEL} via Ollama (warm worker)"
+    return f"{ENGINE_BACKEND} worker"
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """The process-wide reply cache (loaded from RESPONSE_CACHE_PATH on first use), or None if disabled."""
+    global _cache
+    if RESPONSE_CACHE_SIZE <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_PATH or None,
+                                   RESPONSE_CACHE_BYPASS)
+        return _cache
+
+
+def cache_stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache is not None else {}
+
+
+def get_memory() -> Optional[MemoryStore]:
+    """The process-wide mirror of the WordPress memory posts (MEMORY_DB_PATH), or None if disabled."""
+    global _memory
+    if not MEMORY_DB_PATH:
+        return None
+    with _memory_lock:
+        if _memory is None:
+            try:
+                _memory = MemoryStore(MEMORY_DB_PATH)
+            except Exception as e:
+                log.warning(f"Memory store unavailable: {e}")
+                return None
+        return _memory
+
+
+def recall(user_text: str, limit: int = MEMORY_RECALL) -> list[str]:
+    """Memory snippets related to user_text, from the local mirror (no network).
+
+    Empty until get_memory() has opened the mirror (agent_main does at startup).
+    """
+    memory = _memory
+    if memory is None or limit <= 0:
+        return []
+    try:
+        return memory.recall(user_text, limit)
+    except Exception as e:
+        log.warning(f"Memory recall failed: {e}")
+        return []
+
+
+def cancel() -> int:
+    """Abort the replies being generated right now (barge-in, controller stop); returns how many.
+
+    Each cancelled respond() call returns CANCELLED_REPLY within a moment,
+    and its worker is replaced in the background.
+    """
+    n = 0
+    for proc in list(_goose_procs):
+        proc.cancelled = True
+        _kill_tree(proc)
+        n += 1
+    pool = _pool
+    if pool is not None:
+        n += pool.cancel()
+    if n:
+        log.info(f"Cancelled {n} reply(s) in progress")
+    return n
+
+
+def session_stats() -> dict:
+    return _session.stats() if _session is not None else {}
+
+
+def reset_session() -> None:
+    """Forget the conversation so far; the next turn starts fresh."""
+    if _session is not None:
+        _session.reset()
+
+
+def _whole(text: str, on_chunk: Optional[Callable[[str], None]]) -> str:
+    if on_chunk is not None and text:
+        on_chunk(text)
+    return text
+
+
+def _request(prompt: str, on_chunk: Optional[Callable[[str], None]], context: Optional[list] = None,
+             deadline_s: Optional[float] = None) -> dict:
+    """Reply message for prompt; ok is False for the fallback texts (timeouts, errors, cancelled)."""
+    deadline_s = ENGINE_TIMEOUT_S if deadline_s is None else deadline_s
+    pool = get_pool()
+    try:
+        if pool is None:
+            text = goose_prompt(prompt, deadline_s)
+            return {"ok": text not in (ERROR_REPLY, TIMEOUT_REPLY, MISSING_REPLY), "text": _whole(text, on_chunk)}
+        sent = []
+
+        def chunk(c: str) -> None:
+            sent.append(c)
+            on_chunk(c)
+
+        try:
+            return pool.request(prompt, deadline_s, on_chunk=chunk if on_chunk is not None else None,
+                                context=context)
+        except EngineError as e:
+            if not e.unreachable:
+                raise
+            log.warning(f"{pool.backend} backend unreachable ({e}); using goose run for this turn")
+            # after part of the reply was streamed, the goose reply is returned but not streamed again
+            return {"ok": False, "text": _whole(goose_prompt(prompt, deadline_s), None if sent else on_chunk)}
+    except GenerationCancelled:
+        return {"ok": False, "cancelled": True, "text": CANCELLED_REPLY}
+    except TimeoutError as e:
+        log.error(f"Decision engine timed out: {e}")
+        return {"ok": False, "text": TIMEOUT_REPLY}
+    except EngineError as e:
+        log.error(f"Decision engine failed: {e}")
+        return {"ok": False, "text": ERROR_REPLY}
+
+
+def ask(prompt: str, on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """Answer prompt with a warm worker; falls back to `goose run` if the backend is unreachable.
+
+    With on_chunk, sentences are passed to it while the reply is generated
+    (the spawn path delivers the whole reply as one chunk).
+    """
+    return _request(prompt, on_chunk)["text"]
+
 
+def respond(user_text: str, mood=None, persona=None, on_chunk: Optional[Callable[[str], None]] = None,
+            deadline_s: Optional[float] = None) -> str:
+    """One conversational turn; continues the session's context when there is one.
 
-def respond(user_text: str, mood=None, persona=None) -> str:
+    A command answered before in the same persona and mood is replied to from
+    the cache without calling the model, unless the session has earlier turns
+    it could follow up on; a cached reply is still added to the session.
+    Related snippets from the memory posts (recall()) go into the prompt.
+    deadline_s caps the generation (default ENGINE_TIMEOUT_S); cancel()
+    ends it early with CANCELLED_REPLY.
+    """
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        user_text, bypass = cache.split_bypass(user_text)
+    notes = recall(user_text)
+    if cache is not None and not (_session is not None and _session.active):    # follow-ups aren't in the key
+        key = cache_key(user_text, persona, mood, " / ".join(notes))
+        if bypass:
+            cache.bypass()
+        else:
+            hit = cache.get(key)
+            if hit is not None:
+                if _session is not None:
+                    with _session.lock:
+                        _session.record(user_text, {"text": hit, "cached": True})
+                return _whole(hit, on_chunk)
     mood_tag = f"[mood={mood}]" if mood else ""
     persona_tag = f"[persona={persona}]" if persona else ""
-    prompt = f"{persona_tag}{mood_tag} USER: {user_text}\nASSISTANT:"
-    return goose_prompt(prompt)
+    memory_tag = "".join(f"[memory={n}]" for n in notes)
+    prompt = f"{persona_tag}{mood_tag}{memory_tag} USER: {user_text}\nASSISTANT:"
+    t0 = time.time()
+    if _session is None:
+        msg = _request(prompt, on_chunk, deadline_s=deadline_s)
+    else:
+        with _session.lock:
+            full, context = _session.build(prompt)
+            base = _session.version
+        msg = _request(full, on_chunk, context, deadline_s)
+        if msg.get("ok"):
+            with _session.lock:
+                _session.record(user_text, msg, base)
+    if key is not None and msg.get("ok") and msg["text"]:
+        cache.put(key, msg["text"], int((time.time() - t0) * 1000))
+    return msg["text"]
@@ -0,0 +1,261 @@
+# agent/engine_worker.py
+# Long-lived decision-engine worker. decision_engine used to start a fresh
+# `goose run` process for every utterance (interpreter start, provider init
+# and model handshake each turn). A worker is started once and kept warm:
+# it loads its backend at startup, then answers prompts read as JSON lines
+# on stdin with JSON lines on stdout, so the parent only pays a pipe round
+# trip per turn and can kill and restart a hung or crashed worker.
+#
+# Protocol (one JSON object per line):
+#   worker -> parent at start:  {"ready": true, "backend": ..., "pid": ..., "warm_ms": ...}
+#   parent -> worker:           {"id": 1, "prompt": "..."}   or {"id": 2, "ping": true}
+#   worker -> parent:           {"id": 1, "ok": true, "text": "...", "ms": 812}
+#                               {"id": 1, "ok": false, "error": "...", "unreachable": true}
+#   with "stream": true in the request, the worker first sends each sentence
+#   as it completes, {"id": 1, "chunk": "First sentence."}, and the final
+#   reply also carries ttft_ms (time to the first token).
+#   A request may carry "context" (the token array returned with the previous
+#   reply) to continue a conversation; replies then include the new "context"
+#   plus prompt_eval_count / prompt_eval_ms (prefill cost of this turn).
+#   "timeout" (seconds, default ENGINE_TIMEOUT_S) bounds the backend call, so
+#   the worker gives up when the parent does.
+#
+# Backends: ollama (HTTP to OLLAMA_HOST with keep_alive, so the model stays
+# loaded between turns), goose (`goose run` per prompt inside the worker)
+# and echo (no model; for tests and benchmarks).
+# Dependencies: python-dotenv (settings); requests (ollama backend only)
+
+from __future__ import annotations
+import argparse, json, os, re, subprocess, sys, time
+from typing import Iterator, Optional
+
+from agent.config.settings import ENGINE_TIMEOUT_S
+
+OLLAMA_KEEP_ALIVE = "30m"   # how long Ollama keeps the model loaded after the last request
+MAX_CHUNK_CHARS = 200       # a sentence longer than this is split at the next space
+
+_SENTENCE_END = re.compile(r"[.!?;:](?=\s)|\n")
+
+
+class SentenceChunker:
+    """Turns a token stream into sentence-sized chunks, so a screen reader gets whole phrases."""
+
+    def __init__(self, max_chars: int = MAX_CHUNK_CHARS):
+        self.max_chars = max_chars
+        self._buf = ""
+
+    def feed(self, token: str) -> list[str]:
+        self._buf += token
+        out = []
+        while True:
+            m = _SENTENCE_END.search(self._buf)
+            if m is not None:
+                cut = m.end()
+            elif len(self._buf) > self.max_chars and " " in self._buf[self.max_chars:]:
+                cut = self._buf.index(" ", self.max_chars)
+            else:
+                break
+            chunk, self._buf = self._buf[:cut].strip(), self._buf[cut:]
+            if chunk:
+                out.append(chunk)
+        return out
+
+    def flush(self) -> list[str]:
+        chunk, self._buf = self._buf.strip(), ""
+        return [chunk] if chunk else []
+
+
+class EchoBackend:
+    """Replies 'echo: <prompt>'. '__sleep N' waits N seconds and '__crash' exits (for tests).
+
+    Context is simulated with one token per word, so only the new prompt is
+    'evaluated' when a context is passed back, as with Ollama.
+    """
+
+    name = "echo"
+
+    def __init__(self):
+        self.last_meta: dict = {}
+
+    def warm(self) -> None:
+        pass
+
+    def ask(self, prompt: str, context: Optional[list] = None, timeout: float = ENGINE_TIMEOUT_S) -> str:
+        if prompt.startswith("__sleep "):
+            time.sleep(float(prompt.split()[1]))
+        elif prompt == "__crash":
+            os._exit(3)
+        reply = f"echo: {prompt}"
+        n = len(prompt.split())
+        self.last_meta = {"context": list(context or []) + [0] * (n + len(reply.split())),
+                          "prompt_eval_count": n, "prompt_eval_ms": 0}
+        return reply
+
+    def stream(self, prompt: str, context: Optional[list] = None,
+               timeout: float = ENGINE_TIMEOUT_S) -> Iterator[str]:
+        for word in re.findall(r"\S+\s*", self.ask(prompt, context, timeout)):
+            yield word
+
+
+class OllamaBackend:
+    """Ollama /api/generate over one pooled keep-alive connection."""
+
+    name = "ollama"
+
+    def __init__(self, host: Optional[str] = None, model: Optional[str] = None):
+        import requests
+        self.host = (host or os.getenv("OLLAMA_HOST", "http://localhost:11434")).rstrip("/")
+        self.model = model or os.getenv("OLLAMA_MODEL", "qwen2.5")
+        self._session = requests.Session()
+        self._errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        self.last_meta: dict = {}
+
+    def _body(self, prompt: str, stream: bool, context: Optional[list]) -> dict:
+        body = {"model": self.model, "prompt": prompt, "stream": stream, "keep_alive": OLLAMA_KEEP_ALIVE}
+        if context:
+            body["context"] = context
+        return body
+
+    @staticmethod
+    def _meta(final: dict) -> dict:
+        """Context and timings from the last message of a reply (Ollama durations are in ns)."""
+        return {
+            "context": final.get("context") or [],
+            "prompt_eval_count": int(final.get("prompt_eval_count") or 0),
+            "prompt_eval_ms": int((final.get("prompt_eval_duration") or 0) / 1e6),
+            "eval_count": int(final.get("eval_count") or 0),
+            "load_ms": int((final.get("load_duration") or 0) / 1e6),
+        }
+
+    def _generate(self, prompt: str, timeout: float, context: Optional[list] = None) -> dict:
+        r = self._session.post(f"{self.host}/api/generate", timeout=timeout,
+                               json=self._body(prompt, False, context))
+        r.raise_for_status()
+        return r.json()
+
+    def warm(self) -> None:
+        """An empty prompt makes Ollama load the model without generating anything."""
+        try:
+            self._generate("", timeout=120)
+        except Exception as e:
+            print(f"[engine_worker] warm-up failed: {e}", file=sys.stderr, flush=True)
+
+    def ask(self, prompt: str, context: Optional[list] = None, timeout: float = ENGINE_TIMEOUT_S) -> str:
+        j = self._generate(prompt, timeout=timeout, context=context)
+        self.last_meta = self._meta(j)
+        return (j.get("response") or "").strip()
+
+    def stream(self, prompt: str, context: Optional[list] = None,
+               timeout: float = ENGINE_TIMEOUT_S) -> Iterator[str]:
+        """Tokens as Ollama produces them (NDJSON lines with stream enabled)."""
+        self.last_meta = {}
+        with self._session.post(f"{self.host}/api/generate", stream=True, timeout=timeout,
+                                json=self._body(prompt, True, context)) as r:
+            r.raise_for_status()
+            for line in r.iter_lines(chunk_size=None):   # as each NDJSON chunk arrives, not per 512 bytes
+                if not line:
+                    continue
+                msg = json.loads(line)
+                if msg.get("error"):
+                    raise RuntimeError(msg["error"])
+                if msg.get("response"):
+                    yield msg["response"]
+                if msg.get("done"):
+                    self.last_meta = self._meta(msg)
+                    break
+
+
+class GooseBackend:
+    """`goose run` per prompt (Goose has no request/response mode to keep open)."""
+
+    name = "goose"
+    last_meta: dict = {}    # no context: every goose run starts a new conversation
+
+    def warm(self) -> None:
+        pass
+
+    def ask(self, prompt: str, context: Optional[list] = None, timeout: float = ENGINE_TIMEOUT_S) -> str:
+        proc = subprocess.run(["goose", "run", prompt], check=True, capture_output=True, text=True,
+                              timeout=timeout)
+        return (proc.stdout or "").strip()
+
+    def stream(self, prompt: str, context: Optional[list] = None,
+               timeout: float = ENGINE_TIMEOUT_S) -> Iterator[str]:
+        yield self.ask(prompt, timeout=timeout)
+
+
+BACKENDS = {"echo": EchoBackend, "ollama": OllamaBackend, "goose": GooseBackend}
+
+
+def _unreachable(backend, exc: Exception) -> bool:
+    """The backend itself is missing or not answering (parent may fall back)."""
+    return isinstance(exc, FileNotFoundError) or isinstance(exc, getattr(backend, "_errors", ()))
+
+
+def serve(backend, stdin=None, stdout=None) -> None:
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    def send(obj: dict) -> None:
+        stdout.write(json.dumps(obj) + "\n")
+        stdout.flush()
+
+    t0 = time.perf_counter()
+    backend.warm()
+    send({"ready": True, "backend": backend.name, "pid": os.getpid(),
+          "warm_ms": int((time.perf_counter() - t0) * 1000)})
+    for line in stdin:
+        try:
+            req = json.loads(line)
+        except ValueError:
+            continue
+        rid = req.get("id")
+        if req.get("ping"):
+            send({"id": rid, "ok": True, "pong": True})
+            continue
+        t0 = time.perf_counter()
+        try:
+            prompt, context = str(req.get("prompt", "")), req.get("context")
+            timeout = float(req.get("timeout") or ENGINE_TIMEOUT_S)
+            if req.get("stream"):
+                send({**_stream(backend, rid, prompt, context, timeout, t0, send), **backend.last_meta})
+                continue
+            text = backend.ask(prompt, context, timeout)
+            send({"id": rid, "ok": True, "text": text, "ms": int((time.perf_counter() - t0) * 1000),
+                  **backend.last_meta})
+        except Exception as e:
+            send({"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}",
+                  "unreachable": _unreachable(backend, e), "ms": int((time.perf_counter() - t0) * 1000)})
+
+
+def _stream(backend, rid, prompt: str, context: Optional[list], timeout: float, t0: float, send) -> dict:
+    """Send sentence chunks as tokens arrive; returns the final reply message."""
+    chunker = SentenceChunker()
+    parts: list[str] = []
+    ttft = None
+    for token in backend.stream(prompt, context, timeout):
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        parts.append(token)
+        for chunk in chunker.feed(token):
+            send({"id": rid, "chunk": chunk})
+    for chunk in chunker.flush():
+        send({"id": rid, "chunk": chunk})
+    return {"id": rid, "ok": True, "text": "".join(parts).strip(), "ms": int((time.perf_counter() - t0) * 1000),
+            "ttft_ms": int((ttft if ttft is not None else time.perf_counter() - t0) * 1000)}
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Persistent decision-engine worker (JSON lines on stdin/stdout)")
+    ap.add_argument("--backend", choices=sorted(BACKENDS), default="ollama")
+    ap.add_argument("--once", metavar="PROMPT", help="Answer one prompt and exit (the old spawn-per-turn shape)")
+    args = ap.parse_args(argv)
+    backend = BACKENDS[args.backend]()
+    if args.once is not None:
+        print(backend.ask(args.once))
+        return
+    serve(backend)
+
+
+if __name__ == "__main__":
+    main()
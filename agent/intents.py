@@ -0,0 +1,201 @@
+# agent/intents.py
+# Fast path for built-in commands. The settings commands handled in the
+# voice loop and the built-ins in agent_main used to be separate chains of
+# exact string checks and ad-hoc regexes, so a near miss from STT ("agent
+# what's my status", "reload macro") fell through to a full model call.
+# All of them are now declared once in INTENTS and compiled into:
+#   - a dict of exact phrases (one lookup),
+#   - one alternation regex per group for commands with values
+#     ("set threshold to 1100"), and
+#   - a fuzzy pass that drops filler words ("please", "what's my", ...) and
+#     compares what is left against the phrases with difflib,
+# so a built-in is recognized in microseconds and the model only sees what
+# is left. IntentRouter.stats() reports how many commands it answered.
+# Dependencies: none (stdlib)
+
+from __future__ import annotations
+import difflib, re, threading, time
+from typing import Optional, Sequence
+
+FUZZY_CUTOFF = 0.85         # difflib ratio needed for a near miss to count as the command
+FUZZY_MIN_CHARS = 5         # shorter commands must match exactly ("top" is not "stop")
+
+# Leading words that never change the command (wake word, politeness, question framing)
+FILLER = frozenset("""
+agent hey hi ok okay please can could would you will just now current currently the my me
+what what's whats is are show tell give let's i want to know
+""".split())
+TRAILING_FILLER = frozenset("please now me thanks again".split())
+
+_PUNCT = re.compile(r"[^\w\s'=]")
+_SPACE = re.compile(r"\s+")
+_THOUSANDS = re.compile(r"(?<=\d)[,\s](?=\d{3}\b)")
+_WAKE = re.compile(r"^agent\s+")       # built-ins work with or without the default wake word
+_NUMBER_WORDS = {w: str(i) for i, w in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+    "sixteen seventeen eighteen nineteen twenty".split())}
+_NUMBER = re.compile(r"\b(" + "|".join(_NUMBER_WORDS) + r")\b")
+
+
+class Intent:
+    """One command: exact phrases and/or regex patterns (named groups become slots)."""
+
+    __slots__ = ("name", "group", "phrases", "patterns")
+
+    def __init__(self, name: str, group: str, phrases: Sequence[str] = (), patterns: Sequence[str] = ()):
+        self.name, self.group = name, group
+        self.phrases = tuple(phrases)
+        self.patterns = tuple(patterns)
+
+
+class Match:
+    __slots__ = ("intent", "slots", "kind", "score", "us")
+
+    def __init__(self, intent: str, slots: dict, kind: str, score: float = 1.0, us: float = 0.0):
+        self.intent, self.slots, self.kind, self.score, self.us = intent, slots, kind, score, us
+
+    def __repr__(self) -> str:
+        return f"Match({self.intent!r}, {self.slots!r}, {self.kind}, {self.score:.2f})"
+
+
+INTENTS = [
+    # agent_main built-ins
+    Intent("repeat", "builtin", ["repeat", "repeat last", "repeat the last", "repeat that", "say that again"]),
+    Intent("status", "builtin", ["status"]),
+    Intent("help", "builtin", ["help"]),
+    Intent("history", "builtin", ["history", "show history"], [r"history(?: last (?P<n>\d{1,3}))?"]),
+    Intent("save_settings", "builtin", ["save settings"]),
+    Intent("reload_macros", "builtin", ["reload macros"]),
+    Intent("stop", "builtin", ["stop", "stop that", "never mind"]),
+    Intent("new_conversation", "builtin", ["new conversation", "start a new conversation"]),
+    Intent("audio_device", "builtin", ["audio device", "input device"]),
+    # voice_loop settings (also accepted before the wake word)
+    Intent("set_threshold", "settings", [], [r"set (?:the )?threshold (?:to |= ?|at )?(?P<value>\d{2,5})"]),
+    Intent("set_wake_word", "settings", [], [r"set (?:the )?wake ?word (?:to |= ?)(?P<word>.+)"]),
+    Intent("disable_wake_word", "settings", ["disable wake word", "turn off wake word", "wake word off"]),
+    Intent("set_device", "settings", [], [r"set (?:the )?input ?device (?:to |= ?)?(?P<index>\d{1,4})"]),
+    Intent("enable_vad", "settings", ["enable vad", "enable webrtc vad", "use webrtc vad"]),
+    Intent("disable_vad", "settings", ["disable vad", "disable webrtc vad", "use amplitude vad"]),
+    Intent("set_verbosity", "settings", [], [r"set (?:the )?verbosity (?:to |= ?)?(?P<level>quiet|normal|verbose)"]),
+]
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation to spaces; '1,100' -> '1100' and 'five' -> '5' (STT writes numbers both ways)."""
+    t = _THOUSANDS.sub("", (text or "").strip().lower())
+    t = _NUMBER.sub(lambda m: _NUMBER_WORDS[m.group(1)], t)
+    return _WAKE.sub("", _SPACE.sub(" ", _PUNCT.sub(" ", t)).strip())
+
+
+def strip_filler(text: str) -> str:
+    """Drop leading (and a few trailing) filler words; what remains must still name the command."""
+    words = text.split()
+    i, j = 0, len(words)
+    while i < j - 1 and words[i] in FILLER:
+        i += 1
+    while j > i + 1 and words[j - 1] in TRAILING_FILLER:
+        j -= 1
+    return " ".join(words[i:j])
+
+
+class IntentRouter:
+    """Matches normalized commands against a compiled set of intents.
+
+    match() has no side effects; the caller that finally decides a command
+    (built-in or model) calls record() once, so stats() counts every command
+    once even when two layers look at it.
+    """
+
+    def __init__(self, intents: Sequence[Intent] = INTENTS, fuzzy_cutoff: float = FUZZY_CUTOFF):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._exact: dict[str, tuple[str, str]] = {}       # phrase -> (intent, group)
+        self._phrases: dict[Optional[str], list[str]] = {None: []}
+        self._grammar: dict[Optional[str], Optional[re.Pattern]] = {}
+        self._slots: dict[str, tuple[str, str]] = {}       # regex group name -> (intent, slot)
+        alternatives: dict[Optional[str], list[str]] = {None: []}
+        for n, it in enumerate(intents):
+            for p in it.phrases:
+                key = normalize(p)
+                self._exact.setdefault(key, (it.name, it.group))
+                self._phrases[None].append(key)
+                self._phrases.setdefault(it.group, []).append(key)
+            for k, pat in enumerate(it.patterns):
+                tag = f"i{n}_{k}"
+                body = re.sub(r"\(\?P<(\w+)>", lambda m: self._slot(tag, it.name, m.group(1)), pat)
+                alt = f"(?P<{tag}>{body})"
+                self._slots[tag] = (it.name, "")
+                alternatives[None].append(alt)
+                alternatives.setdefault(it.group, []).append(alt)
+        for group, alts in alternatives.items():
+            self._grammar[group] = re.compile(rf"^(?:{'|'.join(alts)})$") if alts else None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.misses = 0
+        self.by_kind = {"exact": 0, "pattern": 0, "fuzzy": 0}
+        self.by_intent: dict[str, int] = {}
+        self.total_us = 0.0
+
+    def _slot(self, tag: str, intent: str, slot: str) -> str:
+        name = f"{tag}__{slot}"
+        self._slots[name] = (intent, slot)
+        return f"(?P<{name}>"
+
+    def _lookup(self, t: str, group: Optional[str]) -> Optional[tuple[str, dict, str]]:
+        hit = self._exact.get(t)
+        if hit is not None and (group is None or hit[1] == group):
+            return hit[0], {}, "exact"
+        grammar = self._grammar.get(group)
+        m = grammar.match(t) if grammar is not None else None
+        if m is not None:
+            tag = m.lastgroup       # the outer group of the alternative closes last
+            slots = {self._slots[k][1]: v for k, v in m.groupdict().items() if v is not None and k.startswith(tag + "__")}
+            return self._slots[tag][0], slots, "pattern"
+        return None
+
+    def match(self, text: str, group: Optional[str] = None, fuzzy: bool = True) -> Optional[Match]:
+        """The intent text names, or None (then it is for the model)."""
+        t0 = time.perf_counter()
+        t = normalize(text)
+        found = self._lookup(t, group)
+        score = 1.0
+        if found is None and fuzzy:
+            core = strip_filler(t)
+            if core != t:
+                found = self._lookup(core, group)
+                found = (found[0], found[1], "fuzzy") if found else None
+            if found is None and len(core) >= FUZZY_MIN_CHARS:
+                close = difflib.get_close_matches(core, self._phrases.get(group, ()), n=1, cutoff=self.fuzzy_cutoff)
+                if close:
+                    score = difflib.SequenceMatcher(None, core, close[0]).ratio()
+                    found = (self._exact[close[0]][0], {}, "fuzzy")
+        if found is None:
+            return None
+        return Match(found[0], found[1], found[2], score, (time.perf_counter() - t0) * 1e6)
+
+    def record(self, m: Optional[Match]) -> None:
+        """Count one command: m is its match, or None if it went to the model."""
+        with self._lock:
+            self.lookups += 1
+            if m is None:
+                self.misses += 1
+                return
+            self.total_us += m.us
+            self.by_kind[m.kind] = self.by_kind.get(m.kind, 0) + 1
+            self.by_intent[m.intent] = self.by_intent.get(m.intent, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self.lookups
+            hits = n - self.misses
+            return {
+                "commands": n,
+                "builtin": hits,
+                "to_model": self.misses,
+                "hit_rate": round(hits / n, 3) if n else 0.0,
+                **self.by_kind,
+                "avg_match_us": round(self.total_us / hits, 1) if hits else 0.0,
+                "by_intent": dict(self.by_intent),
+            }
+
+
+ROUTER = IntentRouter()
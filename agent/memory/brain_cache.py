@@ -0,0 +1,230 @@
+# agent/memory/brain_cache.py
+# Last good brain post, kept fresh in the background. generate_text used to
+# call get_latest_brain_post() on every turn: a blocking HTTP request (20 s
+# timeout) before the model was even asked, and the ACF JSON fields parsed
+# again each time. BrainCache serves the snapshot from memory instantly and
+# a daemon thread refreshes it every refresh_s with a conditional request
+# (If-None-Match when WordPress or a proxy sends an ETag, and modified_after
+# with the snapshot's modified time), so an unchanged post costs one small
+# response and no parsing. After failures in a row the circuit breaker
+# opens: no requests for cooldown_s (doubling up to max_cooldown_s while
+# WordPress stays down), then one trial request. Turns never wait on
+# WordPress except for the very first fetch, and then for at most
+# first_wait_s. stats() (staleness, refresh timings, breaker state) is
+# shown on /api/status.
+# Dependencies: requests (via wp_client)
+
+from __future__ import annotations
+import threading, time
+from typing import Optional
+
+from agent.config.settings import BRAIN_COOLDOWN_S, BRAIN_REFRESH_S
+from agent.memory import wp_client
+from agent.utils.logger import get_logger
+
+log = get_logger("brain_cache")
+
+REFRESH_S = BRAIN_REFRESH_S     # background refresh interval
+TIMEOUT_S = 10.0                # per request; only the refresh thread waits on it
+FAILURES_TO_OPEN = 3            # consecutive failures that open the breaker
+COOLDOWN_S = BRAIN_COOLDOWN_S   # first open period; doubles while WordPress stays down
+MAX_COOLDOWN_S = 600.0
+FIRST_WAIT_S = 2.0              # how long the first turn may wait for the initial fetch
+
+
+class BrainCache:
+    """Snapshot of the latest brain post with background refresh and a circuit breaker.
+
+    get() returns the snapshot (or an empty post before the first successful
+    fetch) without touching the network. refresh() does one conditional
+    fetch; start() runs it every refresh_s on a daemon thread.
+    """
+
+    def __init__(self, refresh_s: float = REFRESH_S, timeout_s: float = TIMEOUT_S,
+                 failures_to_open: int = FAILURES_TO_OPEN, cooldown_s: float = COOLDOWN_S,
+                 max_cooldown_s: float = MAX_COOLDOWN_S, first_wait_s: float = FIRST_WAIT_S):
+        self.refresh_s = refresh_s
+        self.timeout_s = timeout_s
+        self.failures_to_open = failures_to_open
+        self.cooldown_s = cooldown_s
+        self.max_cooldown_s = max_cooldown_s
+        self.first_wait_s = first_wait_s
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()     # one fetch at a time
+        self._first = threading.Event()         # set after the first fetch attempt finishes
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._post: dict = dict(wp_client.EMPTY_POST, acf={})
+        self._etag: Optional[str] = None
+        self._checked = 0.0                     # monotonic time of the last successful check
+        self._open_until = 0.0
+        self._cooldown = cooldown_s
+        self.version = 0                        # bumped whenever the snapshot changes
+        self.refreshes = 0
+        self.changed = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.breaker_opens = 0
+        self.skipped = 0                        # refreshes skipped while the breaker was open
+        self.last_refresh_ms = 0.0
+        self.total_refresh_ms = 0.0
+        self.last_error = ""
+
+    # --- reading ---
+
+    def get(self) -> dict:
+        """The current snapshot; only the very first call may wait (up to first_wait_s)."""
+        if not self._first.is_set():
+            if self._thread is None:
+                threading.Thread(target=self.refresh, daemon=True).start()
+            self._first.wait(self.first_wait_s)
+        with self._lock:
+            stale = not self._checked or time.monotonic() - self._checked > self.refresh_s
+        if stale and self._thread is None:
+            threading.Thread(target=self.refresh, daemon=True).start()   # no loop running: refresh lazily
+        with self._lock:
+            return self._post
+
+    def breaker(self) -> str:
+        with self._lock:
+            if self.consecutive_failures < self.failures_to_open:
+                return "closed"
+            return "open" if time.monotonic() < self._open_until else "half-open"
+
+    # --- refreshing ---
+
+    def refresh(self, force: bool = False) -> str:
+        """One conditional fetch. Returns changed / not_modified / empty / error / open / busy."""
+        if not self._refreshing.acquire(blocking=False):
+            return "busy"
+        try:
+            if not force and self.breaker() == "open":
+                with self._lock:
+                    self.skipped += 1
+                return "open"
+            with self._lock:
+                etag, post = self._etag, self._post
+            t0 = time.perf_counter()
+            try:
+                status, new, etag = wp_client.fetch_brain_post(etag=etag, modified_after=post.get("modified"),
+                                                               timeout=self.timeout_s)
+                if status == "changed" and post.get("id") is not None and new.get("id") != post.get("id"):
+                    # modified_after can return an older post that was edited; get the latest outright
+                    status, new, etag = wp_client.fetch_brain_post(timeout=self.timeout_s)
+            except Exception as e:
+                self._failed(e, (time.perf_counter() - t0) * 1000)
+                return "error"
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                self.refreshes += 1
+                self.last_refresh_ms = ms
+                self.total_refresh_ms += ms
+                self._checked = time.monotonic()
+                self._etag = etag
+                self.consecutive_failures = 0
+                self._cooldown = self.cooldown_s
+                self.last_error = ""
+                if status == "not_modified":
+                    self.not_modified += 1
+                else:
+                    self._post = new if status == "changed" else dict(wp_client.EMPTY_POST, acf={})
+                    self.changed += 1
+                    self.version += 1
+            if status == "changed":
+                log.info(f"Brain post {new.get('id')} loaded ({ms:.0f} ms)")
+            elif status == "empty":
+                log.warning("No posts found with ACF (ok on first run).")
+            return status
+        finally:
+            self._refreshing.release()
+            self._first.set()
+
+    def _failed(self, e: Exception, ms: float) -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_refresh_ms = ms
+            self.last_error = str(e)[:200]
+            opened = self.consecutive_failures >= self.failures_to_open
+            if opened:
+                self._open_until = time.monotonic() + self._cooldown
+                cooldown = self._cooldown
+                self._cooldown = min(self.max_cooldown_s, self._cooldown * 2)
+                self.breaker_opens += 1
+        if opened:
+            log.warning(f"WordPress unreachable ({e}); serving the last brain snapshot, next try in {cooldown:.0f} s")
+        else:
+            log.info(f"Brain refresh failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="brain-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._wake.wait(self.refresh_s)
+            self._wake.clear()
+
+    # --- reporting ---
+
+    def stats(self) -> dict:
+        breaker = self.breaker()
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "post_id": self._post.get("id"),
+                "modified": self._post.get("modified"),
+                "version": self.version,
+                "age_s": round(now - self._checked, 1) if self._checked else None,
+                "refresh_s": self.refresh_s,
+                "refreshes": self.refreshes,
+                "changed": self.changed,
+                "not_modified": self.not_modified,
+                "failures": self.failures,
+                "last_refresh_ms": round(self.last_refresh_ms, 1),
+                "avg_refresh_ms": round(self.total_refresh_ms / self.refreshes, 1) if self.refreshes else 0.0,
+                "breaker": breaker,
+                "breaker_opens": self.breaker_opens,
+                "retry_in_s": round(self._open_until - now, 1) if breaker == "open" else 0.0,
+                "skipped": self.skipped,
+                "last_error": self.last_error,
+            }
+
+
+_cache: Optional[BrainCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> BrainCache:
+    """The process-wide brain snapshot (not refreshed in the background until start())."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BrainCache()
+        return _cache
+
+
+def get_brain() -> dict:
+    """Drop-in for wp_client.get_latest_brain_post() that never blocks a turn on WordPress."""
+    return get_cache().get()
+
+
+def start() -> None:
+    get_cache().start()
+
+
+def stats() -> dict:
+    return get_cache().stats()
@@ -0,0 +1,249 @@
+# agent/memory/dialogue_index.py
+# Instant replies from the brain post. The ACF fields agent_dialogue
+# (prewritten lines) and agent_knowledge (facts and notes) were never used;
+# every command went to the model. This keeps a character n-gram TF-IDF
+# index over them: a command that closely matches a prewritten prompt gets
+# its reply straight away, a command that closely matches a fact gets the
+# fact, and anything below the confidence threshold goes to respond() as
+# before. Character n-grams tolerate STT spelling and word-boundary slips
+# ("what's your name" / "whats you're name") better than whole words.
+#
+# Accepted field formats (JSON or plain text):
+#   agent_dialogue:  [{"prompt": "...", "reply": "..."}, ...]  or  {"prompt": "reply", ...}
+#                    or lines "prompt => reply" / "prompt | reply", or "Q: ..." / "A: ..." pairs
+#   agent_knowledge: {"topic": "fact", ...}  or  ["fact", ...]  or one fact per line/paragraph
+#                    ("topic: fact" lines are matched on the topic)
+#
+# update() is called with each fetched brain post and is cheap when nothing
+# changed; when it did, only new or edited entries are re-tokenized and the
+# posting lists are rebuilt from the cached n-gram counts.
+# Dependencies: numpy
+
+from __future__ import annotations
+import hashlib, json, math, re, threading, time
+from collections import Counter
+from typing import Optional
+import numpy as np
+
+from agent.utils.logger import get_logger
+
+log = get_logger("dialogue_index")
+
+NGRAM = 3
+MIN_SCORE = 0.8             # cosine similarity a dialogue prompt needs to answer without the model
+KNOWLEDGE_MIN_SCORE = 0.7   # the same for knowledge topics (shorter, so matches score lower)
+MIN_MARGIN = 0.05           # ...and this much ahead of the best entry with a different reply
+FIELDS = ("agent_dialogue", "agent_knowledge")
+
+_WORDS = re.compile(r"[a-z0-9']+")
+_PAIR = re.compile(r"\s*(?:=>|->|\|)\s*")
+_TOPIC = re.compile(r"^([^:.!?]{2,40}):\s+(.+)$")
+_QA = re.compile(r"^\s*(q|a|question|answer|user|agent)\s*:\s*(.*)$", re.I)
+_PROMPT_KEYS = ("prompt", "q", "question", "trigger", "user", "input")
+_REPLY_KEYS = ("reply", "a", "answer", "response", "agent", "output", "text")
+
+
+def ngrams(text: str, n: int = NGRAM) -> Counter:
+    """Character n-grams of each word, padded so word starts and ends count ('_wh', 'at_')."""
+    grams: Counter = Counter()
+    for w in _WORDS.findall((text or "").lower()):
+        w = f"_{w}_"
+        if len(w) <= n:
+            grams[w] += 1
+            continue
+        for i in range(len(w) - n + 1):
+            grams[w[i:i + n]] += 1
+    return grams
+
+
+def _first(d: dict, keys) -> str:
+    for k in keys:
+        if d.get(k):
+            return str(d[k]).strip()
+    return ""
+
+
+def parse_dialogue(value) -> list[tuple[str, str]]:
+    """(prompt, reply) pairs from an agent_dialogue value."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    if isinstance(value, dict):
+        return [(str(k).strip(), str(v).strip()) for k, v in value.items() if str(k).strip() and str(v).strip()]
+    if isinstance(value, list):
+        out = []
+        for item in value:
+            if isinstance(item, dict):
+                p, r = _first(item, _PROMPT_KEYS), _first(item, _REPLY_KEYS)
+                if p and r:
+                    out.append((p, r))
+        return out
+    out, prompt = [], None
+    for line in str(value or "").splitlines():
+        m = _QA.match(line)
+        if m:
+            if m.group(1).lower() in ("q", "question", "user"):
+                prompt = m.group(2).strip()
+            elif prompt:
+                out.append((prompt, m.group(2).strip()))
+                prompt = None
+            continue
+        parts = _PAIR.split(line.strip(), maxsplit=1)
+        if len(parts) == 2 and parts[0] and parts[1]:
+            out.append((parts[0], parts[1]))
+    return out
+
+
+def parse_knowledge(value) -> list[tuple[str, str]]:
+    """(text to match, fact to say) pairs from an agent_knowledge value."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    if isinstance(value, dict):
+        return [(str(k).strip(), str(v).strip()) for k, v in value.items() if str(k).strip() and str(v).strip()]
+    if isinstance(value, list):
+        return [(str(v), str(v).strip()) for v in value if isinstance(v, (str, int, float)) and str(v).strip()]
+    text = str(value or "")
+    chunks = re.split(r"\n\s*\n", text) if "\n\n" in text else text.splitlines()
+    out = []
+    for c in (c.strip() for c in chunks):
+        m = _TOPIC.match(c)
+        if m:
+            out.append((m.group(1).strip(), m.group(2).strip()))
+        elif c:
+            out.append((c, c))
+    return out
+
+
+class CannedReply:
+    __slots__ = ("reply", "field", "score", "matched", "us")
+
+    def __init__(self, reply: str, field: str, score: float, matched: str, us: float):
+        self.reply, self.field, self.score, self.matched, self.us = reply, field, score, matched, us
+
+
+class DialogueIndex:
+    """TF-IDF over character n-grams with an inverted index (NumPy posting arrays).
+
+    Documents are the dialogue prompts and knowledge topics; lookup()
+    returns the best entry's reply when its cosine similarity clears the
+    threshold for its field (min_score / knowledge_min_score) and beats the
+    runner-up with a different reply by min_margin.
+    """
+
+    def __init__(self, min_score: float = MIN_SCORE, knowledge_min_score: float = KNOWLEDGE_MIN_SCORE,
+                 min_margin: float = MIN_MARGIN):
+        self.min_score = min_score
+        self.knowledge_min_score = knowledge_min_score
+        self.min_margin = min_margin
+        self._lock = threading.Lock()
+        self._source = ""                       # hash of the fields the index was built from
+        self._counts: dict[str, Counter] = {}   # entry hash -> n-gram counts (kept across rebuilds)
+        self._docs: list[tuple[str, str, str]] = []     # (field, text, reply)
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}   # gram -> (doc ids, weights)
+        self._idf: dict[str, float] = {}
+        self.builds = 0
+        self.last_build_ms = 0.0
+        self.lookups = 0
+        self.hits = 0
+        self.total_us = 0.0
+        self.last_score = 0.0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def update(self, acf: Optional[dict]) -> bool:
+        """Re-index if agent_dialogue / agent_knowledge changed; returns True if it did."""
+        acf = acf or {}
+        raw = json.dumps([acf.get(f) for f in FIELDS], sort_keys=True, default=str)
+        source = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        if source == self._source:
+            return False
+        t0 = time.perf_counter()
+        docs = [("agent_dialogue", p, r) for p, r in parse_dialogue(acf.get("agent_dialogue"))]
+        docs += [("agent_knowledge", t, r) for t, r in parse_knowledge(acf.get("agent_knowledge"))]
+        counts, keys = {}, []
+        for _, text, _ in docs:
+            key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            counts[key] = self._counts.get(key) or ngrams(text)     # unchanged entries are not re-tokenized
+            keys.append(key)
+        n = len(docs)
+        df: Counter = Counter()
+        for key in keys:
+            df.update(counts[key].keys())
+        idf = {g: math.log((1 + n) / (1 + c)) + 1.0 for g, c in df.items()}
+        lists: dict[str, tuple[list, list]] = {}
+        for i, key in enumerate(keys):
+            vec = {g: c * idf[g] for g, c in counts[key].items()}
+            norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+            for g, v in vec.items():
+                ids, ws = lists.setdefault(g, ([], []))
+                ids.append(i)
+                ws.append(v / norm)
+        postings = {g: (np.asarray(ids, dtype=np.int32), np.asarray(ws, dtype=np.float32))
+                    for g, (ids, ws) in lists.items()}
+        with self._lock:
+            self._source, self._counts, self._docs = source, counts, docs
+            self._postings, self._idf = postings, idf
+            self.builds += 1
+            self.last_build_ms = (time.perf_counter() - t0) * 1000
+        log.info(f"Dialogue index: {n} entries ({self.last_build_ms:.1f} ms)")
+        return True
+
+    def search(self, text: str, k: int = 3) -> list[tuple[float, int]]:
+        """Top k (score, doc index) by cosine similarity."""
+        with self._lock:
+            docs, postings, idf = self._docs, self._postings, self._idf
+        if not docs:
+            return []
+        q = {g: c * idf[g] for g, c in ngrams(text).items() if g in idf}
+        norm = math.sqrt(sum(v * v for v in q.values()))
+        if not norm:
+            return []
+        scores = np.zeros(len(docs), dtype=np.float32)
+        for g, v in q.items():
+            ids, ws = postings[g]
+            scores[ids] += ws * (v / norm)
+        top = np.argsort(-scores)[:k]
+        return [(float(scores[i]), int(i)) for i in top if scores[i] > 0]
+
+    def lookup(self, text: str) -> Optional[CannedReply]:
+        """The reply for text if one entry matches confidently, else None (ask the model)."""
+        t0 = time.perf_counter()
+        ranked = self.search(text, k=5)
+        hit = None
+        if ranked:
+            best_score, best = ranked[0]
+            field, matched, reply = self._docs[best]
+            need = self.min_score if field == "agent_dialogue" else self.knowledge_min_score
+            runner = next((s for s, i in ranked[1:] if self._docs[i][2] != reply), 0.0)
+            if best_score >= need and best_score - runner >= self.min_margin:
+                hit = CannedReply(reply, field, best_score, matched, 0.0)
+        us = (time.perf_counter() - t0) * 1e6
+        with self._lock:
+            self.lookups += 1
+            self.total_us += us
+            self.last_score = ranked[0][0] if ranked else 0.0
+            if hit is not None:
+                self.hits += 1
+                hit.us = us
+        return hit
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._docs),
+                "builds": self.builds,
+                "last_build_ms": round(self.last_build_ms, 1),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "avg_lookup_us": round(self.total_us / self.lookups, 1) if self.lookups else 0.0,
+                "last_score": round(self.last_score, 3),
+                "min_score": self.min_score,
+                "knowledge_min_score": self.knowledge_min_score,
+            }
@@ -0,0 +1,257 @@
+# agent/memory/memory_store.py
+# Local mirror of the WordPress memory posts. The brain snapshot is only
+# the newest post (per_page=1), so older memory posts were never visible to
+# the agent, and reading many posts over REST on a turn would be far too
+# slow. MemoryStore keeps every post and all of its ACF fields (agent_memory,
+# agent_knowledge, agent_constants, ...) in SQLite:
+#   posts(id, date, modified, title, acf JSON)
+#   fields(post_id, name, value)   one row per ACF field, indexed by name
+#   fields_fts                     FTS5 over field values (LIKE if unavailable)
+# sync() asks only for posts modified after the newest one it has, in pages
+# of page_size, ordered by modification date, and upserts each page in one
+# transaction. The cursor is saved after every page, so an interrupted sync
+# resumes where it stopped. Deleted posts are only noticed by sync(full=True).
+# decision_engine queries it through recall().
+# Dependencies: sqlite3 (stdlib); requests (via wp_client)
+
+from __future__ import annotations
+import json, os, re, sqlite3, threading, time
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+from agent.memory import wp_client
+from agent.utils.logger import get_logger
+
+log = get_logger("memory_store")
+
+PAGE_SIZE = 100             # posts per REST request (the WordPress maximum)
+SYNC_S = 300.0              # background sync interval
+OVERLAP_S = 1               # re-ask for the last second: modified times have 1 s resolution
+RECALL_FIELDS = ("agent_memory", "agent_knowledge")
+SNIPPET_CHARS = 200
+RELATIVE_SCORE = 0.5        # search() drops FTS hits scoring under this share of the best one
+
+_WORDS = re.compile(r"[a-z0-9]{3,}")
+_STOP = frozenset("the and for you your are was what when where who how why can could would should "
+                  "this that with from have has had about tell show give please agent let".split())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (id INTEGER PRIMARY KEY, date TEXT, modified TEXT, title TEXT, acf TEXT);
+CREATE INDEX IF NOT EXISTS posts_date ON posts(date);
+CREATE INDEX IF NOT EXISTS posts_modified ON posts(modified);
+CREATE TABLE IF NOT EXISTS fields (post_id INTEGER, name TEXT, value TEXT, PRIMARY KEY (post_id, name));
+CREATE INDEX IF NOT EXISTS fields_name ON fields(name, post_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _text(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _title(post: dict) -> str:
+    t = post.get("title")
+    return (t.get("rendered") or "") if isinstance(t, dict) else str(t or "")
+
+
+class MemoryStore:
+    """SQLite mirror of the WordPress posts and their ACF fields; safe to share between threads."""
+
+    def __init__(self, path: str = ":memory:", page_size: int = PAGE_SIZE):
+        self.path = path
+        self.page_size = page_size
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS fields_fts USING fts5("
+                             "value, name UNINDEXED, post_id UNINDEXED, tokenize='porter')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False    # SQLite built without FTS5: search() falls back to LIKE
+        self._db.commit()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.syncs = 0
+        self.pages = 0
+        self.upserts = 0
+        self.failures = 0
+        self.last_sync_ms = 0.0
+        self.last_error = ""
+        self.queries = 0
+        self.query_us = 0.0
+
+    # --- sync ---
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def upsert(self, posts: Sequence[dict]) -> None:
+        """Store posts (REST shape: id, date, modified, title, acf) in one transaction."""
+        with self._lock, self._db:
+            for p in posts:
+                acf = p.get("acf") or {}
+                if not isinstance(acf, dict):
+                    acf = {}        # ACF returns [] for a post without field values
+                self._db.execute("INSERT OR REPLACE INTO posts (id, date, modified, title, acf) VALUES (?, ?, ?, ?, ?)",
+                                 (p["id"], p.get("date"), p.get("modified"), _title(p), json.dumps(acf)))
+                self._db.execute("DELETE FROM fields WHERE post_id = ?", (p["id"],))
+                rows = [(p["id"], name, _text(v)) for name, v in acf.items() if v not in (None, "", [], {})]
+                self._db.executemany("INSERT INTO fields (post_id, name, value) VALUES (?, ?, ?)", rows)
+                if self.fts:
+                    self._db.execute("DELETE FROM fields_fts WHERE post_id = ?", (p["id"],))
+                    self._db.executemany("INSERT INTO fields_fts (post_id, name, value) VALUES (?, ?, ?)", rows)
+            self.upserts += len(posts)
+
+    def sync(self, full: bool = False) -> int:
+        """Fetch posts modified since the last sync (all posts if full); returns how many were stored."""
+        t0 = time.perf_counter()
+        with self._lock:
+            cursor = None if full else self._meta("cursor")
+        after = None
+        if cursor:
+            after = (datetime.fromisoformat(cursor) - timedelta(seconds=OVERLAP_S)).isoformat()
+        seen: set[int] = set()
+        page, pages, n = 1, 1, 0
+        try:
+            while page <= pages:
+                posts, pages = wp_client.fetch_posts_page(page, self.page_size, after)
+                self.pages += 1
+                if not posts:
+                    break
+                self.upsert(posts)
+                n += len(posts)
+                seen.update(p["id"] for p in posts)
+                newest = max(p.get("modified") or "" for p in posts)
+                with self._lock, self._db:
+                    if newest > (self._meta("cursor") or ""):
+                        self._set_meta("cursor", newest)
+                page += 1
+            if full:
+                with self._lock, self._db:
+                    ids = [r[0] for r in self._db.execute("SELECT id FROM posts")]
+                    gone = [(i,) for i in ids if i not in seen]
+                    self._db.executemany("DELETE FROM posts WHERE id = ?", gone)
+                    self._db.executemany("DELETE FROM fields WHERE post_id = ?", gone)
+                    if self.fts:
+                        self._db.executemany("DELETE FROM fields_fts WHERE post_id = ?", gone)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)[:200]
+            log.warning(f"Memory sync stopped after {n} posts: {e}")
+            return n
+        self.syncs += 1
+        self.last_error = ""
+        self.last_sync_ms = (time.perf_counter() - t0) * 1000
+        if n:
+            log.info(f"Memory sync: {n} posts in {self.last_sync_ms:.0f} ms")
+        return n
+
+    def start(self, interval_s: float = SYNC_S) -> None:
+        """Sync now and then every interval_s on a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.sync()
+                self._stop.wait(interval_s)
+
+        self._thread = threading.Thread(target=loop, name="memory-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    # --- queries ---
+
+    def _timed(self, sql: str, args: tuple) -> list:
+        t0 = time.perf_counter()
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+            self.queries += 1
+            self.query_us += (time.perf_counter() - t0) * 1e6
+        return rows
+
+    def __len__(self) -> int:
+        return self._timed("SELECT COUNT(*) FROM posts", ())[0][0]
+
+    def get(self, post_id: int) -> Optional[dict]:
+        rows = self._timed("SELECT id, date, modified, title, acf FROM posts WHERE id = ?", (post_id,))
+        return self._post(rows[0]) if rows else None
+
+    def latest(self, n: int = 1) -> list[dict]:
+        """The newest posts by publish date (private memory posts included, unlike the brain post)."""
+        rows = self._timed("SELECT id, date, modified, title, acf FROM posts ORDER BY date DESC, id DESC LIMIT ?", (n,))
+        return [self._post(r) for r in rows]
+
+    def field(self, name: str, limit: int = 10) -> list[tuple[int, str]]:
+        """(post id, value) of one ACF field across posts, newest first."""
+        return self._timed("SELECT f.post_id, f.value FROM fields f JOIN posts p ON p.id = f.post_id "
+                           "WHERE f.name = ? ORDER BY p.date DESC, p.id DESC LIMIT ?", (name, limit))
+
+    def search(self, text: str, fields: Sequence[str] = RECALL_FIELDS, limit: int = 5) -> list[tuple[int, str, str]]:
+        """(post id, field, value) whose value shares words with text, best first.
+
+        With FTS5 the hits are ranked by BM25, and hits that only share common
+        words with text (under RELATIVE_SCORE of the best) are left out.
+        """
+        words = [w for w in _WORDS.findall((text or "").lower()) if w not in _STOP][:12]
+        if not words or not fields:
+            return []
+        marks = ",".join("?" * len(fields))
+        if self.fts:
+            query = " OR ".join(f'"{w}"' for w in words)
+            rows = self._timed(f"SELECT post_id, name, value, bm25(fields_fts) AS rank FROM fields_fts "
+                               f"WHERE fields_fts MATCH ? AND name IN ({marks}) ORDER BY rank LIMIT ?",
+                               (query, *fields, limit))
+            best = rows[0][3] if rows else 0.0      # bm25() is negative: lower is better
+            return [(i, name, value) for i, name, value, rank in rows if rank <= best * RELATIVE_SCORE]
+        like = " OR ".join("LOWER(f.value) LIKE ?" for _ in words)
+        return self._timed(f"SELECT f.post_id, f.name, f.value FROM fields f JOIN posts p ON p.id = f.post_id "
+                           f"WHERE f.name IN ({marks}) AND ({like}) ORDER BY p.date DESC LIMIT ?",
+                           (*fields, *(f"%{w}%" for w in words), limit))
+
+    def recall(self, text: str, limit: int = 3, fields: Sequence[str] = RECALL_FIELDS) -> list[str]:
+        """Short snippets from the memory posts that relate to text (for the prompt)."""
+        out = []
+        for _, _, value in self.search(text, fields, limit):
+            v = " ".join(value.split())
+            out.append(v if len(v) <= SNIPPET_CHARS else v[:SNIPPET_CHARS - 1] + "…")
+        return out
+
+    @staticmethod
+    def _post(row) -> dict:
+        return {"id": row[0], "date": row[1], "modified": row[2], "title": row[3], "acf": json.loads(row[4] or "{}")}
+
+    def stats(self) -> dict:
+        with self._lock:
+            posts = self._db.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+            fields = self._db.execute("SELECT COUNT(*) FROM fields").fetchone()[0]
+            cursor = self._meta("cursor")
+            return {
+                "posts": posts,
+                "fields": fields,
+                "cursor": cursor,
+                "syncs": self.syncs,
+                "pages": self.pages,
+                "upserts": self.upserts,
+                "failures": self.failures,
+                "last_sync_ms": round(self.last_sync_ms, 1),
+                "last_error": self.last_error,
+                "queries": self.queries,
+                "avg_query_us": round(self.query_us / self.queries, 1) if self.queries else 0.0,
+                "fts": self.fts,
+            }
@@ -1,9 +1,13 @@
-import json, base64, requests
+import json, base64, random, threading, time, requests
+from collections import deque
+from typing import Callable, Optional
 from agent.config.settings import WP_BASE_URL, WP_JWT_TOKEN, WP_USERNAME, WP_APP_PASSWORD
 from agent.utils.logger import get_logger
 log = get_logger("wp_client")
 
 SESSION = requests.Session()
+EMPTY_POST = {"id": None, "title": None, "modified": None, "acf": {}}
+BATCH_MAX = 25          # sub-requests WordPress accepts in one batch/v1 call
 
 def _auth_headers():
     if WP_JWT_TOKEN:
@@ -13,16 +17,12 @@ def _auth_headers():
         return {"Authorization": f"Basic {token}"}
     return {}
 
-def get_latest_brain_post():
-    url = f"{WP_BASE_URL}/wp-json/wp/v2/posts?per_page=1&_fields=id,title,acf"
-    r = SESSION.get(url, headers=_auth_headers(), timeout=20)
-    r.raise_for_status()
-    data = r.json()
-    if not data:
-        log.warning("No posts found with ACF (ok on first run).")
-        return {"id": None, "title": None, "acf": {}}
-    post = data[0]
-    acf = post.get("acf", {})
+def can_write() -> bool:
+    """True when credentials are configured (needed to create posts)."""
+    return bool(_auth_headers())
+
+def _parse_post(post: dict) -> dict:
+    acf = post.get("acf") or {}
     # Try to parse JSON strings
     for key in ("agent_personality", "agent_emotions"):
         if isinstance(acf.get(key), str):
@@ -30,4 +30,261 @@ def get_latest_brain_post():
                 acf[key] = json.loads(acf[key])
             except Exception:
                 pass
-    return {"id": post.get("id"), "title": post.get("title"), "acf": acf}
+    return {"id": post.get("id"), "title": post.get("title"), "modified": post.get("modified"), "acf": acf}
+
+def fetch_brain_post(etag: Optional[str] = None, modified_after: Optional[str] = None,
+                     timeout: float = 20):
+    """Conditional fetch of the latest post: (status, post or None, etag).
+
+    status is "changed" (post is the latest brain post), "not_modified" (the
+    server answered 304 to If-None-Match, or nothing was modified after
+    modified_after; post is None) or "empty" (no posts at all).
+    """
+    url = f"{WP_BASE_URL}/wp-json/wp/v2/posts?per_page=1&_fields=id,title,modified,acf"
+    if modified_after:
+        url += f"&modified_after={modified_after}"
+    headers = _auth_headers()
+    if etag:
+        headers["If-None-Match"] = etag
+    r = SESSION.get(url, headers=headers, timeout=timeout)
+    if r.status_code == 304:
+        return "not_modified", None, etag
+    r.raise_for_status()
+    data = r.json()
+    new_etag = r.headers.get("ETag") or etag
+    if not data:
+        return ("not_modified" if modified_after else "empty"), None, new_etag
+    return "changed", _parse_post(data[0]), new_etag
+
+def fetch_posts_page(page: int = 1, per_page: int = 100, modified_after: Optional[str] = None,
+                     timeout: float = 30):
+    """One page of posts oldest-modified first, with every ACF field: (posts, total pages).
+
+    With credentials, private posts (MemoryWriter's episodes) are included;
+    WordPress only lists published posts to anonymous requests.
+    """
+    url = (f"{WP_BASE_URL}/wp-json/wp/v2/posts?per_page={per_page}&page={page}"
+           f"&orderby=modified&order=asc&_fields=id,date,modified,title,acf")
+    if modified_after:
+        url += f"&modified_after={modified_after}"
+    headers = _auth_headers()
+    if headers:
+        url += "&status=publish,private"
+    r = SESSION.get(url, headers=headers, timeout=timeout)
+    if r.status_code == 400 and page > 1:
+        return [], page - 1     # WordPress answers 400 for a page past the end
+    r.raise_for_status()
+    return r.json() or [], int(r.headers.get("X-WP-TotalPages") or 1)
+
+def get_latest_brain_post():
+    status, post, _ = fetch_brain_post()
+    if status == "empty":
+        log.warning("No posts found with ACF (ok on first run).")
+        return dict(EMPTY_POST, acf={})
+    return post
+
+
+class MemoryWriter:
+    """Write-behind of interactions into agent_memory, so a turn never waits on WordPress.
+
+    add() only appends to an in-memory queue. A daemon thread flushes when
+    flush_items interactions are waiting or the oldest has waited flush_s:
+    the queue is coalesced into episodes of up to flush_items turns, each
+    one private post whose agent_memory holds the transcript, and all of
+    them go out in one /batch/v1 request (one POST per episode if the site
+    has no batch endpoint). Failed episodes are retried with exponential
+    backoff and jitter; those WordPress rejects (4xx other than 429) are
+    dropped. Private posts stay out of the brain post (fetch_brain_post()
+    only asks for published ones) and the public list, but reach other
+    machines' memory mirrors through fetch_posts_page().
+    on_written, if given, receives the created posts (e.g. the local
+    memory mirror's upsert).
+    """
+
+    def __init__(self, flush_items: int = 20, flush_s: float = 60.0, max_queue: int = 1000,
+                 backoff_s: float = 2.0, max_backoff_s: float = 300.0, timeout: float = 30,
+                 on_written: Optional[Callable[[list], None]] = None):
+        self.flush_items = flush_items
+        self.flush_s = flush_s
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.timeout = timeout
+        self.on_written = on_written
+        self._queue: deque = deque(maxlen=max_queue)   # (epoch s, user text, reply)
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._retry_at = 0.0
+        self._attempt = 0
+        self.batch_supported = True
+        self.added = 0
+        self.written = 0            # interactions stored in WordPress
+        self.posts = 0
+        self.flushes = 0
+        self.retries = 0
+        self.rejected = 0           # interactions WordPress refused (not retried)
+        self.dropped = 0            # interactions pushed out of a full queue
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_error = ""
+
+    def add(self, user_text: str, reply: str) -> None:
+        """Queue one interaction; never blocks on the network."""
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((time.time(), user_text, reply))
+            self.added += 1
+            full = len(self._queue) >= self.flush_items
+        if full:
+            self._wake.set()
+
+    def _due(self) -> bool:
+        with self._lock:
+            if not self._queue or time.monotonic() < self._retry_at:
+                return False
+            return len(self._queue) >= self.flush_items or time.time() - self._queue[0][0] >= self.flush_s
+
+    @staticmethod
+    def _episode(items: list) -> dict:
+        lines = []
+        for ts, user_text, reply in items:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+            lines.append(f"[{stamp}] YOU: {user_text}\n[{stamp}] AGENT: {reply}")
+        first = time.strftime("%Y-%m-%d %H:%M", time.localtime(items[0][0]))
+        last = time.strftime("%H:%M", time.localtime(items[-1][0]))
+        return {"title": f"Agent memory {first}-{last}", "status": "private",
+                "acf": {"agent_memory": "\n".join(lines)}}
+
+    def _send(self, bodies: list) -> list:
+        """POST the episodes; returns (status, body) per episode."""
+        headers = _auth_headers()
+        if self.batch_supported:
+            payload = {"requests": [{"method": "POST", "path": "/wp/v2/posts", "body": b} for b in bodies]}
+            r = SESSION.post(f"{WP_BASE_URL}/wp-json/batch/v1", json=payload, headers=headers, timeout=self.timeout)
+            if r.status_code != 404:
+                r.raise_for_status()
+                return [(x.get("status", 500), x.get("body")) for x in r.json().get("responses", [])]
+            self.batch_supported = False
+            log.info("No batch/v1 endpoint on this site; writing memory posts one by one")
+        out = []
+        for b in bodies:
+            r = SESSION.post(f"{WP_BASE_URL}/wp-json/wp/v2/posts", json=b, headers=headers, timeout=self.timeout)
+            if r.status_code >= 500 or r.status_code == 429:
+                r.raise_for_status()
+            out.append((r.status_code, r.json() if r.content else None))
+        return out
+
+    def flush(self) -> int:
+        """Write everything queued now; returns how many interactions were stored."""
+        if not self._flushing.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                items = list(self._queue)
+                self._queue.clear()
+            if not items:
+                return 0
+            episodes = [items[i:i + self.flush_items] for i in range(0, len(items), self.flush_items)]
+            t0 = time.perf_counter()
+            retry, created, written = [], [], 0
+            for i in range(0, len(episodes), BATCH_MAX):
+                chunk = episodes[i:i + BATCH_MAX]
+                try:
+                    results = self._send([self._episode(e) for e in chunk])
+                except Exception as e:
+                    self.last_error = str(e)[:200]
+                    code = getattr(getattr(e, "response", None), "status_code", None) or 0
+                    if 400 <= code < 500 and code != 429:
+                        self.rejected += sum(len(x) for x in chunk)    # bad request or auth: retrying won't help
+                    else:
+                        retry.extend(chunk)
+                    continue
+                for episode, (status, body) in zip(chunk, results + [(500, None)] * (len(chunk) - len(results))):
+                    if 200 <= status < 300:
+                        written += len(episode)
+                        created.append(body)
+                    elif status >= 500 or status == 429:
+                        retry.append(episode)
+                    else:
+                        self.rejected += len(episode)
+                        self.last_error = f"HTTP {status}: {str(body)[:150]}"
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                self.flushes += 1
+                self.last_flush_ms = ms
+                self.total_flush_ms += ms
+                self.written += written
+                self.posts += len(created)
+                if retry:
+                    for item in reversed([x for e in retry for x in e]):
+                        if len(self._queue) == self._queue.maxlen:
+                            self.dropped += 1
+                            continue
+                        self._queue.appendleft(item)
+                    self._attempt += 1
+                    self.retries += 1
+                    delay = min(self.max_backoff_s, self.backoff_s * 2 ** (self._attempt - 1))
+                    self._retry_at = time.monotonic() + delay * random.uniform(0.8, 1.2)
+                else:
+                    self._attempt = 0
+                    self._retry_at = 0.0
+            if retry:
+                log.warning(f"Memory write-back failed ({self.last_error}); retrying in {delay:.0f} s")
+            if created and self.on_written is not None:
+                try:
+                    self.on_written([c for c in created if isinstance(c, dict)])
+                except Exception as e:
+                    log.warning(f"Memory write-back callback failed: {e}")
+            return written
+        finally:
+            self._flushing.release()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True) -> None:
+        """Stop the flusher; with flush, make one last attempt to write what is queued."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+        if flush:
+            self._retry_at = 0.0
+            self.flush()
+
+    def _loop(self) -> None:
+        tick = max(0.05, min(1.0, self.flush_s / 4))
+        while not self._stop.is_set():
+            if self._due():
+                self.flush()
+            self._wake.wait(tick)
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth = len(self._queue)
+            oldest = time.time() - self._queue[0][0] if depth else 0.0
+            return {
+                "queued": depth,
+                "oldest_s": round(oldest, 1),
+                "added": self.added,
+                "written": self.written,
+                "posts": self.posts,
+                "flushes": self.flushes,
+                "last_flush_ms": round(self.last_flush_ms, 1),
+                "avg_flush_ms": round(self.total_flush_ms / self.flushes, 1) if self.flushes else 0.0,
+                "retries": self.retries,
+                "retry_in_s": round(max(0.0, self._retry_at - time.monotonic()), 1),
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "batch": self.batch_supported,
+                "last_error": self.last_error,
+            }
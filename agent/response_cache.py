@@ -0,0 +1,150 @@
+# agent/response_cache.py
+# Replies to repeated commands. Many spoken requests come back word for word
+# ("explain error ..." rewritten by a macro, "summarize the repo" from the
+# phone), and each used to cost a full model call. The cache keys a reply on
+# the normalized command plus the persona/mood it was answered in, keeps at
+# most max_items (least recently used go first), lets each entry expire
+# after ttl_s, and can be backed by a JSON file so it survives restarts.
+# Saying the bypass phrase ("no cache ...") skips the lookup and stores the
+# fresh answer in place of the old one.
+# Dependencies: none (stdlib)
+
+from __future__ import annotations
+import json, os, re, threading, time, contextlib
+from collections import OrderedDict
+from typing import Optional
+
+from agent.utils.logger import get_logger
+
+log = get_logger("response_cache")
+
+MAX_ITEMS = 256
+TTL_S = 3600                # a cached reply is answered again by the model after this long
+BYPASS_PHRASE = "no cache"
+
+_SPACE = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s.!?,;:]+$")
+
+
+def normalize(text: str) -> str:
+    """Case, spacing and trailing punctuation don't change the command."""
+    return _TRAILING.sub("", _SPACE.sub(" ", (text or "").strip().lower()))
+
+
+def cache_key(text: str, persona=None, mood=None, memory: str = "") -> str:
+    key = f"{persona or ''}|{mood or ''}|{normalize(text)}"
+    return f"{key}|{memory}" if memory else key
+
+
+class ResponseCache:
+    """LRU of (reply, expiry, generation ms) by cache_key(), optionally persisted to path.
+
+    The file is rewritten (via a temporary file and rename) after every
+    put(), so a crash never leaves it half written; expired entries are
+    dropped when it is loaded.
+    """
+
+    def __init__(self, max_items: int = MAX_ITEMS, ttl_s: float = TTL_S, path: Optional[str] = None,
+                 bypass_phrase: str = BYPASS_PHRASE):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.path = path
+        phrase = re.escape(normalize(bypass_phrase)).replace(r"\ ", r"\s+")
+        self._bypass = re.compile(rf"^\s*{phrase}\b[\s,.:;]*|[\s,.:;]+{phrase}[\s.!?]*$", re.I) if phrase else None
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, tuple[str, float, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expired = 0
+        self.saved_ms = 0
+        if path:
+            self._load()
+
+    def split_bypass(self, text: str) -> tuple[str, bool]:
+        """(text without the bypass phrase, whether it was said)."""
+        if self._bypass is None:
+            return text, False
+        stripped = self._bypass.sub("", text or "", count=1)
+        return (stripped, True) if stripped != (text or "") else (text, False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] <= time.time():
+                del self._items[key]
+                self.expired += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += item[2]
+            return item[0]
+
+    def put(self, key: str, reply: str, cost_ms: int = 0) -> None:
+        with self._lock:
+            self._items[key] = (reply, time.time() + self.ttl_s, int(cost_ms))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        self._save()
+
+    def bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+        self._save()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning(f"Ignoring unreadable response cache {self.path}: {e}")
+            return
+        now = time.time()
+        for e in entries if isinstance(entries, list) else []:
+            with contextlib.suppress(Exception):
+                if float(e["expires"]) > now:
+                    self._items[str(e["key"])] = (str(e["reply"]), float(e["expires"]), int(e.get("ms", 0)))
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            entries = [{"key": k, "reply": r, "expires": exp, "ms": ms} for k, (r, exp, ms) in self._items.items()]
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(entries, f)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError as e:
+                log.warning(f"Could not save response cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._items)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_items": self.max_items,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_ms": self.saved_ms,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
@@ -1,13 +1,16 @@
 import os
+import json
 import time
 import hmac
+import queue
 import hashlib
+import threading
 from pathlib import Path
 from typing import Optional, Dict, Any
 
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi import Response
 from pydantic import BaseModel
@@ -15,6 +18,7 @@ from enum import Enum
 
 # Bridge that safely calls optional functions in decision_engine
 from .controller_bridge import AgentBridge
+from .speech.completion import WEBHOOK_AUTH_HEADER, webhooks
 
 APP_PORT = int(os.getenv("AGENT_PORT", "8765"))
 PUBLIC_DIR = Path(__file__).resolve().parent.parent / "public"
@@ -91,7 +95,8 @@ def api_status_compat():
     # Compatibility with the initial UI that expects a string status and a dict state
     try:
         from agent import agent_main as _am  # lazy import to avoid cycles
-        status_line = getattr(_am, "STATUS_LINE", "")
+        build = getattr(_am, "build_status", None)
+        status_line = build() if callable(build) else getattr(_am, "STATUS_LINE", "")
         state = getattr(_am, "RUNTIME_STATE", {})
         if not status_line:
             # Derive a simple line from bridge if main didn't set one yet
@@ -99,20 +104,57 @@ def api_status_compat():
             status_line = bs.get("engine_status") or (
                 f"running={bs.get('running')} imported={bs.get('engine_imported')}"
             )
-        return {"ok": True, "status": status_line, "state": state}
+        return {"ok": True, "status": status_line, "state": state, "brain": _brain_stats()}
     except Exception:
         s = bridge.status()
-        return {"ok": True, "status": s, "state": s}
+        return {"ok": True, "status": s, "state": s, "brain": _brain_stats()}
+
+
+def _brain_stats() -> Dict[str, Any]:
+    # Staleness, refresh timings and circuit-breaker state of the brain snapshot
+    try:
+        from agent.memory import brain_cache as _bc
+        return _bc.stats()
+    except Exception:
+        return {}
 
 
 @app.get("/api/perf")
 def api_perf():
+    perf: Dict[str, Any] = {}
+    try:
+        from agent import agent_main as _am
+        perf = dict(getattr(_am, "RUNTIME_STATE", {}).get("perf", {}))
+    except Exception:
+        pass
+    try:
+        from agent import decision_engine as _de
+        perf["reply_cache"] = _de.cache_stats()   # also counts controller/mobile commands
+    except Exception:
+        pass
     try:
         from agent import agent_main as _am
-        perf = getattr(_am, "RUNTIME_STATE", {}).get("perf", {})
-        return {"ok": True, "perf": perf}
+        if _am.MEMORY_WRITER is not None:
+            perf["memory_writes"] = _am.MEMORY_WRITER.stats()   # queue depth changes between turns
+    except Exception:
+        pass
+    return {"ok": True, "perf": perf}
+
+
+@app.post("/api/stt/webhook")
+async def api_stt_webhook(request: Request):
+    # AssemblyAI transcript callback; authenticated by the secret header sent with each job
+    if not webhooks.verify(request.headers.get(WEBHOOK_AUTH_HEADER)):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    try:
+        payload = await request.json()
     except Exception:
-        return {"ok": True, "perf": {}}
+        return JSONResponse({"ok": False, "error": "bad_json"}, status_code=400)
+    tid = str((payload or {}).get("transcript_id") or "").strip() if isinstance(payload, dict) else ""
+    if not tid:
+        return JSONResponse({"ok": False, "error": "missing_transcript_id"}, status_code=400)
+    webhooks.deliver(tid, payload)
+    return {"ok": True}
 
 
 @app.post("/api/command")
@@ -155,6 +197,10 @@ async def api_command(cmd: CommandIn, request: Request):
         return JSONResponse({"ok": ok, "running": bridge.is_running(), "status": bridge.status()})
 
     if action == "stop":
+        # A reply in progress is stopped first (the engine stays warm); otherwise stop the engine
+        cancelled = bridge.cancel()
+        if cancelled:
+            return JSONResponse({"ok": True, "cancelled": cancelled, "running": bridge.is_running()})
         ok = bridge.stop()
         return JSONResponse({"ok": ok, "running": bridge.is_running(), "status": bridge.status()})
 
@@ -164,6 +210,8 @@ async def api_command(cmd: CommandIn, request: Request):
             return JSONResponse({"ok": False, "error": "Empty dictate text"}, status_code=400)
         if len(text) > MAX_TEXT_LEN:
             return JSONResponse({"ok": False, "error": "text_too_long"}, status_code=413)
+        if payload.get("stream") is True:
+            return StreamingResponse(_stream_reply(text), media_type="application/x-ndjson")
         result = bridge.handle_text(text)
         result["running"] = bridge.is_running()
         return JSONResponse(result)
@@ -192,6 +240,33 @@ async def api_command(cmd: CommandIn, request: Request):
     return JSONResponse({"ok": False, "error": f"unknown action '{action}'"}, status_code=400)
 
 
+def _stream_reply(text: str):
+    """NDJSON lines: {"chunk": ...} per sentence as the model produces it, then the usual result."""
+    q: "queue.Queue[Optional[dict]]" = queue.Queue()
+    t0 = time.time()
+
+    def work():
+        try:
+            res = bridge.handle_text(text, on_chunk=lambda c: q.put({"chunk": c}))
+        except Exception as e:
+            res = {"ok": False, "error": str(e)}
+        res["running"] = bridge.is_running()
+        q.put(res)
+        q.put(None)
+
+    threading.Thread(target=work, daemon=True).start()
+    ttft_ms = None
+    while True:
+        msg = q.get()
+        if msg is None:
+            return
+        if "chunk" in msg and ttft_ms is None:
+            ttft_ms = int((time.time() - t0) * 1000)
+        elif "chunk" not in msg:
+            msg["ttft_ms"] = ttft_ms
+        yield json.dumps(msg) + "\n"
+
+
 def run():
     # Default to localhost-only; allow override with AGENT_HOST
     host = os.getenv("AGENT_HOST", "127.0.0.1")
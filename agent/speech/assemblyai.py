@@ -0,0 +1,472 @@
+# agent/speech/assemblyai.py
+# AssemblyAI STT client: batch upload/transcribe plus real-time streaming.
+# Dependencies: requests; websockets (optional, streaming only)
+
+from __future__ import annotations
+import os, json, time, queue, struct, threading, contextlib
+from concurrent.futures import CancelledError
+from typing import Callable, Optional
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+
+# Make websockets optional (only needed for streaming mode)
+try:
+    from websockets.sync.client import connect as ws_connect
+    WS_AVAILABLE = True
+except ImportError:
+    ws_connect = None
+    WS_AVAILABLE = False
+
+from agent.utils.logger import get_logger
+from agent.speech.completion import DEFAULT_DEADLINE_S, AdaptivePolling, CompletionStrategy, FixedPolling, HedgePolicy
+
+log = get_logger("assemblyai")
+
+AAI_KEY_ENV = "ASSEMBLYAI_API_KEY"
+AAI_BASE_URL = os.getenv("AAI_BASE_URL", "https://api.assemblyai.com")
+AAI_STREAMING_URL = os.getenv("AAI_STREAMING_URL", "wss://streaming.assemblyai.com/v3/ws")
+STREAM_CHUNK_MS = 60        # v3 rejects chunks under 50 ms, so 30 ms frames are sent in pairs
+STREAM_IDLE_S = 60.0        # a kept-open session is closed after this long without audio (sessions are billed by time)
+TURN_GRACE_S = 0.5          # after ForceEndpoint, how long to wait for a turn when none is open
+_FORCE = object()           # send-queue marker: flush audio, then end the current turn
+
+
+class StreamingSession:
+    """One real-time transcription session over a persistent WebSocket.
+
+    Frames passed to push() are queued and sent from a background thread, so
+    the audio path never blocks on the network. Partial transcripts are
+    delivered to on_partial as they arrive; finish() flushes the stream and
+    returns the final transcript.
+
+    The session can also carry many utterances: end_utterance() forces the
+    end of the current turn (ForceEndpoint) and returns its transcript while
+    the connection stays open for the next one, so only the first utterance
+    pays for the handshake. After idle_s without audio the session
+    terminates itself (alive turns False) and the caller opens a new one.
+    """
+
+    def __init__(self, api_key: str, url: str, sample_rate: int = 16000,
+                 on_partial: Optional[Callable[[str], None]] = None,
+                 chunk_ms: int = STREAM_CHUNK_MS, connect_timeout: float = 10.0,
+                 idle_s: float = STREAM_IDLE_S):
+        if not WS_AVAILABLE:
+            raise RuntimeError("websockets not installed; streaming STT unavailable")
+        qs = urlencode({"sample_rate": sample_rate, "encoding": "pcm_s16le", "format_turns": "true"})
+        self.url = f"{url}?{qs}"
+        self._api_key = api_key
+        self.on_partial = on_partial
+        self.idle_s = idle_s
+        self._chunk_bytes = max(2, int(sample_rate * chunk_ms / 1000) * 2)
+        self._connect_timeout = connect_timeout
+        self._out: queue.Queue[Optional[bytes]] = queue.Queue()
+        self._turns: dict[int, str] = {}
+        self._done = threading.Event()
+        self._error: Optional[str] = None
+        self._ws = None
+        self._t0 = 0.0
+        self._cond = threading.Condition()
+        self._open_turn = False         # a Turn has started and not ended yet
+        self._finals = 0                # formatted end-of-turn messages received
+        self._forced_at = 0.0           # when the last ForceEndpoint went out
+        self._in_utterance = False
+        self._utt_t0 = 0.0
+        self.utterances = 0
+        self.timings: dict[str, int] = {}
+
+    @property
+    def text(self) -> str:
+        return " ".join(t for _, t in sorted(self._turns.items()) if t).strip()
+
+    def start(self) -> "StreamingSession":
+        self._t0 = time.time()
+        threading.Thread(target=self._send_loop, daemon=True).start()
+        return self
+
+    @property
+    def alive(self) -> bool:
+        """True while the session can take another utterance."""
+        return not self._done.is_set() and self._error is None
+
+    def push(self, pcm) -> None:
+        """Queue one frame of mono int16 PCM (numpy array or bytes-like)."""
+        if not self._in_utterance:
+            self._in_utterance = True
+            self._utt_t0 = time.time()
+            self.timings.pop("first_partial_ms", None)
+            if self.utterances:
+                self.timings.pop("connect_ms", None)     # this utterance did not wait for a handshake
+        self._out.put(memoryview(pcm).tobytes())
+
+    def end_utterance(self, timeout: float = 5.0) -> str:
+        """End the current turn and return its transcript; the connection stays open."""
+        with self._cond:
+            finals = self._finals
+            self._forced_at = 0.0
+        self._out.put(_FORCE)
+        deadline = time.time() + timeout
+        with self._cond:
+            while not self._done.is_set():
+                if self._finals > finals and not self._open_turn:
+                    break
+                if self._forced_at and not self._open_turn and self._finals == finals \
+                        and time.time() - self._forced_at > TURN_GRACE_S:
+                    break       # nothing was said after the last turn the server ended itself
+                left = deadline - time.time()
+                if left <= 0:
+                    log.warning(f"Streaming STT turn did not end within {timeout:.1f}s")
+                    break
+                self._cond.wait(min(left, 0.05))
+            text = self.text
+            self._turns.clear()
+        self.utterances += 1
+        self._in_utterance = False
+        self.timings["final_ms"] = int((time.time() - (self._utt_t0 or self._t0)) * 1000)
+        if self._error and not text:
+            raise RuntimeError(self._error)
+        return text
+
+    def finish(self, timeout: float = 5.0) -> str:
+        """Signal end of audio and wait for the final transcript."""
+        self._out.put(None)
+        if not self._done.wait(timeout):
+            log.warning(f"Streaming STT did not terminate within {timeout:.1f}s")
+            self.close()
+        self.timings["final_ms"] = int((time.time() - self._t0) * 1000)
+        if self._error and not self._turns:
+            raise RuntimeError(self._error)
+        return self.text
+
+    def close(self) -> None:
+        ws = self._ws
+        if ws is not None:
+            with contextlib.suppress(Exception):
+                ws.close()
+        self._done.set()
+
+    def _send_loop(self) -> None:
+        try:
+            with ws_connect(self.url, additional_headers={"Authorization": self._api_key},
+                            open_timeout=self._connect_timeout) as ws:
+                self._ws = ws
+                self.timings["connect_ms"] = int((time.time() - self._t0) * 1000)
+                threading.Thread(target=self._recv_loop, args=(ws,), daemon=True).start()
+                pending = bytearray()
+                while True:
+                    try:
+                        item = self._out.get(timeout=self.idle_s)
+                    except queue.Empty:
+                        if self._in_utterance:
+                            continue
+                        item = None     # idle between utterances: stop paying for the session
+                    if item is _FORCE:
+                        if pending:
+                            ws.send(bytes(pending))
+                            pending.clear()
+                        ws.send(json.dumps({"type": "ForceEndpoint"}))
+                        with self._cond:
+                            self._forced_at = time.time()
+                            self._cond.notify_all()
+                        continue
+                    if item is None:
+                        if pending:
+                            ws.send(bytes(pending))
+                        ws.send(json.dumps({"type": "Terminate"}))
+                        # keep the connection open until Termination (or finish() gives up)
+                        self._done.wait()
+                        return
+                    pending += item
+                    if len(pending) >= self._chunk_bytes:
+                        ws.send(bytes(pending))
+                        pending.clear()
+        except Exception as e:
+            if not self._done.is_set():
+                stage = "send" if self._ws is not None else "connect"
+                self._error = f"streaming {stage} failed: {e}"
+            self._done.set()
+
+    def _recv_loop(self, ws) -> None:
+        try:
+            for raw in ws:
+                msg = json.loads(raw)
+                kind = msg.get("type")
+                if kind == "Turn":
+                    final = bool(msg.get("end_of_turn") and msg.get("turn_is_formatted"))
+                    with self._cond:
+                        self._turns[int(msg.get("turn_order", 0))] = (msg.get("transcript") or "").strip()
+                        self._open_turn = not final     # an unformatted end still waits for its formatted text
+                        if final:
+                            self._finals += 1
+                        self._cond.notify_all()
+                    if "first_partial_ms" not in self.timings:
+                        self.timings["first_partial_ms"] = int((time.time() - (self._utt_t0 or self._t0)) * 1000)
+                    if self.on_partial and not final:
+                        try:
+                            self.on_partial(self.text)
+                        except Exception:
+                            pass
+                elif kind == "Termination":
+                    break
+                elif kind == "Error" or msg.get("error"):
+                    self._error = str(msg.get("error") or msg)
+        except Exception as e:
+            if not self._done.is_set():
+                self._error = f"streaming receive failed: {e}"
+        finally:
+            self._done.set()
+            with self._cond:
+                self._cond.notify_all()
+
+
+def wav_header(n_bytes: int, sr: int, channels: int = 1, sampwidth: int = 2) -> bytes:
+    """44-byte canonical PCM WAV header for n_bytes of sample data."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + n_bytes, b"WAVE", b"fmt ", 16, 1, channels, sr,
+        sr * channels * sampwidth, channels * sampwidth, sampwidth * 8, b"data", n_bytes,
+    )
+
+
+class PcmWavBody:
+    """File-like request body: WAV header followed by the PCM buffer itself.
+
+    read() hands out memoryview slices over the caller's array, so the
+    samples are never copied into a WAV file or a bytes object; __len__
+    lets requests send a Content-Length instead of chunked encoding.
+    """
+
+    def __init__(self, pcm, sr: int, channels: int = 1, sampwidth: int = 2):
+        self._data = memoryview(pcm).cast("B")  # pcm must be C-contiguous
+        self._header = memoryview(wav_header(len(self._data), sr, channels, sampwidth))
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return len(self._header) + len(self._data)
+
+    def read(self, n: int = -1) -> memoryview:
+        hlen = len(self._header)
+        if n is None or n < 0:
+            n = len(self) - self._pos
+        if self._pos < hlen:
+            out = self._header[self._pos:min(hlen, self._pos + n)]
+        else:
+            start = self._pos - hlen
+            out = self._data[start:start + n]
+        self._pos += len(out)
+        return out
+
+
+class AssemblyAIClient:
+    """AssemblyAI REST + streaming client.
+
+    One instance keeps a pooled keep-alive requests.Session, so reusing it
+    across turns (see get_client()) avoids a TLS handshake per request.
+    last_timings holds per-phase milliseconds for the most recent transcript.
+    completion decides how transcript status is checked (see completion.py).
+    hedging, if set to a HedgePolicy, sends a duplicate job for requests that
+    run past the usual latency and takes whichever finishes first.
+    """
+
+    def __init__(self, api_key: Optional[str]=None, streaming_url: Optional[str]=None,
+                 base_url: Optional[str]=None):
+        self.api_key = api_key or os.getenv(AAI_KEY_ENV)
+        if not self.api_key:
+            raise RuntimeError(f"{AAI_KEY_ENV} not set")
+        self.base_url = (base_url or AAI_BASE_URL).rstrip("/")
+        self.streaming_url = streaming_url or AAI_STREAMING_URL
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self.last_timings: dict[str, int] = {}
+        self.completion: CompletionStrategy = AdaptivePolling()
+        self.hedging: Optional[HedgePolicy] = None
+
+    def _headers(self, content_type: Optional[str]=None):
+        h = {"authorization": self.api_key}
+        if content_type: h["content-type"] = content_type
+        return h
+
+    def warm(self) -> None:
+        """Open a pooled connection ahead of the first turn (best effort)."""
+        with contextlib.suppress(Exception):
+            self._session.get(f"{self.base_url}/v2/transcript", params={"limit": 1},
+                              headers=self._headers(), timeout=10).close()
+
+    def _upload(self, body) -> str:
+        r = self._session.post(
+            f"{self.base_url}/v2/upload",
+            headers=self._headers("application/octet-stream"),
+            data=body,
+            timeout=60,
+        )
+        r.raise_for_status()
+        return r.json()["upload_url"]
+
+    def upload(self, filepath: str) -> str:
+        with open(filepath, "rb") as f:
+            return self._upload(f)
+
+    def upload_bytes(self, data: bytes) -> str:
+        return self._upload(data)
+
+    def upload_pcm(self, pcm, sr: int = 16000) -> str:
+        """Upload mono int16 PCM as WAV straight from memory (no temp file, no copy)."""
+        return self._upload(PcmWavBody(pcm, sr))
+
+    def submit(self, url: str, **params) -> str:
+        """Create a transcript job for an uploaded audio URL; returns its id."""
+        r = self._session.post(
+            f"{self.base_url}/v2/transcript",
+            headers=self._headers("application/json"),
+            json={"audio_url": url, **params},
+            timeout=30,
+        )
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def delete_transcript(self, tid: str) -> None:
+        """Best-effort removal of a job we no longer need (the losing side of a hedge)."""
+        with contextlib.suppress(Exception):
+            self._session.delete(f"{self.base_url}/v2/transcript/{tid}", headers=self._headers(),
+                                 timeout=10).close()
+
+    def get_transcript(self, tid: str) -> dict:
+        s = self._session.get(
+            f"{self.base_url}/v2/transcript/{tid}",
+            headers=self._headers(),
+            timeout=30,
+        )
+        s.raise_for_status()
+        return s.json()
+
+    def transcribe_url(self, url: str, poll_ms: Optional[int]=None, deadline_s: Optional[float]=None,
+                       audio_s: float=0.0, cancel: Optional[threading.Event]=None,
+                       strategy: Optional[CompletionStrategy]=None) -> str:
+        """Submit url and wait for the transcript text.
+
+        Raises TimeoutError after deadline_s (default DEFAULT_DEADLINE_S) and
+        concurrent.futures.CancelledError if cancel is set while waiting.
+        """
+        if strategy is None:
+            strategy = FixedPolling(poll_ms) if poll_ms is not None else self.completion
+        t0 = time.time()
+        deadline = t0 + (deadline_s if deadline_s is not None else DEFAULT_DEADLINE_S)
+        tid = self.submit(url, **strategy.submit_params())
+        t1 = time.time()
+        self.last_timings["submit_ms"] = int((t1 - t0) * 1000)
+        self.last_timings.pop("hedge_ms", None)
+        if self.hedging is not None:
+            j, polls = self._hedged_wait(url, tid, strategy, audio_s, deadline, cancel, self.hedging)
+        else:
+            j, polls = strategy.wait(lambda: self.get_transcript(tid), tid, audio_s, deadline, cancel)
+        self.last_timings["wait_ms"] = int((time.time() - t1) * 1000)
+        self.last_timings["polls"] = polls
+        if j["status"] == "error":
+            raise RuntimeError(j.get("error","transcription failed"))
+        strategy.observe(audio_s, time.time() - t0)
+        return (j.get("text") or "").strip()
+
+    def _hedged_wait(self, url: str, tid: str, strategy: CompletionStrategy, audio_s: float, deadline: float,
+                     cancel: Optional[threading.Event], policy: HedgePolicy) -> tuple[dict, int]:
+        """Wait for tid; past the policy's delay, race a duplicate job for the same upload.
+
+        Each job is waited on in its own thread with the usual strategy; the
+        first completed transcript wins, the other wait is cancelled and its
+        job deleted. An error from one job only counts once the other has
+        finished too.
+        """
+        t0 = time.time()
+        race_over = threading.Event()
+        results: queue.Queue = queue.Queue()
+
+        def _wait(job: str) -> None:
+            try:
+                j, n = strategy.wait(lambda: self.get_transcript(job), job, audio_s, deadline, race_over)
+                results.put((job, j, n, None))
+            except BaseException as e:
+                results.put((job, None, 0, e))
+
+        jobs = [tid]
+        threading.Thread(target=_wait, args=(tid,), daemon=True).start()
+        hedge_at: Optional[float] = t0 + policy.delay(audio_s)
+        pending, polls = 1, 0
+        failure: object = None
+        winner: Optional[str] = None
+        try:
+            while pending:
+                now = time.time()
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None     # one decision per request
+                    if now < deadline and policy.allow():
+                        jobs.append(self.submit(url, **strategy.submit_params()))
+                        self.last_timings["hedge_ms"] = int((now - t0) * 1000)
+                        threading.Thread(target=_wait, args=(jobs[-1],), daemon=True).start()
+                        pending += 1
+                timeout = 0.1 if hedge_at is None else max(0.0, min(0.1, hedge_at - now))
+                try:
+                    job, j, n, err = results.get(timeout=timeout)
+                except queue.Empty:
+                    if cancel is not None and cancel.is_set():
+                        raise CancelledError("transcription cancelled")
+                    continue
+                pending -= 1
+                polls += n
+                if err is None and j.get("status") == "completed":
+                    winner = job
+                    policy.record(audio_s, time.time() - t0, len(jobs) > 1, job != tid)
+                    return j, polls
+                failure = err if err is not None else j
+            if isinstance(failure, BaseException):
+                raise failure
+            return failure, polls
+        finally:
+            race_over.set()
+            for job in jobs:
+                if job != winner and winner is not None:
+                    threading.Thread(target=self.delete_transcript, args=(job,), daemon=True).start()
+
+    def _transcribe_upload(self, upload: Callable[[], str], nbytes: int, audio_s: float,
+                           deadline_s: Optional[float], cancel: Optional[threading.Event]) -> str:
+        self.last_timings = {"bytes": nbytes}
+        t0 = time.time()
+        url = upload()
+        self.last_timings["upload_ms"] = int((time.time() - t0) * 1000)
+        if deadline_s is not None:   # the deadline covers the upload too
+            deadline_s = max(0.0, deadline_s - (time.time() - t0))
+        text = self.transcribe_url(url, deadline_s=deadline_s, audio_s=audio_s, cancel=cancel)
+        self.last_timings["total_ms"] = int((time.time() - t0) * 1000)
+        return text
+
+    def transcribe_pcm(self, pcm, sr: int = 16000, deadline_s: Optional[float] = None,
+                       cancel: Optional[threading.Event] = None) -> str:
+        """Upload PCM from memory and wait for its transcript; fills last_timings."""
+        nbytes = len(memoryview(pcm).cast("B"))
+        return self._transcribe_upload(lambda: self.upload_pcm(pcm, sr), nbytes + 44,
+                                       nbytes / 2 / sr, deadline_s, cancel)
+
+    def transcribe_bytes(self, data: bytes, audio_s: float = 0.0, deadline_s: Optional[float] = None,
+                         cancel: Optional[threading.Event] = None) -> str:
+        """Upload an already-encoded audio file (WAV/FLAC/...) and wait for its transcript."""
+        return self._transcribe_upload(lambda: self.upload_bytes(data), len(data),
+                                       audio_s, deadline_s, cancel)
+
+    def stream(self, sample_rate: int = 16000,
+               on_partial: Optional[Callable[[str], None]] = None) -> StreamingSession:
+        """Create (not yet started) real-time session; call .start() then .push() frames."""
+        return StreamingSession(self.api_key, self.streaming_url, sample_rate, on_partial=on_partial)
+
+
+_client: Optional[AssemblyAIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client(api_key: Optional[str] = None) -> AssemblyAIClient:
+    """Process-wide client so every turn reuses the same warm connection pool."""
+    global _client
+    key = api_key or os.getenv(AAI_KEY_ENV)
+    with _client_lock:
+        if _client is None or (key and _client.api_key != key):
+            _client = AssemblyAIClient(api_key=key)
+        return _client
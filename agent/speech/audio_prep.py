@@ -0,0 +1,157 @@
+# agent/speech/audio_prep.py
+# Pre-upload audio stage: trim leading/trailing non-speech and optionally
+# encode to a smaller format, so fewer bytes cross slow RDP/mobile uplinks.
+# Dependencies: numpy; soundfile (optional, FLAC only)
+
+from __future__ import annotations
+import io, struct
+from typing import Optional, Sequence, Union
+import numpy as np
+
+# soundfile needs libsndfile; make FLAC optional
+try:
+    import soundfile
+    FLAC_AVAILABLE = True
+except Exception:
+    soundfile = None
+    FLAC_AVAILABLE = False
+
+from agent.speech.resample import resample
+
+TRIM_LEAD_PAD_MS = 100      # keep this much before the first voiced frame
+TRIM_TAIL_PAD_MS = 200      # ...and after the last one (consonant decay)
+ENCODINGS = ("wav", "flac", "mulaw")
+
+
+def read_wav(path: str) -> tuple[np.ndarray, int]:
+    """Read a PCM16 or float32 WAV (e.g. the bundled test.wav) as mono float32 in [-1, 1]."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError(f"{path}: not a WAV file")
+    pos, fmt, pcm = 12, None, None
+    while pos + 8 <= len(data):
+        cid, size = data[pos:pos + 4], struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        body = data[pos + 8:pos + 8 + size]
+        if cid == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", body[:16])
+        elif cid == b"data":
+            pcm = body
+        pos += 8 + size + (size & 1)
+    if fmt is None or pcm is None:
+        raise ValueError(f"{path}: missing fmt or data chunk")
+    tag, channels, sr, _, _, bits = fmt
+    if tag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE: trust the bit depth
+        tag = 3 if bits == 32 else 1
+    if tag == 3 and bits == 32:
+        x = np.frombuffer(pcm, dtype="<f4")
+    elif tag == 1 and bits == 16:
+        x = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    else:
+        raise ValueError(f"{path}: unsupported WAV format tag={tag} bits={bits}")
+    x = x[:len(x) - len(x) % channels].reshape(-1, channels)[:, 0]
+    return np.ascontiguousarray(x, dtype=np.float32), sr
+
+
+def to_pcm16(x: np.ndarray, sr: int, target_sr: int = 16000) -> np.ndarray:
+    """Float [-1, 1] audio at sr -> int16 at target_sr (polyphase, delay-compensated)."""
+    return resample((np.clip(x, -1.0, 1.0) * 32767).astype(np.int16), sr, target_sr)
+
+
+def frame_energies(pcm: np.ndarray, block_len: int) -> np.ndarray:
+    """RMS per block_len frame (last partial frame included), vectorized."""
+    n = len(pcm)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    nfull = n // block_len
+    x = pcm[:nfull * block_len].reshape(nfull, block_len).astype(np.float32)
+    e = np.sqrt(np.einsum("ij,ij->i", x, x) / block_len)
+    if n % block_len:
+        tail = pcm[nfull * block_len:].astype(np.float32)
+        e = np.append(e, np.sqrt(np.dot(tail, tail) / len(tail)))
+    return e
+
+
+def trim_silence(pcm: np.ndarray, energies: Sequence[float], threshold: float, block_len: int,
+                 sr: int = 16000, lead_pad_ms: int = TRIM_LEAD_PAD_MS,
+                 tail_pad_ms: int = TRIM_TAIL_PAD_MS) -> np.ndarray:
+    """Return a view of pcm without leading/trailing frames below threshold.
+
+    energies[i] is the energy of pcm[i*block_len:(i+1)*block_len]. If no
+    frame reaches the threshold the audio is returned untouched.
+    """
+    e = np.asarray(energies, dtype=np.float32)
+    voiced = np.flatnonzero(e >= threshold)
+    if voiced.size == 0:
+        return pcm
+    start = max(0, int(voiced[0]) * block_len - int(sr * lead_pad_ms / 1000))
+    end = min(len(pcm), (int(voiced[-1]) + 1) * block_len + int(sr * tail_pad_ms / 1000))
+    return pcm[start:end]
+
+
+def encode_mulaw_wav(pcm: np.ndarray, sr: int = 16000) -> bytes:
+    """8-bit G.711 mu-law WAV (half the bytes of 16-bit PCM)."""
+    x = pcm.astype(np.int32)
+    sign = np.where(x < 0, 0x80, 0x00)
+    x = np.minimum(np.abs(x), 32635) + 0x84
+    exponent = np.floor(np.log2(x)).astype(np.int32) - 7
+    mantissa = (x >> (exponent + 3)) & 0x0F
+    ulaw = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+    n = len(ulaw)
+    pad = n & 1
+    # WAVE_FORMAT_MULAW (7) uses the 18-byte fmt chunk plus a fact chunk
+    hdr = struct.pack(
+        "<4sI4s4sIHHIIHHH4sII4sI",
+        b"RIFF", 4 + 26 + 12 + 8 + n + pad, b"WAVE",
+        b"fmt ", 18, 7, 1, sr, sr, 1, 8, 0,
+        b"fact", 4, n,
+        b"data", n,
+    )
+    return hdr + ulaw.tobytes() + (b"\0" if pad else b"")
+
+
+def decode_mulaw(ulaw: np.ndarray) -> np.ndarray:
+    u = ~ulaw.astype(np.int32) & 0xFF
+    sign = u & 0x80
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    x = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(sign, -x, x).astype(np.int16)
+
+
+def encode_flac(pcm: np.ndarray, sr: int = 16000) -> bytes:
+    if not FLAC_AVAILABLE:
+        raise RuntimeError("soundfile not installed; FLAC encoding unavailable")
+    buf = io.BytesIO()
+    soundfile.write(buf, pcm, sr, format="FLAC", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def prepare_upload(pcm: np.ndarray, sr: int, block_len: int, threshold: Optional[float] = None,
+                   energies: Optional[Sequence[float]] = None, encoding: str = "wav",
+                   trim: bool = True) -> tuple[Union[np.ndarray, bytes], dict]:
+    """Trim and encode one utterance for upload.
+
+    Returns (payload, stats). payload is the (trimmed) int16 array for 'wav',
+    so the zero-copy WAV upload can still be used, or encoded bytes otherwise.
+    stats has raw_bytes, sent_bytes, saved_bytes and trimmed_ms.
+    """
+    raw_bytes = 44 + pcm.nbytes
+    out = pcm
+    if trim and threshold is not None and len(pcm):
+        if energies is None or len(energies) * block_len < len(pcm) - block_len:
+            energies = frame_energies(pcm, block_len)
+        out = trim_silence(pcm, energies, threshold, block_len, sr)
+    payload: Union[np.ndarray, bytes] = out
+    if encoding == "flac" and FLAC_AVAILABLE:
+        payload = encode_flac(out, sr)
+    elif encoding == "mulaw":
+        payload = encode_mulaw_wav(out, sr)
+    sent = len(payload) if isinstance(payload, bytes) else 44 + out.nbytes
+    return payload, {
+        "raw_bytes": raw_bytes,
+        "sent_bytes": sent,
+        "saved_bytes": raw_bytes - sent,
+        "trimmed_ms": int((len(pcm) - len(out)) * 1000 / sr),
+        "encoding": encoding if (encoding != "flac" or FLAC_AVAILABLE) else "wav",
+    }
@@ -0,0 +1,220 @@
+# agent/speech/capture.py
+# Persistent microphone capture: one long-lived InputStream per session that
+# writes into a preallocated int16 ring buffer. VAD/PTT read utterance slices
+# from it, so the device is opened once and nothing spoken between turns is lost.
+# The device runs at its native rate and is resampled to 16 kHz on the way in.
+# Dependencies: sounddevice, numpy
+
+from __future__ import annotations
+import time, threading
+from typing import Optional
+import numpy as np
+
+# sounddevice raises OSError (not ImportError) when PortAudio is missing
+try:
+    import sounddevice as sd
+except Exception:
+    sd = None
+
+from agent.utils.logger import get_logger
+from agent.speech.resample import PolyphaseResampler
+
+log = get_logger("capture")
+
+RING_SECONDS = 30           # history kept in the ring (bounds backlog between turns)
+
+
+class RingBuffer:
+    """Single-producer/single-consumer ring of mono int16 samples.
+
+    Samples are addressed by absolute index (0 = first sample ever written).
+    The producer copies a block in and then publishes the new total with a
+    single attribute store; readers never take a lock. A read that races an
+    overwrite is detected after the copy and raises BufferError.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self._buf = np.zeros(self.capacity, dtype=np.int16)
+        self.written = 0  # total samples ever written (monotonic)
+
+    @property
+    def oldest(self) -> int:
+        """Absolute index of the oldest sample still held."""
+        return max(0, self.written - self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        n = len(samples)
+        cap = self.capacity
+        head = self.written
+        if n > cap:
+            samples = samples[-cap:]
+            head += n - cap
+        m = len(samples)
+        pos = head % cap
+        first = min(m, cap - pos)
+        self._buf[pos:pos + first] = samples[:first]
+        if first < m:
+            self._buf[:m - first] = samples[first:]
+        self.written = head + m  # publish last
+
+    def read(self, start: int, end: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Copy samples [start, end) out of the ring (into out[:n], if given)."""
+        end = min(int(end), self.written)
+        start = int(start)
+        if start < self.oldest:
+            raise BufferError(f"ring buffer overrun: sample {start} already overwritten")
+        n = max(0, end - start)
+        out = np.empty(n, dtype=np.int16) if out is None else out[:n]
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        out[:first] = self._buf[pos:pos + first]
+        if first < n:
+            out[first:] = self._buf[:n - first]
+        if start < self.oldest:
+            raise BufferError(f"ring buffer overrun while reading from sample {start}")
+        return out
+
+
+class CaptureReader:
+    """Blocking frame reader over a CaptureStream.
+
+    Mirrors the part of sd.InputStream used by the VAD loops (context manager
+    plus read(n) -> (frames, overflowed)), so they work unchanged on either.
+    """
+
+    def __init__(self, capture: "CaptureStream", start: int):
+        self.capture = capture
+        self.pos = start
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.capture.consumed = max(self.capture.consumed, self.pos)
+
+    @property
+    def read_available(self) -> int:
+        """Samples that can be read without blocking (as on sd.InputStream)."""
+        return max(0, self.capture.ring.written - max(self.pos, self.capture.ring.oldest))
+
+    def read(self, n: int):
+        ring = self.capture.ring
+        overflowed = self.pos < ring.oldest
+        if overflowed:
+            self.pos = ring.oldest  # fell a full ring behind; skip the lost audio
+        end = self.pos + n
+        if not self.capture.wait_for(end):
+            raise TimeoutError("no audio from capture stream")
+        data = ring.read(self.pos, end)
+        self.pos = end
+        return data.reshape(-1, 1), overflowed
+
+
+class CaptureStream:
+    """Session-long capture into a RingBuffer.
+
+    consumed is the absolute index where the previous utterance ended; a new
+    reader() resumes from there, so speech captured while STT or generation
+    was running is still heard (up to RING_SECONDS of backlog).
+    With native_rate the device is opened at its default sample rate and a
+    PolyphaseResampler converts each block to sr in the audio callback, so
+    the host API (or the RDP audio redirector) does not have to.
+    """
+
+    def __init__(self, device: Optional[int] = None, sr: int = 16000, block_ms: int = 30,
+                 seconds: float = RING_SECONDS, native_rate: bool = True):
+        self.device = device
+        self.sr = sr
+        self.block_ms = block_ms
+        self.block_len = int(sr * block_ms / 1000)
+        self.ring = RingBuffer(int(sr * seconds))
+        self.native_rate = native_rate
+        self.device_rate = sr
+        self.consumed = 0
+        self.overflows = 0
+        self._resampler: Optional[PolyphaseResampler] = None
+        self._resampled = np.empty(0, dtype=np.int16)
+        self._new_data = threading.Event()
+        self._stream = None
+
+    @property
+    def position(self) -> int:
+        return self.ring.written
+
+    def _native_rate(self) -> int:
+        try:
+            return int(sd.query_devices(self.device, 'input')['default_samplerate'])
+        except Exception as e:
+            log.warning(f"Could not query the device sample rate ({e}); capturing at {self.sr} Hz")
+            return self.sr
+
+    def _open(self, rate: int) -> None:
+        self._resampler = PolyphaseResampler(rate, self.sr) if rate != self.sr else None
+        self._resampled = np.empty(self.block_len + 1, dtype=np.int16)
+        self._stream = sd.InputStream(samplerate=rate, channels=1, dtype='int16',
+                                      device=self.device, blocksize=int(rate * self.block_ms / 1000),
+                                      callback=self._callback)
+        self.device_rate = rate
+
+    def start(self) -> "CaptureStream":
+        if sd is None:
+            raise RuntimeError("sounddevice/PortAudio not available")
+        rate = self._native_rate() if self.native_rate else self.sr
+        try:
+            self._open(rate)
+        except Exception as e:
+            if rate == self.sr:
+                raise
+            log.warning(f"Opening the device at {rate} Hz failed ({e}); capturing at {self.sr} Hz")
+            self._open(self.sr)
+        self._stream.start()
+        self.consumed = self.ring.written
+        log.info(f"Capture started (device={self.device}, {rate} Hz -> {self.sr} Hz, "
+                 f"ring={self.ring.capacity / self.sr:.0f}s)")
+        return self
+
+    def stop(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception as e:
+                log.warning(f"Error closing capture stream: {e}")
+
+    @property
+    def active(self) -> bool:
+        return self._stream is not None
+
+    def _callback(self, indata, frames_count, time_info, status) -> None:  # sounddevice callback
+        if status and getattr(status, "input_overflow", False):
+            self.overflows += 1
+        x = indata[:, 0] if indata.ndim > 1 else indata
+        r = self._resampler
+        if r is not None:
+            out = self._resampled if len(self._resampled) >= r.output_len(len(x)) else None
+            x = r.process(x, out=out)
+        self.ring.write(x)
+        self._new_data.set()
+
+    def wait_for(self, index: int, timeout: float = 2.0) -> bool:
+        """Block until sample index has been captured; False on timeout."""
+        deadline = time.time() + timeout
+        while self.ring.written < index:
+            self._new_data.clear()
+            if self.ring.written >= index:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            self._new_data.wait(min(remaining, 0.1))
+        return True
+
+    def reader(self, start: Optional[int] = None) -> CaptureReader:
+        """Reader starting at start (default: end of the previous utterance)."""
+        pos = self.consumed if start is None else start
+        return CaptureReader(self, max(pos, self.ring.oldest))
+
+    def slice(self, start: int, end: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.ring.read(max(start, self.ring.oldest), end, out)
@@ -0,0 +1,293 @@
+# agent/speech/completion.py
+# Transcript completion strategies: how long to wait between "is it done yet?"
+# checks after a transcript job is submitted. All strategies check once
+# immediately, honour a hard deadline and can be cancelled via a threading.Event.
+#   fixed    - constant poll interval (legacy behaviour)
+#   adaptive - poll around the latency predicted for this audio length
+#   webhook  - wait for AssemblyAI's callback on the controller, slow-poll as backup
+
+from __future__ import annotations
+import os, time, secrets, threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import CancelledError
+from typing import Callable, Optional
+
+from agent.utils.logger import get_logger
+
+log = get_logger("stt_completion")
+
+DEFAULT_DEADLINE_S = 60.0
+WEBHOOK_AUTH_HEADER = "X-Agent-Webhook-Secret"
+WEBHOOK_URL_ENV = "AAI_WEBHOOK_URL"   # public URL that reaches POST /api/stt/webhook
+
+Fetch = Callable[[], dict]
+
+
+def _sleep(delay: float, deadline: float, cancel: Optional[threading.Event]) -> None:
+    """Sleep up to delay (never past deadline); raise if cancelled or out of time."""
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TimeoutError("transcript not ready before deadline")
+    delay = max(0.0, min(delay, remaining))
+    if cancel is not None:
+        if cancel.wait(delay):
+            raise CancelledError("transcription cancelled")
+    else:
+        time.sleep(delay)
+
+
+def _finished(j: dict) -> bool:
+    return j.get("status") in ("completed", "error")
+
+
+class CompletionStrategy(ABC):
+    name = "base"
+
+    def submit_params(self) -> dict:
+        """Extra fields for the POST /v2/transcript body."""
+        return {}
+
+    @abstractmethod
+    def delays(self, audio_s: float):
+        """Yield successive sleep intervals (seconds) between status checks."""
+
+    def observe(self, audio_s: float, latency_s: float) -> None:
+        """Feedback: a transcript of audio_s seconds completed after latency_s."""
+
+    def wait(self, fetch: Fetch, tid: str, audio_s: float, deadline: float,
+             cancel: Optional[threading.Event] = None) -> tuple[dict, int]:
+        """Return (final transcript JSON, number of status checks)."""
+        polls = 0
+        for delay in self.delays(audio_s):
+            if cancel is not None and cancel.is_set():
+                raise CancelledError("transcription cancelled")
+            j = fetch()
+            polls += 1
+            if _finished(j):
+                return j, polls
+            _sleep(delay, deadline, cancel)
+        raise TimeoutError(f"transcript {tid} not ready")
+
+
+class FixedPolling(CompletionStrategy):
+    name = "fixed"
+
+    def __init__(self, poll_ms: int = 800):
+        self.poll_s = poll_ms / 1000.0
+
+    def delays(self, audio_s: float):
+        while True:
+            yield self.poll_s
+
+
+class LatencyModel:
+    """Observed completion latency per audio-length bucket.
+
+    Until a bucket has a few samples, a prior of base + rtf * duration is
+    used as the median (and for lower quantiles), widened for upper ones.
+    """
+
+    BUCKETS = (2.0, 5.0, 10.0, float("inf"))
+
+    def __init__(self, base_s: float = 0.6, rtf: float = 0.25, window: int = 50, min_samples: int = 5):
+        self.base_s = base_s
+        self.rtf = rtf
+        self.min_samples = min_samples
+        self._hist = {b: deque(maxlen=window) for b in self.BUCKETS}
+        self._lock = threading.Lock()
+
+    def _bucket(self, audio_s: float) -> float:
+        return next(b for b in self.BUCKETS if audio_s <= b)
+
+    def add(self, audio_s: float, latency_s: float) -> None:
+        with self._lock:
+            self._hist[self._bucket(audio_s)].append(float(latency_s))
+
+    def quantile(self, audio_s: float, q: float) -> float:
+        with self._lock:
+            xs = sorted(self._hist[self._bucket(audio_s)])
+        if len(xs) < self.min_samples:
+            prior = self.base_s + self.rtf * audio_s
+            return prior * (1.0 + max(0.0, q - 0.5))  # the prior is the median; widen only above it
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+class HedgePolicy:
+    """When to send a duplicate transcript job for a slow request.
+
+    A job still unfinished after the p90 latency observed for its audio
+    length gets a twin for the same upload; the first to finish wins.
+    Hedging is skipped while more than max_rate of recent requests were
+    hedged, so a uniformly slow service does not get double the load.
+    """
+
+    def __init__(self, quantile: float = 0.9, min_delay_s: float = 1.0, max_rate: float = 0.2,
+                 window: int = 200):
+        self.model = LatencyModel()
+        self.quantile = quantile
+        self.min_delay_s = min_delay_s
+        self.max_rate = max_rate
+        self._recent: deque = deque(maxlen=window)     # (hedged, won_by_hedge, latency_s)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def delay(self, audio_s: float) -> float:
+        """Seconds after submit at which a duplicate is sent."""
+        return max(self.min_delay_s, self.model.quantile(audio_s, self.quantile))
+
+    def allow(self) -> bool:
+        with self._lock:
+            recent = sum(1 for h, _, _ in self._recent if h)
+            return recent < self.max_rate * max(len(self._recent), 10)   # small budget before there is history
+
+    def record(self, audio_s: float, latency_s: float, hedged: bool, hedge_won: bool) -> None:
+        """One finished request: latency from first submit to the winning result."""
+        self.model.add(audio_s, latency_s)
+        with self._lock:
+            self._recent.append((hedged, hedge_won, latency_s))
+            self.requests += 1
+            self.hedged += int(hedged)
+            self.hedge_wins += int(hedge_won)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lat = sorted(l for _, _, l in self._recent)
+
+        def pct(q: float) -> int:
+            return int(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000) if lat else 0
+
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": pct(0.5),
+            "p90_ms": pct(0.9),
+            "p99_ms": pct(0.99),
+        }
+
+
+class AdaptivePolling(CompletionStrategy):
+    """Check immediately, sleep until the predicted median, then poll densely
+    through the p50..p90 window and back off exponentially past p90."""
+
+    name = "adaptive"
+
+    def __init__(self, model: Optional[LatencyModel] = None, min_interval_ms: int = 150,
+                 max_interval_ms: int = 2000, backoff: float = 1.5):
+        self.model = model or LatencyModel()
+        self.min_s = min_interval_ms / 1000.0
+        self.max_s = max_interval_ms / 1000.0
+        self.backoff = backoff
+
+    def observe(self, audio_s: float, latency_s: float) -> None:
+        self.model.add(audio_s, latency_s)
+
+    def delays(self, audio_s: float):
+        p50 = self.model.quantile(audio_s, 0.5)
+        p90 = max(p50, self.model.quantile(audio_s, 0.9))
+        yield max(self.min_s, p50)
+        t = max(self.min_s, p50)
+        step = max(self.min_s, (p90 - p50) / 3.0)
+        while t < p90:
+            yield step
+            t += step
+        delay = step
+        while True:
+            delay = min(self.max_s, delay * self.backoff)
+            yield delay
+
+
+class WebhookRegistry:
+    """Completion callbacks delivered to the controller, keyed by transcript id.
+
+    Deliveries that arrive before anyone waits are kept briefly, since the
+    callback can race the submit response.
+    """
+
+    def __init__(self, keep_s: float = 120.0):
+        self.secret = os.getenv("AAI_WEBHOOK_SECRET") or secrets.token_urlsafe(24)
+        self._keep_s = keep_s
+        self._cond = threading.Condition()
+        self._done: dict[str, tuple[float, dict]] = {}
+        self.received = 0
+
+    def verify(self, provided: Optional[str]) -> bool:
+        return bool(provided) and secrets.compare_digest(str(provided), self.secret)
+
+    def deliver(self, tid: str, payload: dict) -> None:
+        with self._cond:
+            now = time.time()
+            for k in [k for k, (ts, _) in self._done.items() if now - ts > self._keep_s]:
+                del self._done[k]
+            self._done[str(tid)] = (now, payload)
+            self.received += 1
+            self._cond.notify_all()
+
+    def wait(self, tid: str, timeout: float) -> Optional[dict]:
+        with self._cond:
+            self._cond.wait_for(lambda: tid in self._done, timeout=max(0.0, timeout))
+            item = self._done.pop(tid, None)
+        return item[1] if item else None
+
+
+webhooks = WebhookRegistry()
+
+
+class WebhookCompletion(CompletionStrategy):
+    """Wait for the webhook; poll at a slow fallback interval in case it is lost."""
+
+    name = "webhook"
+
+    def __init__(self, url: str, registry: WebhookRegistry = webhooks, fallback_poll_ms: int = 3000):
+        self.url = url
+        self.registry = registry
+        self.fallback_s = fallback_poll_ms / 1000.0
+
+    def submit_params(self) -> dict:
+        return {
+            "webhook_url": self.url,
+            "webhook_auth_header_name": WEBHOOK_AUTH_HEADER,
+            "webhook_auth_header_value": self.registry.secret,
+        }
+
+    def delays(self, audio_s: float):
+        """The fallback polls, in case the webhook is lost."""
+        while True:
+            yield self.fallback_s
+
+    def wait(self, fetch: Fetch, tid: str, audio_s: float, deadline: float,
+             cancel: Optional[threading.Event] = None) -> tuple[dict, int]:
+        polls = 0
+        for delay in self.delays(audio_s):
+            if cancel is not None and cancel.is_set():
+                raise CancelledError("transcription cancelled")
+            j = fetch()
+            polls += 1
+            if _finished(j):
+                return j, polls
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"transcript {tid} not ready before deadline")
+            # Wake in small slices so cancellation stays responsive
+            slice_end = time.time() + min(delay, remaining)
+            while time.time() < slice_end:
+                if cancel is not None and cancel.is_set():
+                    raise CancelledError("transcription cancelled")
+                if self.registry.wait(tid, min(0.1, slice_end - time.time())) is not None:
+                    break
+
+
+def make_strategy(name: str, poll_ms: int = 800) -> CompletionStrategy:
+    """Build a strategy by name; 'webhook' needs AAI_WEBHOOK_URL and falls back to adaptive."""
+    if name == "fixed":
+        return FixedPolling(poll_ms)
+    if name == "webhook":
+        url = os.getenv(WEBHOOK_URL_ENV, "").strip()
+        if url:
+            return WebhookCompletion(url)
+        log.warning(f"{WEBHOOK_URL_ENV} not set; using adaptive polling instead of webhooks")
+    return AdaptivePolling()
@@ -0,0 +1,134 @@
+# agent/speech/endpoint.py
+# Adaptive end-of-utterance detection. Instead of always waiting a fixed
+# TAIL_SIL_MS of silence, the hangover is predicted per turn from
+#   - energy decay: speech that trails off ends sooner than an abrupt stop,
+#   - voicing (autocorrelation pitch strength) of the last speech frames,
+#   - utterance length: a lone wake word gets the full tail ("agent ... open notepad"),
+# and adapted per speaker from the pauses they make mid-utterance and from
+# premature cuts (speech resuming right after an endpoint).
+# Dependencies: numpy
+
+from __future__ import annotations
+from collections import deque
+from typing import Optional
+import math
+import numpy as np
+
+MIN_TAIL_MS = 300           # never end sooner than this after the last speech frame
+MAX_TAIL_MS = 800           # the old fixed tail; upper bound of the hangover
+SHORT_UTTER_MS = 700        # speech shorter than this (wake word alone) waits MAX_TAIL_MS
+PAUSE_MARGIN_MS = 120       # hangover = longest recent mid-utterance pause + margin
+PREMATURE_GAP_MS = 1000     # speech resuming within this of an endpoint was cut too early
+PREMATURE_PENALTY_MS = 150  # hangover added per premature cut (decays on clean turns)
+VOICED_CORR = 0.5           # normalized autocorrelation peak counted as voiced
+PITCH_RANGE_HZ = (70, 400)
+
+
+def voicing(frame: np.ndarray, sr: int = 16000) -> float:
+    """Peak normalized autocorrelation in the pitch lag range (0 = noise, ~1 = steady voice)."""
+    x = frame.reshape(-1).astype(np.float32)
+    x -= x.mean()
+    n = 1 << (2 * len(x) - 1).bit_length()
+    spec = np.fft.rfft(x, n)
+    r = np.fft.irfft(spec.real ** 2 + spec.imag ** 2, n)
+    if r[0] <= 0:
+        return 0.0
+    lo, hi = int(sr / PITCH_RANGE_HZ[1]), min(len(x) // 2, int(sr / PITCH_RANGE_HZ[0]))
+    lags = np.arange(lo, hi)
+    return float((r[lo:hi] * len(x) / (len(x) - lags)).max() / r[0])   # unbiased: undo the lag taper
+
+
+class Endpointer:
+    """Per-session endpoint predictor; call begin() per utterance, then update() per frame."""
+
+    def __init__(self, block_ms: int = 30, sr: int = 16000, min_tail_ms: int = MIN_TAIL_MS,
+                 max_tail_ms: int = MAX_TAIL_MS, short_utter_ms: int = SHORT_UTTER_MS):
+        self.block_ms = block_ms
+        self.sr = sr
+        self.min_tail_ms = min_tail_ms
+        self.max_tail_ms = max_tail_ms
+        self.short_utter_ms = short_utter_ms
+        self.pauses: deque = deque(maxlen=40)   # mid-utterance pauses (ms) that ended with speech resuming
+        self.penalty_ms = 0
+        self.count = 0
+        self.total_ms = 0
+        self.last_ms = 0
+        self.premature = 0
+        self.forced = 0         # utterances cut at the length cap instead of by an endpoint
+        self._end_pos: Optional[int] = None
+        self.begin()
+
+    def begin(self, onset_pos: Optional[int] = None) -> None:
+        """Start a new utterance. onset_pos/end positions are capture-stream sample indices."""
+        if onset_pos is not None and self._end_pos is not None:
+            if 0 <= onset_pos - self._end_pos <= self.sr * PREMATURE_GAP_MS / 1000:
+                self.premature += 1
+                self.penalty_ms = min(self.max_tail_ms, self.penalty_ms + PREMATURE_PENALTY_MS)
+        self._end_pos = None
+        self.speech_ms = 0
+        self.silence_ms = 0
+        self._log_e: deque = deque(maxlen=6)
+        self._voiced_tail = False
+
+    def hangover_ms(self) -> int:
+        """Speaker-adapted base hangover before per-turn adjustments."""
+        if len(self.pauses) >= 3:
+            base = max(self.pauses) + PAUSE_MARGIN_MS
+        else:
+            base = self.max_tail_ms
+        return int(min(self.max_tail_ms, max(self.min_tail_ms, base + self.penalty_ms)))
+
+    def required_tail_ms(self) -> int:
+        """Silence needed right now to call the end of this utterance."""
+        if self.speech_ms < self.short_utter_ms:
+            return self.max_tail_ms
+        h = float(self.hangover_ms())
+        if len(self._log_e) >= 3:
+            slope = np.polyfit(np.arange(len(self._log_e)), np.array(self._log_e), 1)[0]
+            if slope < -0.15 and not self._voiced_tail:
+                h *= 0.75       # energy trailing off into unvoiced sound: a natural ending
+            elif slope > -0.05 and self._voiced_tail:
+                h *= 1.25       # voiced speech stopped abruptly: more likely a pause
+        return int(min(self.max_tail_ms, max(self.min_tail_ms, h)))
+
+    def update(self, frame: np.ndarray, energy: float, is_speech: bool) -> bool:
+        """Feed one frame; returns True when the utterance should end here."""
+        if is_speech:
+            if self.silence_ms >= 2 * self.block_ms and self.speech_ms >= self.short_utter_ms:
+                self.pauses.append(self.silence_ms)
+            self.silence_ms = 0
+            self.speech_ms += self.block_ms
+            self._log_e.append(math.log(max(energy, 1.0)))
+            self._voiced_tail = voicing(frame, self.sr) >= VOICED_CORR
+            return False
+        self.silence_ms += self.block_ms
+        return self.silence_ms >= self.required_tail_ms()
+
+    def end(self, end_pos: Optional[int] = None) -> None:
+        """Record an endpoint decision (end_pos: capture position, for premature-cut detection)."""
+        self._end_pos = end_pos
+        self.count += 1
+        self.last_ms = self.silence_ms
+        self.total_ms += self.silence_ms
+        if self.penalty_ms:
+            self.penalty_ms = max(0, self.penalty_ms - PREMATURE_PENALTY_MS // 3)
+
+    def abort(self) -> None:
+        """Record an utterance cut off by the caller (length cap) rather than by an endpoint.
+
+        Kept out of the endpoint averages, and speech resuming right after it
+        is not counted as a premature cut, so the hangover is left alone.
+        """
+        self._end_pos = None
+        self.forced += 1
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": int(self.total_ms / self.count) if self.count else 0,
+            "last_ms": self.last_ms,
+            "hangover_ms": self.hangover_ms(),
+            "premature": self.premature,
+            "forced": self.forced,
+            "premature_rate": round(self.premature / self.count, 3) if self.count else 0.0,
+        }
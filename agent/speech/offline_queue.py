@@ -0,0 +1,191 @@
+# agent/speech/offline_queue.py
+# Durable queue for utterances captured while batch STT is unreachable. When
+# the network drops, the upload fails and the command used to be lost; now
+# the encoded audio (mu-law WAV, or FLAC/WAV as already prepared for upload)
+# is written to one file per utterance under logs/stt_queue, and the queue
+# is replayed in small parallel batches once AssemblyAI answers again.
+# Transcripts are handed back strictly in capture order, files are only
+# removed after their transcript was delivered, and utterances older than
+# max_age_s are dropped instead of running a stale command.
+# Dependencies: numpy; requests (exception types only)
+
+from __future__ import annotations
+import os, re, time, threading, contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+import numpy as np
+import requests
+
+from agent.speech.audio_prep import encode_mulaw_wav
+from agent.utils.logger import get_logger
+
+log = get_logger("offline_queue")
+
+MAX_AGE_S = 600             # queued commands older than this are dropped, not run
+MAX_ITEMS = 100             # oldest utterances are dropped beyond this many
+REPLAY_BATCH = 4            # transcripts requested in parallel during replay
+REPLAY_INTERVAL_S = 15      # how often an idle loop retries a non-empty queue
+
+_NAME = re.compile(r"^(\d{8})_(\d{13})_(\d+)\.(wav|flac)$")
+
+
+def is_unreachable(exc: BaseException) -> bool:
+    """True for failures that mean the STT service could not be reached (worth queueing)."""
+    return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class QueuedUtterance:
+    """One queued utterance: seq orders the queue, created is the capture time (epoch s)."""
+
+    __slots__ = ("seq", "created", "audio_s", "path")
+
+    def __init__(self, seq: int, created: float, audio_s: float, path: str):
+        self.seq, self.created, self.audio_s, self.path = seq, created, audio_s, path
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class OfflineQueue:
+    """Utterances waiting for STT, stored as one audio file each in directory.
+
+    The file name carries the sequence number, capture time and audio length,
+    so the queue survives restarts without an index file. put() writes via a
+    temporary file and rename, so a crash never leaves a half-written entry.
+    """
+
+    def __init__(self, directory: str, max_age_s: float = MAX_AGE_S, max_items: int = MAX_ITEMS,
+                 batch: int = REPLAY_BATCH):
+        self.directory = directory
+        self.max_age_s = max_age_s
+        self.max_items = max_items
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._replaying = threading.Lock()
+        self.queued = 0
+        self.replayed = 0
+        self.expired = 0
+        self.failed = 0
+        os.makedirs(directory, exist_ok=True)
+        self._items = self._scan()
+        self._seq = self._items[-1].seq if self._items else 0
+
+    def _scan(self) -> list[QueuedUtterance]:
+        items = []
+        for name in os.listdir(self.directory):
+            m = _NAME.match(name)
+            if m:
+                items.append(QueuedUtterance(int(m.group(1)), int(m.group(2)) / 1000.0, int(m.group(3)) / 1000.0,
+                                             os.path.join(self.directory, name)))
+            elif name.endswith(".tmp"):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.directory, name))
+        return sorted(items, key=lambda it: it.seq)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def put(self, payload: Union[np.ndarray, bytes], audio_s: float, sr: int = 16000,
+            created: Optional[float] = None) -> QueuedUtterance:
+        """Store one utterance (int16 samples are stored as mu-law, encoded payloads as-is)."""
+        if isinstance(payload, bytes):
+            data, ext = payload, "flac" if payload[:4] == b"fLaC" else "wav"
+        else:
+            data, ext = encode_mulaw_wav(np.asarray(payload).reshape(-1), sr), "wav"
+        created = time.time() if created is None else created
+        with self._lock:
+            self._seq += 1
+            name = f"{self._seq:08d}_{int(created * 1000):013d}_{int(audio_s * 1000)}.{ext}"
+            path = os.path.join(self.directory, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            item = QueuedUtterance(self._seq, created, audio_s, path)
+            self._items.append(item)
+            self.queued += 1
+            overflow = self._items[:max(0, len(self._items) - self.max_items)]
+            del self._items[:len(overflow)]
+        for old in overflow:
+            log.warning(f"Offline queue full; dropping utterance #{old.seq}")
+            self._remove(old)
+            self.expired += 1
+        return item
+
+    def _remove(self, item: QueuedUtterance) -> None:
+        with contextlib.suppress(OSError):
+            os.remove(item.path)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop utterances older than max_age_s; returns how many."""
+        now = time.time() if now is None else now
+        with self._lock:
+            old = [it for it in self._items if now - it.created > self.max_age_s]
+            self._items = [it for it in self._items if now - it.created <= self.max_age_s]
+        for it in old:
+            self._remove(it)
+        self.expired += len(old)
+        return len(old)
+
+    def replay(self, transcribe: Callable[[QueuedUtterance], str]) -> tuple[list[tuple[QueuedUtterance, str]], bool]:
+        """Transcribe queued utterances, batch by batch, oldest first.
+
+        Returns ([(item, text), ...] in capture order, drained). Replay stops
+        at the first item whose STT is unreachable; it and everything after it
+        stay queued (drained is False), so later turns never overtake it.
+        Items that fail for other reasons are dropped. Only one replay runs
+        at a time; a concurrent call returns ([], False) immediately.
+        """
+        if not self._replaying.acquire(blocking=False):
+            return [], False
+        try:
+            self.expire()
+            out: list[tuple[QueuedUtterance, str]] = []
+            with ThreadPoolExecutor(max_workers=self.batch, thread_name_prefix="stt-replay") as pool:
+                while True:
+                    with self._lock:
+                        batch = self._items[:self.batch]
+                    if not batch:
+                        return out, True
+                    futures = [pool.submit(transcribe, it) for it in batch]
+                    for it, fut in zip(batch, futures):
+                        try:
+                            text = fut.result()
+                        except Exception as e:
+                            if is_unreachable(e):
+                                log.info(f"STT still unreachable; {len(self)} utterance(s) stay queued")
+                                return out, False
+                            log.warning(f"Dropping queued utterance #{it.seq}: {e}")
+                            self.failed += 1
+                            text = ""
+                        with self._lock:
+                            self._items.remove(it)
+                        self._remove(it)
+                        self.replayed += 1
+                        if text:
+                            out.append((it, text))
+        finally:
+            self._replaying.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            oldest = self._items[0].created if self._items else None
+            pending = len(self._items)
+        return {
+            "pending": pending,
+            "oldest_s": int(time.time() - oldest) if oldest is not None else 0,
+            "queued": self.queued,
+            "replayed": self.replayed,
+            "expired": self.expired,
+            "failed": self.failed,
+        }
+
+
+def describe(stats: Optional[dict]) -> str:
+    """Plain-words summary for the status line ('' when nothing is waiting)."""
+    if not stats or not stats.get("pending"):
+        return ""
+    n, age = stats["pending"], stats.get("oldest_s", 0)
+    when = f"{age // 60} min" if age >= 60 else f"{age} s"
+    return f"{n} command{'s' if n != 1 else ''} waiting for connection, oldest {when} ago"
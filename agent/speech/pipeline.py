@@ -0,0 +1,222 @@
+# agent/speech/pipeline.py
+# Thread-stage turn pipeline. Each stage (STT, generation, ...) runs in its
+# own worker thread and takes its input from a bounded queue, so the next
+# utterance can be captured and transcribed while the previous command is
+# still generating. A full queue blocks the stage feeding it (backpressure),
+# one worker per stage keeps turns in order, and every stage reports its
+# queue depth, queue wait and service time. BargeIn lets a command that
+# arrives while a reply is generating cancel that reply, so the new turn is
+# next instead of waiting behind it.
+# Dependencies: none (stdlib)
+
+from __future__ import annotations
+import contextlib, queue, threading, time
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+from agent.utils.logger import get_logger
+
+log = get_logger("pipeline")
+
+QUEUE_DEPTH = 2             # turns waiting per stage before the previous stage blocks
+_STOP = object()
+
+
+class StageStats:
+    """Counters for one stage; times in seconds, reported in ms."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.dropped = 0        # items the stage consumed without passing them on (e.g. empty transcript)
+        self.wait_s = 0.0       # time items spent queued before this stage
+        self.busy_s = 0.0
+        self.blocked_s = 0.0    # time spent waiting for room in the next stage's queue
+        self.last_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.max_depth = 0
+
+    def as_dict(self, depth: int) -> dict:
+        n = max(1, self.count)
+        return {
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "count": self.count,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "avg_wait_ms": int(self.wait_s / n * 1000),
+            "last_wait_ms": int(self.last_wait_s * 1000),
+            "max_wait_ms": int(self.max_wait_s * 1000),
+            "avg_busy_ms": int(self.busy_s / n * 1000),
+            "blocked_ms": int(self.blocked_s * 1000),
+        }
+
+
+class TurnPipeline:
+    """Run items through stages in order; each stage fn returns the next item or None to drop it.
+
+    submit() hands an item to the first stage and blocks while that stage's
+    queue is full. With inline=True the stages run synchronously inside
+    submit() instead (the old sequential loop) and exceptions propagate.
+    In threaded mode a failing item is skipped and its exception is raised
+    from the next submit(), after that item is queued, so the caller sees
+    stage errors either way. on_update, if given, receives stats() after
+    every processed item.
+    """
+
+    def __init__(self, stages: Sequence[tuple[str, Callable[[Any], Any]]], depth: int = QUEUE_DEPTH,
+                 inline: bool = False, on_update: Optional[Callable[[dict], None]] = None):
+        self.names = [name for name, _ in stages]
+        self._fns = [fn for _, fn in stages]
+        self.inline = inline
+        self.on_update = on_update
+        self._queues: list[queue.Queue] = [queue.Queue(maxsize=depth) for _ in stages]
+        self._stats = [StageStats(name) for name in self.names]
+        self._threads: list[threading.Thread] = []
+        self._error: Optional[BaseException] = None     # first stage failure not yet raised by submit()
+        self._error_lock = threading.Lock()
+        self.submit_blocked_s = 0.0
+
+    def start(self) -> "TurnPipeline":
+        if not self.inline:
+            for i, name in enumerate(self.names):
+                t = threading.Thread(target=self._worker, args=(i,), name=f"pipeline-{name}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def submit(self, item: Any, reraise: bool = True) -> None:
+        """Queue item for the first stage; then raise a stage failure left over from earlier items.
+
+        reraise=False leaves that failure for the next submit() that asks for it.
+        """
+        if self.inline:
+            for i in range(len(self._fns)):
+                item = self._run(i, item, 0.0)
+                if item is None:
+                    break
+            if self.on_update is not None:
+                self.on_update(self.stats())
+            return
+        t0 = time.time()
+        self._put(0, item)
+        self.submit_blocked_s += time.time() - t0
+        if reraise:
+            with self._error_lock:
+                err, self._error = self._error, None
+            if err is not None:
+                raise err
+
+    def _put(self, i: int, item: Any) -> None:
+        q = self._queues[i]
+        q.put((item, time.time()))
+        st = self._stats[i]
+        st.max_depth = max(st.max_depth, q.qsize())
+
+    def _run(self, i: int, item: Any, wait_s: float) -> Any:
+        st = self._stats[i]
+        st.wait_s += wait_s
+        st.last_wait_s = wait_s
+        st.max_wait_s = max(st.max_wait_s, wait_s)
+        t0 = time.time()
+        try:
+            out = self._fns[i](item)
+        finally:
+            st.busy_s += time.time() - t0
+            st.count += 1
+        if out is None and i < len(self._fns) - 1:
+            st.dropped += 1
+        return out
+
+    def _worker(self, i: int) -> None:
+        q = self._queues[i]
+        last = i == len(self._fns) - 1
+        while True:
+            item, queued_at = q.get()
+            try:
+                if item is _STOP:
+                    if not last:
+                        self._put(i + 1, _STOP)
+                    return
+                try:
+                    out = self._run(i, item, time.time() - queued_at)
+                except Exception as e:
+                    self._stats[i].errors += 1
+                    with self._error_lock:
+                        if self._error is None:
+                            self._error = e
+                        else:
+                            log.error(f"Error in {self.names[i]} stage: {e}", exc_info=True)
+                    out = None
+                if out is not None and not last:
+                    t0 = time.time()
+                    self._put(i + 1, out)    # blocks while the next stage is backed up
+                    self._stats[i].blocked_s += time.time() - t0
+                if self.on_update is not None:
+                    try:
+                        self.on_update(self.stats())
+                    except Exception:
+                        pass
+            finally:
+                q.task_done()
+
+    def join(self) -> None:
+        """Wait until every submitted item has gone through all stages."""
+        for q in self._queues:
+            q.join()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Finish queued turns (up to timeout), then end the workers."""
+        if self.inline or not self._threads:
+            return
+        try:
+            self._queues[0].put((_STOP, time.time()), timeout=timeout)
+        except queue.Full:
+            return
+        deadline = time.time() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.time()))
+        if self._error is not None:
+            log.error(f"Unreported pipeline error: {self._error}", exc_info=self._error)
+            self._error = None
+
+    def stats(self) -> dict:
+        return {
+            "stages": {st.name: st.as_dict(q.qsize()) for st, q in zip(self._stats, self._queues)},
+            "submit_blocked_ms": int(self.submit_blocked_s * 1000),
+        }
+
+
+class BargeIn:
+    """Cancel the reply in flight when a new command arrives during generation.
+
+    The generation stage runs inside generation(); the STT stage calls
+    check() for every command. A wake-word command (or, with no wake word,
+    a stop word) spoken while a reply is generating cancels that reply and
+    then goes through the queue as usual, so it runs next. Commands that
+    arrive while nothing is generating are just queued. Only useful with
+    the threaded pipeline: inline, nothing is heard until the reply is done.
+    """
+
+    def __init__(self, cancel: Optional[Callable[[], int]]):
+        self.cancel = cancel
+        self.generating = threading.Event()
+        self.count = 0
+
+    @contextlib.contextmanager
+    def generation(self) -> Iterator[None]:
+        self.generating.set()
+        try:
+            yield
+        finally:
+            self.generating.clear()
+
+    def check(self, wake_word: str = "", stop: bool = False) -> bool:
+        """Cancel the reply in flight if there is one to cancel; True if one was cancelled."""
+        if self.cancel is None or not self.generating.is_set() or not (wake_word or stop):
+            return False
+        if not self.cancel():
+            return False
+        self.count += 1
+        return True
+
@@ -0,0 +1,106 @@
+# agent/speech/resample.py
+# Streaming polyphase resampler for native-rate capture. Devices (and RDP's
+# "Remote Audio" redirector in particular) run at 44.1/48 kHz; asking them for
+# 16 kHz makes the host resample, which adds latency and input overflows.
+# Capture instead runs at the device rate and this converts to 16 kHz for
+# VAD and STT: a Kaiser-windowed sinc low-pass split into up polyphase
+# branches, evaluated for a whole chunk at once with NumPy (no per-sample
+# Python), with the filter history carried across chunks.
+# Dependencies: numpy
+
+from __future__ import annotations
+from math import gcd
+from typing import Optional
+import numpy as np
+
+TAPS_PER_OUTPUT = 48        # filter length per output sample (cost vs transition band width)
+CUTOFF = 0.9                # low-pass edge relative to the output Nyquist (7.2 kHz for 16 kHz)
+KAISER_BETA = 7.0           # ~70 dB stopband
+
+
+def design_filter(up: int, down: int, taps: int = TAPS_PER_OUTPUT, cutoff: float = CUTOFF,
+                  beta: float = KAISER_BETA) -> np.ndarray:
+    """Polyphase bank of shape (up, taps): row p holds h[p + k*up] for k = 0..taps-1 (gain up)."""
+    n = taps * up
+    fc = cutoff * 0.5 / max(up, down)           # cycles per sample at the upsampled rate
+    t = np.arange(n) - n // 2                   # centred on a whole sample, so the delay is exact
+    h = 2 * fc * np.sinc(2 * fc * t) * np.kaiser(n + 1, beta)[:n]
+    h *= up / h.sum()
+    return h.reshape(taps, up).T.astype(np.float32)
+
+
+class PolyphaseResampler:
+    """Rational-ratio resampler for a continuous mono stream.
+
+    process() takes any number of new samples (int16 or float) and returns
+    the output samples they complete, as int16; feeding a signal in chunks
+    gives exactly the same output as feeding it at once. The output lags the
+    input by delay output samples (about taps/2 input samples, ~0.5 ms at 48 kHz).
+    """
+
+    def __init__(self, in_rate: int, out_rate: int = 16000, taps: int = TAPS_PER_OUTPUT):
+        g = gcd(int(in_rate), int(out_rate))
+        self.in_rate, self.out_rate = int(in_rate), int(out_rate)
+        self.up, self.down = self.out_rate // g, self.in_rate // g
+        self.taps = taps
+        # reversed along k so a bank row lines up with an ascending input window
+        self._bank = design_filter(self.up, self.down, taps)[:, ::-1].copy()
+        self._hist = np.zeros(taps - 1, dtype=np.float32)
+        center = taps * self.up // 2
+        self.delay = center // self.down   # whole output samples of lag (start phase absorbs the rest)
+        self._t0 = center % self.down
+        self._t = self._t0          # next output's position in the upsampled domain, from the first new sample
+        self._work = np.empty(0, dtype=np.float32)
+
+    def output_len(self, n: int) -> int:
+        """Samples process() will return for n more input samples."""
+        span = n * self.up - self._t
+        return max(0, -(-span // self.down))
+
+    def reset(self) -> None:
+        self._hist[:] = 0
+        self._t = self._t0
+
+    def process(self, x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        x = x.reshape(-1)
+        m, k = len(x), self.taps - 1
+        if self._work.size < m + k:
+            self._work = np.empty(m + k, dtype=np.float32)
+        buf = self._work[:m + k]
+        buf[:k] = self._hist
+        np.copyto(buf[k:], x, casting="unsafe")
+        n_out = self.output_len(m)
+        if out is None:
+            out = np.empty(n_out, dtype=np.int16)
+        else:
+            out = out[:n_out]
+        if n_out:
+            windows = np.lib.stride_tricks.sliding_window_view(buf, self.taps)
+            last = self._t + (n_out - 1) * self.down
+            if self.up == 1:    # integer decimation (48 -> 16 kHz): one strided matrix-vector product
+                y = windows[self._t:last + 1:self.down] @ self._bank[0]
+            else:               # each output has its own window start and filter phase
+                pos = np.arange(self._t, last + 1, self.down, dtype=np.int64)
+                base, phase = np.divmod(pos, self.up)
+                y = np.einsum("ij,ij->i", windows[base], self._bank[phase])
+            np.clip(y, -32768, 32767, out=y)
+            np.rint(y, out=y)
+            out[:] = y
+            self._t = last + self.down - m * self.up
+        else:
+            self._t -= m * self.up
+        self._hist[:] = buf[m:]
+        return out
+
+
+def resample(x: np.ndarray, in_rate: int, out_rate: int = 16000, taps: int = TAPS_PER_OUTPUT) -> np.ndarray:
+    """Resample a whole int16 signal (delay-compensated, same-length semantics as offline tools)."""
+    if in_rate == out_rate:
+        return np.asarray(x, dtype=np.int16)
+    r = PolyphaseResampler(in_rate, out_rate, taps)
+    x = np.concatenate([np.asarray(x).reshape(-1), np.zeros(taps, dtype=np.int16)])
+    y = np.empty(r.output_len(len(x)), dtype=np.int16)
+    done = 0
+    for off in range(0, len(x), in_rate):   # 1 s at a time keeps the window gather small
+        done += len(r.process(x[off:off + in_rate], out=y[done:]))
+    return y[r.delay:r.delay + int((len(x) - taps) * out_rate / in_rate)]
@@ -0,0 +1,137 @@
+# agent/speech/stt_backends.py
+# Pluggable speech-to-text backends behind one interface:
+#   assemblyai - remote batch transcription (default)
+#   local      - on-device CPU model (faster-whisper), loaded once and kept warm
+# Dependencies: numpy; faster-whisper (optional, local backend only)
+
+from __future__ import annotations
+import os, time, threading
+from abc import ABC, abstractmethod
+from typing import Optional, Union
+import numpy as np
+
+# Make faster-whisper optional (only needed for the local backend)
+try:
+    from faster_whisper import WhisperModel
+    WHISPER_AVAILABLE = True
+except ImportError:
+    WhisperModel = None
+    WHISPER_AVAILABLE = False
+
+from agent.speech.assemblyai import AssemblyAIClient, get_client
+from agent.utils.logger import get_logger
+
+log = get_logger("stt_backends")
+
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "base.en")   # tiny.en for slower CPUs
+LOCAL_STT_COMPUTE = os.getenv("LOCAL_STT_COMPUTE", "int8")
+
+
+def default_threads() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class SttBackend(ABC):
+    """transcribe() takes mono int16 PCM and returns text; last_timings has per-phase ms."""
+
+    name = "base"
+
+    def __init__(self) -> None:
+        self.last_timings: dict[str, int] = {}
+
+    def warm(self) -> None:
+        """Do any one-off setup (model load, connection) ahead of the first turn."""
+
+    @abstractmethod
+    def transcribe(self, pcm: np.ndarray, sr: int = 16000, audio_s: float = 0.0,
+                   deadline_s: Optional[float] = None) -> str:
+        """Text of one utterance; deadline_s caps remote backends, audio_s sizes their waits."""
+
+
+class AssemblyAIBackend(SttBackend):
+    """Batch upload to AssemblyAI; also takes already-encoded audio (bytes from audio_prep)."""
+
+    name = "assemblyai"
+
+    def __init__(self, client: Optional[AssemblyAIClient] = None) -> None:
+        super().__init__()
+        self._client = client
+
+    @property
+    def client(self) -> AssemblyAIClient:
+        return self._client or get_client()
+
+    def warm(self) -> None:
+        self.client.warm()
+
+    def transcribe(self, pcm: Union[np.ndarray, bytes], sr: int = 16000, audio_s: float = 0.0,
+                   deadline_s: Optional[float] = None) -> str:
+        client = self.client
+        if isinstance(pcm, bytes):
+            text = client.transcribe_bytes(pcm, audio_s=audio_s, deadline_s=deadline_s)
+        else:
+            text = client.transcribe_pcm(np.ascontiguousarray(pcm), sr, deadline_s=deadline_s)
+        self.last_timings = dict(client.last_timings)
+        return text
+
+
+class LocalWhisperBackend(SttBackend):
+    """faster-whisper on CPU; the model is loaded once per process and reused."""
+
+    name = "local"
+
+    def __init__(self, model: str = LOCAL_STT_MODEL, threads: Optional[int] = None,
+                 compute_type: str = LOCAL_STT_COMPUTE, language: Optional[str] = "en"):
+        super().__init__()
+        if not WHISPER_AVAILABLE:
+            raise RuntimeError("faster-whisper not installed; local STT unavailable (pip install faster-whisper)")
+        self.model_name = model
+        self.threads = threads or default_threads()
+        self.compute_type = compute_type
+        self.language = language
+        self._model = None
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        with self._lock:
+            if self._model is None:
+                t0 = time.time()
+                self._model = WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                                           cpu_threads=self.threads)
+                self.last_timings = {"load_ms": int((time.time() - t0) * 1000)}
+                log.info(f"Loaded local STT model {self.model_name} ({self.threads} threads) "
+                         f"in {self.last_timings['load_ms']} ms")
+
+    def transcribe(self, pcm: np.ndarray, sr: int = 16000, audio_s: float = 0.0,
+                   deadline_s: Optional[float] = None) -> str:
+        if sr != 16000:
+            raise ValueError("local STT expects 16 kHz audio")
+        self.warm()
+        t0 = time.time()
+        audio = pcm.astype(np.float32) / 32768.0
+        segments, _info = self._model.transcribe(audio, language=self.language, beam_size=1,
+                                                 vad_filter=False, condition_on_previous_text=False)
+        text = " ".join(s.text.strip() for s in segments).strip()
+        self.last_timings = {"infer_ms": int((time.time() - t0) * 1000),
+                             "audio_ms": int(len(pcm) * 1000 / sr)}
+        return text
+
+
+BACKENDS = ("assemblyai", "local")
+
+_backends: dict[tuple, SttBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = "assemblyai", threads: Optional[int] = None) -> SttBackend:
+    """Process-wide backend instance per (name, threads), so models stay warm across turns."""
+    key = (name, threads)
+    with _backends_lock:
+        if key not in _backends:
+            if name == "local":
+                _backends[key] = LocalWhisperBackend(threads=threads)
+            elif name == "assemblyai":
+                _backends[key] = AssemblyAIBackend()
+            else:
+                raise ValueError(f"unknown STT backend '{name}'")
+        return _backends[key]
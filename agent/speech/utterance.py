@@ -0,0 +1,138 @@
+# agent/speech/utterance.py
+# Preallocated capture buffer for one utterance. Blocks are copied once into
+# a fixed int16 array behind a write cursor and handed out as views, instead
+# of collecting per-block copies in a list and concatenating them (plus an
+# astype copy) at the end. For push-to-talk, audio beyond the in-memory
+# capacity spills to a temporary file, and a hard cap ends recordings where
+# the user forgot to press Enter.
+# Dependencies: numpy
+
+from __future__ import annotations
+import atexit, os, tempfile, threading
+from typing import Optional
+import numpy as np
+
+PTT_MEMORY_S = 60           # PTT audio kept in RAM (~1.9 MB at 16 kHz); the rest spills to disk
+PTT_MAX_S = 600             # a PTT recording is stopped after this long
+
+# Spill files that could not be removed yet: Windows refuses to delete a file
+# while a view() map of it is alive, so removal is retried on every later
+# close() and at exit.
+_unlink_pending: list[str] = []
+_unlink_lock = threading.Lock()
+
+
+def _remove_pending() -> None:
+    with _unlink_lock:
+        for path in list(_unlink_pending):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            _unlink_pending.remove(path)
+
+
+atexit.register(_remove_pending)
+
+
+class UtteranceBuffer:
+    """Mono int16 samples of one utterance in a preallocated array.
+
+    max_samples caps the total length; once reached, further samples are
+    dropped and full is set. With spill_samples smaller than max_samples,
+    only that many samples are held in memory: each time the array fills up
+    it is appended to a temporary file and reused, and view() then maps the
+    file instead of returning the array. Call close() to remove the file;
+    a mapped view stays readable, and where the platform keeps a mapped file
+    from being deleted (Windows) the removal is retried later.
+    """
+
+    def __init__(self, max_samples: int, spill_samples: Optional[int] = None,
+                 spill_dir: Optional[str] = None):
+        self.max_samples = int(max_samples)
+        cap = self.max_samples if spill_samples is None else min(self.max_samples, int(spill_samples))
+        self._buf = np.empty(max(1, cap), dtype=np.int16)   # np.empty: pages are only touched as written
+        self._cursor = 0
+        self._spilled = 0           # samples already written to the spill file
+        self._spill_dir = spill_dir
+        self._file = None
+        self.path: Optional[str] = None
+        self.allocations = 1
+        self.full = False
+
+    def __len__(self) -> int:
+        return self._spilled + self._cursor
+
+    @property
+    def capacity(self) -> int:
+        """Samples held in memory."""
+        return len(self._buf)
+
+    def append(self, samples: np.ndarray) -> np.ndarray:
+        """Copy samples in; returns the stored samples (a view when they fit without spilling)."""
+        samples = samples.reshape(-1)
+        n = min(len(samples), self.max_samples - len(self))
+        if n < len(samples):
+            self.full = True
+            samples = samples[:n]
+        if self._cursor + n > len(self._buf):
+            self._spill()
+        if n > len(self._buf):  # larger than the whole in-memory part: straight to disk
+            self._write_file(samples)
+            return samples
+        out = self._buf[self._cursor:self._cursor + n]
+        np.copyto(out, samples, casting="unsafe")
+        self._cursor += n
+        return out
+
+    def reserve(self, n: int) -> np.ndarray:
+        """Writable view of the next n samples (at most capacity), e.g. for RingBuffer.read(out=...)."""
+        n = min(int(n), self.max_samples - len(self), len(self._buf))
+        if self._cursor + n > len(self._buf):
+            self._spill()
+        out = self._buf[self._cursor:self._cursor + n]
+        self._cursor += n
+        self.full = len(self) >= self.max_samples
+        return out
+
+    def view(self) -> np.ndarray:
+        """All samples so far: a view of the array, or a read-only map of the spill file."""
+        if self._file is None:
+            return self._buf[:self._cursor]
+        self._spill()
+        self._file.flush()
+        if not self._spilled:
+            return np.zeros((0,), dtype=np.int16)
+        return np.memmap(self.path, dtype=np.int16, mode="r", shape=(self._spilled,))
+
+    def _write_file(self, samples: np.ndarray) -> None:
+        if self._file is None:
+            fd, self.path = tempfile.mkstemp(prefix="utterance-", suffix=".pcm", dir=self._spill_dir)
+            self._file = os.fdopen(fd, "wb")
+        samples.tofile(self._file)
+        self._spilled += len(samples)
+
+    def _spill(self) -> None:
+        if self._cursor:
+            self._write_file(self._buf[:self._cursor])
+            self._cursor = 0
+
+    def close(self) -> None:
+        """Remove the spill file, if any, or queue it while still mapped (views stay valid)."""
+        f, self._file = self._file, None
+        if f is not None:
+            f.close()
+            with _unlink_lock:
+                _unlink_pending.append(self.path)
+        _remove_pending()
+
+    def stats(self) -> dict:
+        return {
+            "samples": len(self),
+            "memory_bytes": self._buf.nbytes,
+            "spilled_bytes": self._spilled * 2,
+            "allocations": self.allocations,
+            "capped": self.full,
+        }
@@ -0,0 +1,203 @@
+# agent/speech/vad.py
+# Batched energy VAD with online noise-floor tracking. Frame energies for a
+# whole batch of blocks are computed with in-place NumPy ops into
+# preallocated buffers, and the start/stop thresholds follow the room's
+# noise floor (minimum statistics over the last few seconds) instead of a
+# hand-tuned constant. HybridVAD puts that energy gate in front of
+# webrtcvad, so the (costlier) classifier only sees frames that might be speech.
+# Dependencies: numpy; webrtcvad (optional, HybridVAD only)
+
+from __future__ import annotations
+import math
+from typing import Optional
+import numpy as np
+
+# Make webrtcvad optional
+try:
+    import webrtcvad
+    WEBRTC_AVAILABLE = True
+except ImportError:
+    webrtcvad = None
+    WEBRTC_AVAILABLE = False
+
+FLOOR_WINDOW_S = 5.0        # noise floor = quietest frame seen in this window...
+FLOOR_BIAS = 1.3            # ...scaled up, since the minimum underestimates the mean noise level
+START_RATIO = 3.0           # speech starts ~10 dB above the floor
+STOP_RATIO = 2.0            # and continues while ~6 dB above it (hysteresis)
+MIN_START = 250             # clamp so digital silence / loud rooms stay usable
+MAX_START = 8000
+MAX_BATCH_BLOCKS = 32       # largest batch processed at once (~1 s of 30 ms blocks)
+FLOOR_REFRESH_BLOCKS = 16   # full window minimum recomputed this often; new lows apply at once
+GATE_RATIO = 1.3            # hybrid: frames below floor * this never reach webrtcvad
+MIN_GATE = 60
+WEBRTC_MODE_FLOORS = ((150, 1), (800, 2), (float("inf"), 3))  # (noise floor below, aggressiveness)
+
+
+class EnergyVAD:
+    """Per-block RMS and adaptive start/stop thresholds for mono int16 audio.
+
+    energies() returns a view into an internal buffer that is reused on the
+    next call. With adaptive=False both thresholds are the given constant
+    (the old behaviour); set_threshold() pins a constant at any time.
+    """
+
+    def __init__(self, block_len: int = 480, threshold: float = 900, adaptive: bool = True,
+                 block_ms: int = 30, window_s: float = FLOOR_WINDOW_S, max_batch: int = MAX_BATCH_BLOCKS):
+        self.block_len = int(block_len)
+        self.fixed = None if adaptive else float(threshold)
+        self._work = np.empty(max_batch * self.block_len, dtype=np.float32)
+        self._e = np.empty(max_batch, dtype=np.float32)
+        self._start = np.empty(max_batch, dtype=bool)
+        self._speech = np.empty(max_batch, dtype=bool)
+        # seed the history so the initial thresholds equal the configured one
+        self._hist = np.full(max(1, int(window_s * 1000 / block_ms)), threshold / START_RATIO / FLOOR_BIAS,
+                             dtype=np.float32)
+        self._hpos = 0
+        self._since_refresh = 0
+        self.floor = float(threshold / START_RATIO)
+
+    @property
+    def adaptive(self) -> bool:
+        return self.fixed is None
+
+    def set_threshold(self, value: float) -> None:
+        self.fixed = float(value)
+
+    @property
+    def start_threshold(self) -> float:
+        if self.fixed is not None:
+            return self.fixed
+        return min(MAX_START, max(MIN_START, self.floor * START_RATIO))
+
+    @property
+    def stop_threshold(self) -> float:
+        if self.fixed is not None:
+            return self.fixed
+        return min(self.start_threshold, max(MIN_START * STOP_RATIO / START_RATIO, self.floor * STOP_RATIO))
+
+    def energies(self, pcm: np.ndarray) -> np.ndarray:
+        """RMS of each whole block in pcm (a view, valid until the next call)."""
+        k = len(pcm) // self.block_len
+        if k > len(self._e):
+            self._work = np.empty(k * self.block_len, dtype=np.float32)
+            self._e = np.empty(k, dtype=np.float32)
+            self._start = np.empty(k, dtype=bool)
+            self._speech = np.empty(k, dtype=bool)
+        w = self._work[:k * self.block_len]
+        e = self._e[:k]
+        np.copyto(w, pcm[:k * self.block_len].reshape(-1), casting="unsafe")
+        if k == 1:  # live capture: one block per call, keep the per-call overhead minimal
+            e[0] = math.sqrt(float(np.dot(w, w)) / self.block_len)
+        else:
+            m = w.reshape(k, self.block_len)
+            np.einsum("ij,ij->i", m, m, out=e)
+            e *= 1.0 / self.block_len
+            np.sqrt(e, out=e)
+        if self.fixed is None:
+            self._track(e)
+        return e
+
+    def classify(self, pcm: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(energies, may_start, is_speech) per whole block; views valid until the next call."""
+        e = self.energies(pcm)
+        start, speech = self._start[:len(e)], self._speech[:len(e)]
+        if len(e) == 1:
+            start[0] = e[0] >= self.start_threshold
+            speech[0] = e[0] >= self.stop_threshold
+        else:
+            np.greater_equal(e, self.start_threshold, out=start)
+            np.greater_equal(e, self.stop_threshold, out=speech)
+        return e, start, speech
+
+    def _track(self, e: np.ndarray) -> None:
+        h = self._hist
+        n = len(e)
+        if n == 1:
+            h[self._hpos] = e[0]
+            self._hpos = (self._hpos + 1) % len(h)
+        elif n >= len(h):
+            h[:] = e[-len(h):]
+            self._hpos = 0
+        else:
+            first = min(n, len(h) - self._hpos)
+            h[self._hpos:self._hpos + first] = e[:first]
+            h[:n - first] = e[first:]
+            self._hpos = (self._hpos + n) % len(h)
+        self._since_refresh += n
+        if self._since_refresh >= FLOOR_REFRESH_BLOCKS:
+            # old lows leaving the window can only raise the floor; check that periodically
+            self._since_refresh = 0
+            self.floor = float(h.min()) * FLOOR_BIAS
+        else:
+            self.floor = min(self.floor, float(e[0] if n == 1 else e.min()) * FLOOR_BIAS)
+
+    def stats(self) -> dict:
+        return {
+            "adaptive": self.adaptive,
+            "floor": int(self.floor),
+            "start": int(self.start_threshold),
+            "stop": int(self.stop_threshold),
+        }
+
+
+class HybridVAD(EnergyVAD):
+    """webrtcvad behind the noise-floor energy gate.
+
+    Only frames above floor * GATE_RATIO are passed to webrtcvad, as
+    memoryview slices of the batch (no per-frame bytes copies). With mode=None
+    the aggressiveness follows the measured noise floor.
+    """
+
+    def __init__(self, block_len: int = 480, threshold: float = 900, sr: int = 16000,
+                 mode: Optional[int] = None, block_ms: int = 30, **kw):
+        if not WEBRTC_AVAILABLE:
+            raise RuntimeError("webrtcvad not installed; hybrid VAD unavailable (pip install webrtcvad)")
+        super().__init__(block_len, threshold, adaptive=True, block_ms=block_ms, **kw)
+        self.sr = sr
+        self.auto_mode = mode is None
+        self.mode = 2 if mode is None else int(mode)
+        self._vad = webrtcvad.Vad(self.mode)
+        self.frames = 0
+        self.vad_calls = 0
+
+    @property
+    def gate_level(self) -> float:
+        if self.fixed is not None:
+            return self.fixed * STOP_RATIO / START_RATIO
+        return max(MIN_GATE, self.floor * GATE_RATIO)
+
+    def classify(self, pcm: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        e = self.energies(pcm)
+        k = len(e)
+        speech = self._speech[:k]
+        raw = memoryview(np.ascontiguousarray(pcm[:k * self.block_len], dtype=np.int16)).cast("B")
+        gate = self.gate_level
+        self.frames += k
+        if k == 1:  # live capture: skip the index bookkeeping
+            speech[0] = e[0] >= gate and self._vad.is_speech(raw, self.sr)
+            self.vad_calls += int(e[0] >= gate)
+        else:
+            speech[:] = False
+            frame_bytes = self.block_len * 2
+            candidates = np.flatnonzero(e >= gate)
+            for i in candidates:
+                speech[i] = self._vad.is_speech(raw[i * frame_bytes:(i + 1) * frame_bytes], self.sr)
+            self.vad_calls += len(candidates)
+        if self.auto_mode and self._since_refresh == 0:
+            self._select_mode()  # only after a full floor refresh
+        return e, speech, speech
+
+    def _select_mode(self) -> None:
+        mode = next(m for limit, m in WEBRTC_MODE_FLOORS if self.floor < limit)
+        if mode != self.mode:
+            self._vad.set_mode(mode)
+            self.mode = mode
+
+    def stats(self) -> dict:
+        out = super().stats()
+        out.update({
+            "webrtc_mode": self.mode,
+            "gate": int(self.gate_level),
+            "webrtc_share": round(self.vad_calls / self.frames, 3) if self.frames else 0.0,
+        })
+        return out
@@ -3,21 +3,26 @@
 # Dependencies: sounddevice, numpy, requests
 
 from __future__ import annotations
-import os, io, time, math, tempfile, threading, queue, contextlib, wave
-from typing import Callable, Optional
+import os, io, time, math, threading, queue, contextlib, wave
+from collections import deque
+from typing import Callable, Optional, Union
 import numpy as np
 import sounddevice as sd
 import requests
 
-# Make webrtcvad optional
-try:
-    import webrtcvad
-    VAD_AVAILABLE = True
-except ImportError:
-    webrtcvad = None
-    VAD_AVAILABLE = False
-
 from agent.utils.logger import get_logger
+from agent.intents import ROUTER
+from agent.speech.assemblyai import AAI_KEY_ENV, AssemblyAIClient, WS_AVAILABLE, get_client
+from agent.speech.capture import CaptureStream
+from agent.speech.completion import HedgePolicy, make_strategy
+from agent.speech.audio_prep import prepare_upload
+from agent.speech.stt_backends import AssemblyAIBackend, SttBackend, get_backend
+from agent.speech.wake_spotter import WakeSpotter
+from agent.speech.endpoint import Endpointer
+from agent.speech.offline_queue import REPLAY_INTERVAL_S, OfflineQueue, QueuedUtterance, is_unreachable
+from agent.speech.utterance import PTT_MAX_S, PTT_MEMORY_S, UtteranceBuffer
+from agent.speech.pipeline import BargeIn, TurnPipeline
+from agent.speech.vad import MAX_BATCH_BLOCKS, WEBRTC_AVAILABLE as VAD_AVAILABLE, EnergyVAD, HybridVAD
 
 log = get_logger("voice_loop")
 
@@ -72,73 +77,16 @@ THRESHOLD = 900             # energy threshold to start (0-32767). Raise in nois
 MIN_TALK_MS = 200           # must exceed threshold for at least this to start
 TAIL_SIL_MS = 800           # stop after this much silence
 MAX_UTTER_MS = 8000         # hard stop length cap per turn
+PREROLL_MS = 300            # audio kept from before the VAD trigger / PTT press
+STT_DEADLINE_S = 24         # per-turn cap on upload + transcription (batch STT)
 # --------------------------------------------------------
 
-AAI_KEY_ENV = "ASSEMBLYAI_API_KEY"
-
-class AssemblyAIClient:
-    def __init__(self, api_key: Optional[str]=None):
-        self.api_key = api_key or os.getenv(AAI_KEY_ENV)
-        if not self.api_key:
-            raise RuntimeError(f"{AAI_KEY_ENV} not set")
-        self._session = requests.Session()
-
-    def _headers(self, content_type: Optional[str]=None):
-        h = {"authorization": self.api_key}
-        if content_type: h["content-type"] = content_type
-        return h
-
-    def upload(self, filepath: str) -> str:
-        with open(filepath, "rb") as f:
-            r = self._session.post(
-                "https://api.assemblyai.com/v2/upload",
-                headers=self._headers(),
-                data=f,
-                timeout=60,
-            )
-        r.raise_for_status()
-        return r.json()["upload_url"]
-
-    def transcribe_url(self, url: str, poll_ms: int=800) -> str:
-        r = self._session.post(
-            "https://api.assemblyai.com/v2/transcript",
-            headers=self._headers("application/json"),
-            json={"audio_url": url},
-            timeout=30,
-        )
-        r.raise_for_status()
-        tid = r.json()["id"]
-        while True:
-            s = self._session.get(
-                f"https://api.assemblyai.com/v2/transcript/{tid}",
-                headers=self._headers(),
-                timeout=30,
-            )
-            s.raise_for_status()
-            j = s.json()
-            if j["status"] == "completed":
-                return (j.get("text") or "").strip()
-            if j["status"] == "error":
-                raise RuntimeError(j.get("error","transcription failed"))
-            time.sleep(poll_ms/1000.0)
-
-def _save_wav_int16(audio: np.ndarray, sr: int=SR) -> str:
-    """Save mono int16 audio to a temporary WAV file and return its path."""
-    fd, path = tempfile.mkstemp(suffix=".wav")
-    os.close(fd)
-    pcm = _ensure_mono_int16(audio)
-    with wave.open(path, 'wb') as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(sr)
-        wf.writeframes(pcm.tobytes())
-    return path
-
-def assemblyai_transcribe_wav(wav_bytes: bytes) -> str:
-    """Transcribe WAV audio bytes using AssemblyAI.
+def _transcribe_or_empty(transcribe: Callable[[], str], raise_unreachable: bool = False) -> str:
+    """Run transcribe (an AssemblyAI upload + wait, e.g. AssemblyAIClient.transcribe_pcm).
 
     Reads API key from the ASSEMBLYAI_API_KEY environment variable.
-    Returns empty string on failure.
+    Returns empty string on failure; with raise_unreachable, connection
+    errors and network timeouts are raised instead (so the audio can be queued).
     """
     api_key = os.getenv(AAI_KEY_ENV)
     if not api_key or api_key == "your_assemblyai_api_key_here":
@@ -147,58 +95,40 @@ def assemblyai_transcribe_wav(wav_bytes: bytes) -> str:
         return ""
 
     try:
-        headers = {"authorization": api_key}
-
-        # Upload the audio file
-        print("\n[STT] Uploading audio to AssemblyAI...")
-        upload_response = requests.post(
-            "https://api.assemblyai.com/v2/upload",
-            headers=headers,
-            data=wav_bytes
-        )
-        upload_response.raise_for_status()
-        upload_url = upload_response.json()["upload_url"]
-
-        # Start transcription
-        print("[STT] Starting transcription...")
-        transcribe_response = requests.post(
-            "https://api.assemblyai.com/v2/transcripts",
-            headers={**headers, "content-type": "application/json"},
-            json={"audio_url": upload_url}
-        )
-        transcribe_response.raise_for_status()
-        transcript_id = transcribe_response.json()["id"]
-
-        # Poll for results
-        print("[STT] Waiting for transcription...")
-        for _ in range(30):  # Wait up to ~24 seconds
-            time.sleep(0.8)
-            status_response = requests.get(
-                f"https://api.assemblyai.com/v2/transcripts/{transcript_id}",
-                headers=headers,
-                timeout=60
-            )
-            status_response.raise_for_status()
-            data = status_response.json()
-
-            if data.get("status") == "completed":
-                text = (data.get("text") or "").strip()
-                if text:
-                    print("[STT] Transcription successful!")
-                return text
-
-            if data.get("status") == "error":
-                error = data.get("error", "Unknown error")
-                print(f"[STT] Transcription failed: {error}")
-                return ""
+        text = transcribe()
+        if text:
+            print("[STT] Transcription successful!")
+        return text
 
+    except TimeoutError:
         print("[STT] Transcription timed out")
         return ""
-
+    except RuntimeError as e:
+        print(f"[STT] Transcription failed: {e}")
+        return ""
     except requests.exceptions.RequestException as e:
+        if raise_unreachable and is_unreachable(e):
+            raise
         print(f"[STT] API request failed: {e}")
         return ""
 
+def assemblyai_transcribe_wav(wav_bytes: bytes, deadline_s: float = STT_DEADLINE_S) -> str:
+    """Transcribe WAV audio bytes using AssemblyAI. Returns empty string on failure."""
+    return _transcribe_or_empty(lambda: get_client().transcribe_bytes(wav_bytes, deadline_s=deadline_s))
+
+def assemblyai_transcribe_pcm(audio: Union[np.ndarray, bytes], sr: int = SR, audio_s: float = 0.0,
+                              deadline_s: float = STT_DEADLINE_S, raise_unreachable: bool = False) -> str:
+    """Like assemblyai_transcribe_wav, but streams the PCM array as WAV without copying it.
+
+    Already-encoded audio (bytes from audio_prep) is uploaded as-is.
+    """
+    if isinstance(audio, bytes):
+        return _transcribe_or_empty(lambda: get_client().transcribe_bytes(audio, audio_s=audio_s, deadline_s=deadline_s),
+                                    raise_unreachable=raise_unreachable)
+    pcm = np.ascontiguousarray(_ensure_mono_int16(audio))
+    return _transcribe_or_empty(lambda: get_client().transcribe_pcm(pcm, sr, deadline_s=deadline_s),
+                                raise_unreachable=raise_unreachable)
+
 def _ensure_mono_int16(arr: np.ndarray) -> np.ndarray:
     """Convert an array to mono int16 PCM."""
     if arr.ndim > 1:
@@ -221,13 +151,27 @@ def _wav_bytes_from_pcm16(pcm: np.ndarray, sr: int = SR) -> bytes:
             wf.writeframes(pcm.tobytes())
         return buf.getvalue()
 
-def record_ptt(device: Optional[int] = None) -> np.ndarray:
+def record_ptt(device: Optional[int] = None,
+               on_frame: Optional[Callable[[np.ndarray], None]] = None,
+               capture: Optional[CaptureStream] = None,
+               preroll_ms: int = PREROLL_MS,
+               max_s: float = PTT_MAX_S,
+               buffer_stats: Optional[dict] = None,
+               native_rate: bool = True) -> np.ndarray:
     """Record audio until the user presses Enter again (push-to-talk).
 
-    Returns mono int16 numpy array at SR.
+    Returns mono int16 numpy array at SR. If on_frame is given it is called
+    with each captured block (e.g. to feed a streaming STT session). The
+    recording is read from the persistent capture's ring buffer, starting
+    preroll_ms before the key press; without one, a capture stream is
+    opened for this recording only (at the device rate if native_rate).
+    Samples go into an UtteranceBuffer: the first PTT_MEMORY_S seconds stay
+    in memory, longer recordings spill to a temporary file (the result is
+    then a read-only memmap), and recording stops after max_s seconds.
+    If buffer_stats is a dict it is updated with the buffer's stats().
     """
     stop_event = threading.Event()
-    frames: list[np.ndarray] = []
+    buf = UtteranceBuffer(int(SR * max_s), spill_samples=int(SR * PTT_MEMORY_S))
 
     def _input_waiter():
         try:
@@ -235,98 +179,192 @@ def record_ptt(device: Optional[int] = None) -> np.ndarray:
         finally:
             stop_event.set()
 
-    def _callback(indata, frames_count, time_info, status):  # sounddevice callback
-        if status:
-            log.warning(f"InputStream status: {status}")
-        frames.append(indata.copy())
-
+    own = capture is None
+    if own:
+        capture = CaptureStream(device=device, sr=SR, block_ms=BLOCK_MS, native_rate=native_rate).start()
     waiter = threading.Thread(target=_input_waiter, daemon=True)
     waiter.start()
 
-    blocksize = int(SR * (BLOCK_MS / 1000.0))
-    with sd.InputStream(samplerate=SR, channels=1, dtype='int16',
-                        device=device, blocksize=blocksize, callback=_callback):
-        while not stop_event.is_set():
-            time.sleep(0.05)
-
-    if frames:
-        audio = np.concatenate(frames, axis=0).reshape(-1)
-    else:
-        audio = np.zeros((0,), dtype=np.int16)
+    try:
+        # Drain the ring every 50 ms so long recordings never overrun it
+        pos = max(capture.ring.oldest, capture.position - int(SR * preroll_ms / 1000))
+        while True:
+            done = stop_event.wait(0.05)
+            end = capture.position
+            pos = max(pos, capture.ring.oldest)
+            while pos < end and not buf.full:
+                space = buf.reserve(end - pos)   # may be less than asked for (cap or spill boundary)
+                chunk = capture.slice(pos, pos + len(space), out=space)
+                if on_frame is not None:
+                    on_frame(chunk)
+                pos += len(chunk)
+            if done or buf.full:
+                break
+        capture.consumed = pos
+    finally:
+        if own:
+            capture.stop()
+
+    if buf.full and not stop_event.is_set():
+        print(f"[PTT] Recording limit reached ({max_s:.0f}s). Press Enter to continue.")
+        waiter.join()   # let the pending input() take this Enter, not the next prompt
+    audio = buf.view()
+    if buffer_stats is not None:
+        buffer_stats.update(buf.stats())
+    buf.close()
     return audio
 
+@contextlib.contextmanager
+def _open_input(device: Optional[int], capture: Optional[CaptureStream] = None, native_rate: bool = True):
+    """Frame source for the VAD loops: a reader over the persistent capture, or over one opened for this turn."""
+    own = capture is None
+    if own:
+        capture = CaptureStream(device=device, sr=SR, block_ms=BLOCK_MS, native_rate=native_rate).start()
+    try:
+        with capture.reader() as reader:
+            yield reader
+    finally:
+        if own:
+            capture.stop()
+
+def _read_blocks(stream, block_len: int, max_blocks: int = MAX_BATCH_BLOCKS) -> np.ndarray:
+    """Read every whole block already available (at least one, blocking), as flat int16."""
+    avail = int(getattr(stream, "read_available", 0) or 0)
+    n = max(1, min(max_blocks, avail // block_len))
+    data, _ = stream.read(n * block_len)
+    return data.reshape(-1)
+
 def _record_utterance(
     device: Optional[int] = None,
     threshold: int = THRESHOLD,
     min_talk_ms: int = MIN_TALK_MS,
     tail_sil_ms: int = TAIL_SIL_MS,
     max_utter_ms: int = MAX_UTTER_MS,
+    on_frame: Optional[Callable[[np.ndarray], None]] = None,
+    capture: Optional[CaptureStream] = None,
+    preroll_ms: int = PREROLL_MS,
+    energies: Optional[list] = None,
+    endpointer: Optional[Endpointer] = None,
+    vad: Optional[EnergyVAD] = None,
+    buffer_stats: Optional[dict] = None,
+    native_rate: bool = True,
 ) -> np.ndarray:
     """Simple amplitude-based VAD recording. Returns mono int16 samples.
 
-    Starts when energy exceeds threshold for at least min_talk_ms and
-    stops after tail_sil_ms of silence or when max_utter_ms is reached.
+    Starts when vad flags speech onset for at least min_talk_ms and stops
+    after tail_sil_ms of non-speech (or the endpointer's adaptive tail, if
+    given) or when max_utter_ms of speech is reached. vad is an EnergyVAD
+    (noise-floor thresholds) or HybridVAD (energy gate + webrtcvad); without
+    one the fixed threshold is used. Blocks that are already buffered are
+    classified as one batch.
+    The trigger blocks plus preroll_ms before them are kept, so the onset
+    is not clipped. Every captured block is also passed to on_frame, if given.
+    With a persistent capture the result is sliced from its ring buffer;
+    otherwise a capture stream is opened for this turn (at the device rate
+    if native_rate) and blocks are copied into a preallocated UtteranceBuffer.
+    If energies is a list, the RMS of each returned block is appended to it,
+    and if buffer_stats is a dict it is updated with the buffer's stats.
     """
     block_len = int(SR * (BLOCK_MS / 1000.0))
     max_blocks = int(max_utter_ms / BLOCK_MS)
     tail_blocks = int(tail_sil_ms / BLOCK_MS)
     min_talk_blocks = max(1, int(min_talk_ms / BLOCK_MS))
+    if vad is None:
+        vad = EnergyVAD(block_len, threshold, adaptive=False, block_ms=BLOCK_MS)
 
     started = False
     above_count = 0
     silence_count = 0
 
-    captured: list[np.ndarray] = []
+    pre: deque = deque(maxlen=min_talk_blocks + int(preroll_ms / BLOCK_MS))
+    buf = UtteranceBuffer((max_blocks + pre.maxlen) * block_len) if capture is None else None
+    utt_start = 0
 
-    def _rms_int16(x: np.ndarray) -> float:
-        x = x.astype(np.int32)
-        return float(np.sqrt(np.mean((x * x))))
+    def _keep(block: np.ndarray, energy: float) -> None:
+        if buf is not None:
+            buf.append(block)
+        if energies is not None:
+            energies.append(energy)
+        if on_frame is not None:
+            on_frame(block)
 
-    with sd.InputStream(samplerate=SR, channels=1, dtype='int16', device=device,
-                        blocksize=block_len) as stream:
+    with _open_input(device, capture, native_rate) as stream:
         total_blocks = 0
-        while True:
-            data, _ = stream.read(block_len)
-            data = data.reshape(-1)
-            total_blocks += 1
-
-            # Compute simple energy metric
-            energy = _rms_int16(data)
-
-            if not started:
-                if energy >= threshold:
-                    above_count += 1
-                else:
-                    above_count = 0
-
-                if above_count >= min_talk_blocks:
-                    started = True
-                    _cue_start()
-                    captured.append(data.copy())
-            else:
-                captured.append(data.copy())
-                if energy < threshold:
+        done = False
+        while not done:
+            # blocks are views into a fresh batch array, so they can be kept without copying
+            batch = _read_blocks(stream, block_len)
+            levels, may_start, speech = vad.classify(batch)
+            n = len(levels)
+            for i in range(n):
+                data = batch[i * block_len:(i + 1) * block_len]
+                energy = float(levels[i])
+                unread = (n - i - 1) * block_len   # samples of this batch after the current block
+
+                if not started:
+                    pre.append((data, energy))
+                    if may_start[i]:
+                        above_count += 1
+                    else:
+                        above_count = 0
+
+                    if above_count >= min_talk_blocks:
+                        started = True
+                        total_blocks = above_count
+                        _cue_start()
+                        if capture is not None:
+                            utt_start = stream.pos - unread - len(pre) * block_len
+                        if endpointer is not None:
+                            endpointer.begin(stream.pos - unread - above_count * block_len if capture is not None else None)
+                            for block, e in list(pre)[-above_count:]:
+                                endpointer.update(block, e, True)
+                        for block, e in pre:
+                            _keep(block, e)
+                    continue
+
+                total_blocks += 1
+                _keep(data, energy)
+                is_speech = bool(speech[i])
+                if not is_speech:
                     silence_count += 1
                 else:
                     silence_count = 0
 
-                if silence_count >= tail_blocks:
+                if endpointer is not None:
+                    done = endpointer.update(data, energy, is_speech)
+                    if done:
+                        endpointer.end(stream.pos - unread if capture is not None else None)
+                else:
+                    done = silence_count >= tail_blocks
+                if not done and total_blocks >= max_blocks:
+                    done = True
+                    if endpointer is not None:
+                        endpointer.abort()
+                if done:
+                    if capture is not None:
+                        stream.pos -= unread   # leave the rest of the batch for the next utterance
                     _cue_end()
                     break
 
-            if started and total_blocks >= max_blocks:
-                _cue_end()
-                break
-
-    if captured:
-        return np.concatenate(captured).astype(np.int16)
-    return np.zeros((0,), dtype=np.int16)
+    if buf is not None:
+        audio = buf.view()
+    elif started:
+        audio = capture.slice(utt_start, stream.pos)
+    else:
+        audio = np.zeros((0,), dtype=np.int16)
+    if buffer_stats is not None:
+        buffer_stats.update(buf.stats() if buf is not None else
+                            {"samples": len(audio), "memory_bytes": audio.nbytes, "spilled_bytes": 0,
+                             "allocations": 1, "capped": False})
+    return audio
 
 def listen_once_auto(device: Optional[int]=None,
                      threshold: int=THRESHOLD,
                      min_talk_ms: int=MIN_TALK_MS,
                      tail_sil_ms: int=TAIL_SIL_MS,
-                     max_utter_ms: int=MAX_UTTER_MS) -> np.ndarray:
+                     max_utter_ms: int=MAX_UTTER_MS,
+                     on_frame: Optional[Callable[[np.ndarray], None]]=None,
+                     capture: Optional[CaptureStream]=None) -> np.ndarray:
     """Blocks until it hears speech, returns one utterance as int16 audio."""
     print(f"[listen] Waiting for speech… threshold={threshold}, device={device}")
     audio = _record_utterance(
@@ -334,7 +372,9 @@ def listen_once_auto(device: Optional[int]=None,
         threshold=threshold,
         min_talk_ms=min_talk_ms,
         tail_sil_ms=tail_sil_ms,
-        max_utter_ms=max_utter_ms
+        max_utter_ms=max_utter_ms,
+        on_frame=on_frame,
+        capture=capture,
     )
     dur = len(audio)/SR
     print(f"[listen] Captured {dur:.2f}s of audio")
@@ -346,73 +386,93 @@ def listen_once_auto_v2(device: Optional[int]=None,
                         tail_sil_ms: int=TAIL_SIL_MS,
                         max_utter_ms: int=MAX_UTTER_MS,
                         use_webrtcvad: bool=False,
-                        verbosity: str = "normal") -> np.ndarray:
-    """Improved listen with optional webrtcvad and verbosity controls."""
+                        verbosity: str = "normal",
+                        on_frame: Optional[Callable[[np.ndarray], None]]=None,
+                        capture: Optional[CaptureStream]=None,
+                        preroll_ms: int=PREROLL_MS,
+                        energies: Optional[list]=None,
+                        endpointer: Optional[Endpointer]=None,
+                        vad: Optional[EnergyVAD]=None,
+                        buffer_stats: Optional[dict]=None,
+                        native_rate: bool=True) -> np.ndarray:
+    """Improved listen with optional webrtcvad and verbosity controls.
+
+    energies receives the per-block RMS of the result.
+    endpointer replaces the fixed tail_sil_ms with an adaptive end-of-utterance decision.
+    vad is the detector kept across turns: an EnergyVAD (noise-tracking thresholds
+    instead of the fixed threshold) or a HybridVAD. With use_webrtcvad and no
+    HybridVAD given one is created; if webrtcvad is missing that is logged and
+    the amplitude detector is used. buffer_stats receives the capture buffer's stats.
+    native_rate applies when no persistent capture is given (see CaptureStream).
+    """
     def say(msg: str):
         if verbosity != "quiet":
             print(msg)
 
-    if use_webrtcvad and VAD_AVAILABLE:
+    if use_webrtcvad and not isinstance(vad, HybridVAD):
         try:
-            vad = webrtcvad.Vad(2)
-            block_len = int(SR * (BLOCK_MS / 1000.0))
-            with sd.InputStream(samplerate=SR, channels=1, dtype='int16', device=device,
-                                blocksize=block_len) as stream:
-                say("[listen] Waiting for speech (webrtcvad)...")
-                voiced: list[np.ndarray] = []
-                started = False
-                silence_count = 0
-                tail_blocks = int(tail_sil_ms / BLOCK_MS)
-                max_blocks = int(max_utter_ms / BLOCK_MS)
-                total_blocks = 0
-                while True:
-                    data, _ = stream.read(block_len)
-                    total_blocks += 1
-                    frame = data.reshape(-1)
-                    is_speech = vad.is_speech(frame.tobytes(), sample_rate=SR)
-                    if not started and is_speech:
-                        started = True
-                        _cue_start()
-                    if started:
-                        voiced.append(frame.copy())
-                        if not is_speech:
-                            silence_count += 1
-                        else:
-                            silence_count = 0
-                        if silence_count >= tail_blocks or total_blocks >= max_blocks:
-                            _cue_end()
-                            break
-                audio = np.concatenate(voiced).astype(np.int16) if voiced else np.zeros((0,), dtype=np.int16)
-                say(f"[listen] Captured {len(audio)/SR:.2f}s of audio")
-                return audio
-        except Exception:
-            # fall back to amplitude
-            pass
-
-    say(f"[listen] Waiting for speech... threshold={threshold}, device={device}")
+            vad = HybridVAD(int(SR * BLOCK_MS / 1000), threshold, sr=SR, block_ms=BLOCK_MS)
+        except RuntimeError as e:
+            log.warning(f"{e}; using the amplitude VAD")
+    if isinstance(vad, HybridVAD):
+        say("[listen] Waiting for speech (webrtcvad)...")
+        audio = _record_utterance(
+            device=device,
+            min_talk_ms=min_talk_ms,
+            tail_sil_ms=tail_sil_ms,
+            max_utter_ms=max_utter_ms,
+            on_frame=on_frame,
+            capture=capture,
+            preroll_ms=preroll_ms,
+            energies=energies,
+            endpointer=endpointer,
+            vad=vad,
+            buffer_stats=buffer_stats,
+            native_rate=native_rate,
+        )
+        say(f"[listen] Captured {len(audio)/SR:.2f}s of audio")
+        return audio
+
+    if vad is not None and vad.adaptive:
+        say(f"[listen] Waiting for speech... threshold=auto ({int(vad.start_threshold)}), device={device}")
+    else:
+        say(f"[listen] Waiting for speech... threshold={threshold}, device={device}")
     audio = _record_utterance(
         device=device,
         threshold=threshold,
         min_talk_ms=min_talk_ms,
         tail_sil_ms=tail_sil_ms,
-        max_utter_ms=max_utter_ms
+        max_utter_ms=max_utter_ms,
+        on_frame=on_frame,
+        capture=capture,
+        preroll_ms=preroll_ms,
+        energies=energies,
+        endpointer=endpointer,
+        vad=vad,
+        buffer_stats=buffer_stats,
+        native_rate=native_rate,
     )
     say(f"[listen] Captured {len(audio)/SR:.2f}s of audio")
     return audio
 
-def stt_transcribe(audio: np.ndarray, aai: Optional[AssemblyAIClient]=None) -> str:
-    aai = aai or AssemblyAIClient()
-    wav_path = _save_wav_int16(audio, SR)
-    try:
-        print("[stt] Uploading…")
-        url = aai.upload(wav_path)
-        print("[stt] Transcribing…")
-        text = aai.transcribe_url(url)
-        print(f"[stt] Text: {text!r}")
-        return text
-    finally:
-        with contextlib.suppress(Exception):
-            os.remove(wav_path)
+def stt_transcribe(audio: Union[np.ndarray, bytes], aai: Optional[AssemblyAIClient]=None,
+                   audio_s: float=0.0, backend: Optional[SttBackend]=None,
+                   deadline_s: Optional[float]=None) -> str:
+    """Transcribe with backend (default: AssemblyAI batch, through aai if given)."""
+    if backend is None:
+        backend = AssemblyAIBackend(aai) if aai is not None else get_backend("assemblyai")
+    print(f"[stt] Transcribing ({backend.name})…")
+    if not isinstance(audio, bytes):
+        audio = _ensure_mono_int16(audio)
+    text = backend.transcribe(audio, SR, audio_s=audio_s, deadline_s=deadline_s)
+    print(f"[stt] Text: {text!r}")
+    return text
+
+def _perf(state: Optional[dict], key: str, defaults: dict) -> dict:
+    """The state['perf'][key] counters (created from defaults); a scratch dict when there is no state."""
+    if state is None:
+        return dict(defaults)
+    return state.setdefault('perf', {}).setdefault(key, dict(defaults))
 
 def run_voice_loop(
     generate_text: Callable[[str], str],
@@ -424,6 +484,23 @@ def run_voice_loop(
     state: Optional[dict] = None,
     use_webrtcvad: bool = False,
     verbosity: str = "normal",
+    stt_mode: str = "batch",
+    persistent_capture: bool = True,
+    preroll_ms: int = PREROLL_MS,
+    stt_completion: str = "adaptive",
+    trim_silence: bool = True,
+    stt_encoding: str = "wav",
+    stt_threads: Optional[int] = None,
+    wake_spotter: Optional[WakeSpotter] = None,
+    adaptive_endpoint: bool = True,
+    adaptive_threshold: bool = True,
+    native_rate: bool = True,
+    pipelined: bool = True,
+    stt_deadline_s: float = STT_DEADLINE_S,
+    stt_hedge: bool = True,
+    offline_dir: Optional[str] = None,
+    stream_reply: bool = True,
+    cancel_generation: Optional[Callable[[], int]] = None,
 ) -> None:
     """Run the main voice interaction loop.
     
@@ -431,45 +508,249 @@ def run_voice_loop(
         generate_text: Function that processes user text and returns response
         mode: 'ptt' for push-to-talk or 'auto' for voice activity detection
         no_tts: If True, only print responses instead of using TTS
+        stt_mode: 'batch' (upload after capture), 'stream' (WebSocket while speaking)
+            or 'local' (offline CPU model)
+        persistent_capture: Keep one input stream open for the session (ring buffer)
+            instead of opening the device for every utterance
+        preroll_ms: Audio kept from before speech onset / the PTT key press
+        stt_completion: How batch transcripts are awaited: 'adaptive', 'fixed' or 'webhook'
+        trim_silence: Drop leading/trailing non-speech before batch upload
+        stt_encoding: Upload format for batch STT: 'wav', 'flac' or 'mulaw'
+        stt_threads: CPU threads for the local STT model (default: up to 4)
+        wake_spotter: Enrolled on-device spotter; in auto mode utterances it rejects
+            are dropped before STT (only used while it matches the current wake word)
+        adaptive_endpoint: Predict end of speech per turn (learning the speaker's pauses)
+            instead of always waiting the fixed 800 ms tail
+        adaptive_threshold: Track the room's noise floor and derive start/stop levels
+            from it, starting from threshold ('set threshold to N' pins a fixed level)
+        native_rate: Open the microphone at its default rate (e.g. 48 kHz) and resample
+            to 16 kHz in-process, instead of making the host API / RDP redirector resample
+        pipelined: Run STT and generation on their own threads behind bounded queues, so
+            the next utterance is captured while the previous command is still running
+            (False: the old strictly sequential listen -> transcribe -> generate loop)
+        stt_deadline_s: Seconds a batch turn may spend on upload + transcription
+        stt_hedge: Send a duplicate transcript job when one runs past the p90 latency
+            seen for its audio length, and use whichever finishes first
+        offline_dir: Directory for utterances captured while batch STT is unreachable;
+            they are transcribed and run in order once it answers again (None: drop them)
+        stream_reply: Call generate_text(text, on_chunk=...) and print the reply sentence
+            by sentence as it is generated, instead of all at once when it is done
+            (default; pass False for a generate_text without on_chunk)
+        cancel_generation: Aborts the reply being generated (returns how many were
+            cancelled). With it, a new command starting with the wake word (or a
+            stop word) interrupts the current reply so the new one starts right away
+            (barge-in). Needs pipelined=True, where STT runs during generation
     """
     log.info(f"Starting voice loop in {mode} mode" + (" (No TTS)" if no_tts else "") + (" [webrtcvad]" if use_webrtcvad and VAD_AVAILABLE else ""))
+    if cancel_generation is not None and not pipelined:
+        raise ValueError("barge-in (cancel_generation) needs pipelined=True: inline, nothing is heard during a reply")
+    if stt_mode == "stream" and not WS_AVAILABLE:
+        log.warning("Streaming STT requested but websockets is not installed; using batch STT")
+        stt_mode = "batch"
+    local_stt: Optional[SttBackend] = None
+    if stt_mode == "local":
+        try:
+            local_stt = get_backend("local", stt_threads)
+            threading.Thread(target=local_stt.warm, daemon=True).start()  # load the model now, not on turn 1
+        except Exception as e:
+            if not os.getenv(AAI_KEY_ENV):
+                raise RuntimeError(f"Local STT unavailable ({e}) and {AAI_KEY_ENV} is not set "
+                                   "for the batch fallback") from e
+            log.warning(f"Local STT unavailable ({e}); using batch STT")
+            stt_mode = "batch"
+    stt_backend: SttBackend = local_stt or get_backend("assemblyai")
+    # Open the pooled HTTPS connection now so the first turn skips the TLS handshake
+    with contextlib.suppress(Exception):
+        get_client().completion = make_strategy(stt_completion)
+        get_client().hedging = HedgePolicy() if stt_hedge else None
+        threading.Thread(target=get_client().warm, daemon=True).start()
+    offline: Optional[OfflineQueue] = None
+    if offline_dir and local_stt is None:
+        try:
+            offline = OfflineQueue(offline_dir)
+            if len(offline):
+                print(f"[stt] {len(offline)} saved command(s) from an earlier session will be sent first.")
+        except OSError as e:
+            log.warning(f"Offline queue unavailable ({e})")
+    capture: Optional[CaptureStream] = None
+    endpointer = Endpointer(block_ms=BLOCK_MS, sr=SR, max_tail_ms=TAIL_SIL_MS) if adaptive_endpoint else None
+    vad = EnergyVAD(int(SR * BLOCK_MS / 1000), threshold, adaptive=adaptive_threshold, block_ms=BLOCK_MS)
+    hybrid: Optional[HybridVAD] = None
+    if use_webrtcvad and not VAD_AVAILABLE:
+        log.warning("webrtcvad requested but not installed; using the amplitude VAD")
+
+    def _detector(uv: bool) -> EnergyVAD:
+        """The session's amplitude VAD, or the hybrid webrtcvad one when enabled and installed."""
+        nonlocal hybrid
+        if not uv or not VAD_AVAILABLE:
+            return vad
+        if hybrid is None:
+            hybrid = HybridVAD(int(SR * BLOCK_MS / 1000), threshold, sr=SR, block_ms=BLOCK_MS)
+            if not vad.adaptive:
+                hybrid.set_threshold(threshold)
+        return hybrid
+    if wake_spotter is not None:
+        log.info(f"Wake spotter enrolled for '{wake_spotter.word}' (threshold {wake_spotter.threshold:.2f})")
+
+    def _prepare(audio: np.ndarray, energies: Optional[list] = None):
+        """Trim/encode one utterance for batch upload; returns (payload, audio_s)."""
+        encoding = stt_encoding if local_stt is None else "wav"
+        payload, stats = prepare_upload(audio, SR, int(SR * BLOCK_MS / 1000), threshold=vad.stop_threshold,
+                                        energies=energies, encoding=encoding, trim=trim_silence)
+        perf = _perf(state, 'upload', {'count':0,'raw_bytes':0,'sent_bytes':0,'saved_bytes':0})
+        perf['count'] += 1
+        perf['raw_bytes'] += stats['raw_bytes']
+        perf['sent_bytes'] += stats['sent_bytes']
+        perf['saved_bytes'] += stats['saved_bytes']
+        perf['last'] = stats
+        return payload, len(audio) / SR - stats['trimmed_ms'] / 1000.0
+
+    def _note_buffer(stats: dict) -> None:
+        """Per-utterance capture buffer usage for /api/perf."""
+        if not stats:
+            return
+        perf = _perf(state, 'capture_buffer', {'count':0,'peak_bytes':0,'spilled':0,'capped':0})
+        perf['count'] += 1
+        perf['peak_bytes'] = max(perf['peak_bytes'], stats['memory_bytes'])
+        perf['spilled'] += 1 if stats['spilled_bytes'] else 0
+        perf['capped'] += 1 if stats['capped'] else 0
+        perf['last'] = stats
+
+    def _ensure_capture() -> Optional[CaptureStream]:
+        """Open (or reopen after a device change) the session capture stream."""
+        nonlocal capture, persistent_capture
+        if not persistent_capture:
+            return None
+        if capture is None or capture.device != device:
+            if capture is not None:
+                capture.stop()
+            try:
+                capture = CaptureStream(device=device, sr=SR, block_ms=BLOCK_MS, native_rate=native_rate).start()
+            except Exception as e:
+                log.warning(f"Persistent capture unavailable ({e}); opening the device per turn")
+                capture = None
+                persistent_capture = False
+                return None
+        if state is not None:
+            with contextlib.suppress(Exception):
+                state.setdefault('perf', {})['capture'] = {'device_hz': capture.device_rate, 'sr': SR,
+                                                           'overflows': capture.overflows}
+        return capture
+
+    def _wake_gate(turn: dict) -> Optional[Callable[[np.ndarray], bool]]:
+        """Per-turn spotter check, or None when no enrolled spotter matches the wake word.
+
+        The check runs at most once per turn and stores its verdict in turn['accepted'].
+        """
+        if wake_spotter is None or not wake_word or wake_spotter.word != _normalize(wake_word):
+            return None
+
+        def gate(audio: np.ndarray) -> bool:
+            if "accepted" not in turn:
+                _w0 = time.time()
+                turn["accepted"], turn["score"] = wake_spotter.check(audio, SR)
+                perf = _perf(state, 'wake', {'checked':0,'rejected':0,'last_ms':0})
+                perf['checked'] += 1
+                perf['rejected'] += 0 if turn["accepted"] else 1
+                perf['last_ms'] = int((time.time() - _w0)*1000)
+                perf['last_score'] = round(turn["score"], 3)
+            return turn["accepted"]
+
+        return gate
+
+    stream_conn: dict = {}      # the streaming session kept open across turns
+
+    def _stream_turn(vb: str, gate: Optional[Callable[[np.ndarray], bool]] = None):
+        """Return (on_frame, finish) that stream one utterance while it is captured.
+
+        The WebSocket is opened on the first voiced frame and kept open for
+        the following turns (it closes itself after STREAM_IDLE_S of silence
+        and is reopened then); finish(fallback) returns the final transcript,
+        or calls fallback() if streaming failed.
+        With a wake gate the first preroll + spotter window of audio is held
+        back and the session is only opened if the gate accepts it.
+        """
+        holder: dict = {}
+        pending: list[np.ndarray] = []
+        window = int(SR * (preroll_ms + (wake_spotter.window_ms if wake_spotter else 0)) / 1000)
+
+        def _partial(text: str) -> None:
+            if vb == "verbose":
+                print(f"[stt] ... {text}")
+
+        def on_frame(frame: np.ndarray) -> None:
+            frames = [frame]
+            if gate is not None and "wake" not in holder:
+                pending.append(frame)
+                if sum(len(f) for f in pending) < window:
+                    return
+                holder["wake"] = gate(np.concatenate(pending))
+                frames = pending
+            if holder.get("wake") is False:
+                return
+            sess = holder.get("session")
+            if sess is None:
+                sess = stream_conn.get("session")
+                if sess is None or not sess.alive:
+                    sess = stream_conn["session"] = get_client().stream(SR).start()
+                sess.on_partial = _partial
+                holder["session"] = sess
+            for f in frames:
+                sess.push(f)
+
+        def finish(fallback: Callable[[], str]) -> str:
+            sess = holder.get("session")
+            if sess is None:
+                return fallback()
+            try:
+                text = sess.end_utterance()
+                stt_backend.last_timings = dict(sess.timings)
+                return text
+            except Exception as e:
+                log.warning(f"Streaming STT failed ({e}); falling back to batch upload")
+                sess.close()
+                stream_conn.pop("session", None)
+                return fallback()
+
+        return on_frame, finish
     
-    def _handle_settings(cmd: str) -> Optional[str]:
+    def _handle_settings(cmd: str, fuzzy: bool = True) -> Optional[str]:
+        """Apply a settings command (see agent.intents); returns its message, or None if cmd is not one."""
         nonlocal threshold, wake_word, device
-        t = _normalize(cmd)
-        # set threshold to N
-        m = re.match(r"^set (?:the )?threshold (?:to|=)\s*(\d{2,5})$", t)
-        if m:
+        m = ROUTER.match(cmd, group="settings", fuzzy=fuzzy)
+        if m is None:
+            return None
+        ROUTER.record(m)
+        if m.intent == "set_threshold":
             try:
-                val = int(m.group(1))
+                val = int(m.slots["value"])
                 threshold = val
+                vad.set_threshold(val)
+                if hybrid is not None:
+                    hybrid.set_threshold(val)
                 if state is not None:
                     state["threshold"] = val
+                    state["adaptive_threshold"] = False
                 return f"[settings] Threshold set to {val}"
             except Exception:
                 return "[settings] Invalid threshold value"
 
-        # set wake word to X
-        m = re.match(r"^set (?:the )?wake\s*word (?:to|=)\s*(.+)$", t)
-        if m:
-            ww = m.group(1).strip()
+        if m.intent == "set_wake_word":
+            ww = m.slots["word"].strip()
             wake_word = ww or None
             if state is not None:
                 state["wake_word"] = wake_word
             return f"[settings] Wake word set to '{wake_word or 'OFF'}'"
 
-        # disable wake word
-        if t in ("disable wake word", "turn off wake word", "wake word off"):
+        if m.intent == "disable_wake_word":
             wake_word = None
             if state is not None:
                 state["wake_word"] = None
             return "[settings] Wake word disabled"
 
-        # set input device to N
-        m = re.match(r"^set (?:the )?input\s*device (?:to|=)\s*(\d{1,4})$", t)
-        if m:
+        if m.intent == "set_device":
             try:
-                idx = int(m.group(1))
+                idx = int(m.slots["index"])
                 # Probe device name to validate
                 _ = sd.query_devices(idx)
                 device = idx
@@ -479,133 +760,262 @@ def run_voice_loop(
             except Exception:
                 return "[settings] Invalid input device index"
 
-        # enable/disable webrtc vad
-        if t in ("enable vad", "enable webrtc vad", "use webrtc vad"):
+        if m.intent == "enable_vad":
             if state is not None:
                 state["use_webrtcvad"] = True
             return "[settings] WebRTC VAD enabled"
-        if t in ("disable vad", "disable webrtc vad", "use amplitude vad"):
+        if m.intent == "disable_vad":
             if state is not None:
                 state["use_webrtcvad"] = False
             return "[settings] WebRTC VAD disabled"
 
-        # set verbosity
-        m = re.match(r"^set (?:the )?verbosity (?:to|=)\s*(quiet|normal|verbose)$", t)
-        if m:
+        if m.intent == "set_verbosity":
+            if state is not None:
+                state["verbosity"] = m.slots["level"]
+            return f"[settings] Verbosity set to {m.slots['level']}"
+
+        return None
+
+    def _capture_turn() -> Optional[dict]:
+        """Capture stage: record one utterance; returns the turn for STT, or None to skip it."""
+        vb = (state or {}).get('verbosity', verbosity) if isinstance(state, dict) else verbosity
+        turn: dict = {"vb": str(vb)}
+        if mode == "ptt":
+            print("\n[PTT] Press Enter to speak (press Enter again to stop)...")
+            input()  # Wait for first Enter
+
+            # Record audio
+            print("[PTT] Recording... Press Enter to stop.")
+            on_frame, turn["finish"] = _stream_turn(str(vb)) if stt_mode == "stream" else (None, None)
+            _cue_start()
+            buffer_stats: dict = {}
+            audio_data = record_ptt(device=device, on_frame=on_frame, capture=_ensure_capture(),
+                                    preroll_ms=preroll_ms, buffer_stats=buffer_stats, native_rate=native_rate)
+            _cue_end()
+            _note_buffer(buffer_stats)
+            if audio_data.size == 0:
+                print("[PTT] No audio captured. Try again.")
+                return None
+        elif mode == "auto":
+            uv = (state or {}).get('use_webrtcvad', use_webrtcvad) if isinstance(state, dict) else use_webrtcvad
+            gate = _wake_gate(turn)
+            on_frame, turn["finish"] = _stream_turn(str(vb), gate) if stt_mode == "stream" else (None, None)
+            energies: list = []
+            buffer_stats = {}
+            detector = _detector(bool(uv))
+            audio_data = listen_once_auto_v2(device=device, threshold=threshold, use_webrtcvad=bool(uv), verbosity=str(vb),
+                                             on_frame=on_frame, capture=_ensure_capture(), preroll_ms=preroll_ms,
+                                             energies=energies, endpointer=endpointer, vad=detector,
+                                             buffer_stats=buffer_stats, native_rate=native_rate)
+            _note_buffer(buffer_stats)
             if state is not None:
-                state["verbosity"] = m.group(1)
-            return f"[settings] Verbosity set to {m.group(1)}"
+                with contextlib.suppress(Exception):
+                    state.setdefault('perf', {})['vad'] = detector.stats()
+                    if endpointer is not None:
+                        state['perf']['endpoint'] = endpointer.stats()
+            if audio_data.size == 0:
+                print("[listen] No audio captured.")
+                return None
+            if gate is not None and not gate(audio_data):
+                if str(vb) != "quiet":
+                    print(f"[wake] Ignored locally (no '{wake_word}' heard, score {turn['score']:.2f})")
+                return None
+            turn["energies"] = energies
+        else:
+            return None
+        turn["audio"] = audio_data
+        return turn
+
+    def _publish_offline() -> None:
+        if state is not None and offline is not None:
+            with contextlib.suppress(Exception):
+                state.setdefault('perf', {})['stt_queue'] = offline.stats()
+
+    def _enqueue(turn: dict, payload, audio_s: float, err: Exception) -> str:
+        offline.put(payload, audio_s, SR)
+        turn["queued"] = True
+        _publish_offline()
+        log.info(f"STT unreachable ({err}); utterance queued")
+        print(f"[stt] Offline: command saved and will be sent when the connection returns "
+              f"({len(offline)} waiting).")
+        return ""
 
+    def _replay() -> tuple[list, bool]:
+        """Transcribe queued utterances in order; returns (commands, queue drained)."""
+        if offline is None or not len(offline):
+            return [], True
+
+        def _stt(item: QueuedUtterance) -> str:
+            return get_client().transcribe_bytes(item.read(), audio_s=item.audio_s, deadline_s=stt_deadline_s)
+
+        dropped = offline.expire()
+        if dropped:
+            print(f"[stt] Dropped {dropped} saved command(s) older than {offline.max_age_s // 60:.0f} min.")
+        results, drained = offline.replay(_stt)
+        _publish_offline()
+        if results:
+            print(f"[stt] Connection is back: running {len(results)} saved command(s) in order.")
+        cmds = []
+        for item, text in results:
+            print(f"[stt] Saved ({int(time.time() - item.created)} s ago): {text}")
+            cmd = _route(text)
+            if cmd is not None:
+                cmds.append(cmd)
+        return cmds, drained
+
+    def _transcribe_turn(turn: dict) -> Optional[dict]:
+        """STT stage: transcript, settings commands and wake-word check; returns the turn for generation.
+
+        Commands queued while offline are replayed first (turn["replayed"]),
+        so they run before this one; a turn without audio only replays.
+        """
+        replayed, drained = _replay()
+        turn["replayed"] = replayed
+        if "audio" not in turn:
+            return turn if replayed else None
+        audio_data, finish = turn["audio"], turn.get("finish")
+        _t0 = time.time()
+        if mode == "ptt":
+            def _batch() -> str:
+                payload, audio_s = _prepare(audio_data)
+                if local_stt is not None:
+                    return stt_transcribe(payload, backend=local_stt)
+                if offline is not None and not drained:     # keep capture order behind the queue
+                    return _enqueue(turn, payload, audio_s, ConnectionError("earlier commands still queued"))
+                try:
+                    return _transcribe_or_empty(lambda: stt_transcribe(payload, audio_s=audio_s, backend=stt_backend,
+                                                                       deadline_s=stt_deadline_s),
+                                                raise_unreachable=offline is not None)
+                except requests.exceptions.RequestException as e:
+                    return _enqueue(turn, payload, audio_s, e)
+        else:
+            def _batch() -> str:
+                payload, audio_s = _prepare(audio_data, turn.get("energies") or None)
+                if offline is not None and not drained:
+                    return _enqueue(turn, payload, audio_s, ConnectionError("earlier commands still queued"))
+                try:
+                    return stt_transcribe(payload, audio_s=audio_s, backend=stt_backend, deadline_s=stt_deadline_s)
+                except requests.exceptions.RequestException as e:
+                    if offline is None or not is_unreachable(e):
+                        raise
+                    return _enqueue(turn, payload, audio_s, e)
+        user_text = finish(_batch) if finish is not None else _batch()
+        _t1 = time.time()
+        perf = _perf(state, 'stt', {'count':0,'total_ms':0,'last_ms':0})
+        perf['count'] += 1
+        perf['last_ms'] = int((_t1 - _t0)*1000)
+        perf['total_ms'] += perf['last_ms']
+        perf['phases'] = dict(stt_backend.last_timings)
+        if state is not None and local_stt is None and get_client().hedging is not None:
+            state['perf']['stt_hedge'] = get_client().hedging.stats()
+        if not user_text:
+            if not turn.get("queued"):
+                print("[PTT] No speech detected or STT failed. Try again." if mode == "ptt" else "[stt] Empty transcription.")
+            return turn if replayed else None
+        if mode == "ptt":
+            print(f"[PTT] You said: {user_text}")
+        cmd = _route(user_text)
+        if cmd is None:
+            return turn if replayed else None
+        if mode != "ptt":
+            print(f"[stt] You said: {cmd}")
+        if _barge_in(cmd):
+            return turn if replayed else None
+        turn["text"] = cmd
+        return turn
+
+    def _barge_in(cmd: str) -> bool:
+        """Interrupt the reply being generated for a new wake-word command; True if cmd was only 'stop'."""
+        said = ROUTER.match(cmd, group="builtin")
+        stop = said is not None and said.intent == "stop"   # nothing but "stop": end the reply, no new turn
+        if not barge.check(wake_word, stop):
+            return False
+        _perf(state, 'gen', {'count':0,'total_ms':0,'last_ms':0})['barge_in'] = barge.count
+        if stop:
+            ROUTER.record(said)
+            print("[stop] Stopped the current reply.")
+        return stop
+
+    def _route(user_text: str) -> Optional[str]:
+        """Apply settings commands and the wake word; returns the command to run, or None."""
+        # allow settings changes pre-wake-word (so "set threshold ..." works with disabled wake word);
+        # near misses only count after the wake word, so background talk can't change settings
+        msg = _handle_settings(user_text, fuzzy=not wake_word)
+        if msg:
+            print(msg)
+            return None
+        cmd = _extract_after_wake(user_text, wake_word)
+        if cmd is None:
+            print(f"[wake] Ignored: {user_text!r}")
+            return None
+        msg = _handle_settings(cmd) if cmd != user_text else None
+        if msg:
+            print(msg)
+            return None
+        return cmd
+
+    def _respond(turn: dict) -> None:
+        """Generation stage: run queued commands replayed with this turn, then its own."""
+        for cmd in turn.get("replayed") or ():
+            _run(cmd)
+        if turn.get("text"):
+            _run(turn["text"])
         return None
 
+    def _run(text: str) -> None:
+        _g0 = time.time()
+        first: list = []
+
+        def _chunk(chunk: str) -> None:
+            # each sentence on its own line, so the screen reader starts speaking right away
+            print(chunk if first else f"[agent] {chunk}", flush=True)
+            if not first:
+                first.append(time.time())
+
+        with barge.generation():
+            response = generate_text(text, on_chunk=_chunk) if stream_reply else generate_text(text)
+        _g1 = time.time()
+        perf = _perf(state, 'gen', {'count':0,'total_ms':0,'last_ms':0})
+        perf['count'] += 1
+        perf['last_ms'] = int((_g1 - _g0)*1000)
+        perf['total_ms'] += perf['last_ms']
+        if first:
+            perf['last_ttft_ms'] = int((first[0] - _g0)*1000)
+            perf['ttft_count'] = perf.get('ttft_count', 0) + 1
+            perf['total_ttft_ms'] = perf.get('total_ttft_ms', 0) + perf['last_ttft_ms']
+        if not first:
+            print(f"[agent] {response}")
+
+    barge = BargeIn(cancel_generation)
+
+    def _publish(stats: dict) -> None:
+        if state is not None:
+            state.setdefault('perf', {})['pipeline'] = stats
+
+    # Capture runs on this thread (it owns input() and Ctrl+C); STT and generation get
+    # their own threads, so the next command can be spoken while one is still running.
+    pipeline = TurnPipeline([("stt", _transcribe_turn), ("gen", _respond)],
+                            inline=not pipelined, on_update=_publish).start()
+
+    # While the user is silent, retry the offline queue now and then instead of
+    # waiting for the next utterance (threaded pipeline only: submit() may block).
+    stop_replay = threading.Event()
+
+    def _replay_idle() -> None:
+        while not stop_replay.wait(REPLAY_INTERVAL_S):
+            if len(offline) and pipeline.stats()["stages"]["stt"]["depth"] == 0:
+                pipeline.submit({}, reraise=False)     # stage errors go to the capture loop
+
+    _publish_offline()
+    if offline is not None and pipelined:
+        threading.Thread(target=_replay_idle, name="stt-replay", daemon=True).start()
     try:
         consecutive_errors = 0
         while True:
-            response = ""
             try:
-                if mode == "ptt":
-                    print("\n[PTT] Press Enter to speak (press Enter again to stop)...")
-                    input()  # Wait for first Enter
-
-                    # Record audio
-                    print("[PTT] Recording... Press Enter to stop.")
-                    _cue_start()
-                    audio_data = record_ptt(device=device)
-                    _cue_end()
-                    if audio_data.size == 0:
-                        print("[PTT] No audio captured. Try again.")
-                        continue
-
-                    # Convert to WAV and transcribe
-                    wav_bytes = _wav_bytes_from_pcm16(audio_data)
-                    _t0 = time.time()
-                    user_text = assemblyai_transcribe_wav(wav_bytes)
-                    _t1 = time.time()
-                    try:
-                        perf = (state or {}).setdefault('perf', {}).setdefault('stt', {'count':0,'total_ms':0,'last_ms':0})
-                        perf['count'] += 1
-                        perf['last_ms'] = int((_t1 - _t0)*1000)
-                        perf['total_ms'] += perf['last_ms']
-                    except Exception:
-                        pass
-                    if not user_text:
-                        print("[PTT] No speech detected or STT failed. Try again.")
-                        continue
-
-                    print(f"[PTT] You said: {user_text}")
-                    msg = _handle_settings(user_text)
-                    if msg:
-                        print(msg)
-                        continue
-                    cmd = _extract_after_wake(user_text, wake_word)
-                    if cmd is None:
-                        print(f"[wake] Ignored: {user_text!r}")
-                        continue
-                    user_text = cmd
-
-                    # Process the command
-                    _g0 = time.time()
-                    response = generate_text(user_text)
-                    _g1 = time.time()
-                    try:
-                        perf = (state or {}).setdefault('perf', {}).setdefault('gen', {'count':0,'total_ms':0,'last_ms':0})
-                        perf['count'] += 1
-                        perf['last_ms'] = int((_g1 - _g0)*1000)
-                        perf['total_ms'] += perf['last_ms']
-                    except Exception:
-                        pass
-                    print(f"[agent] {response}")
-
-                    # Only use TTS if not in NoTTS mode (disabled in this project)
-                    if not no_tts and response:
-                        pass
-
-                elif mode == "auto":
-                    uv = (state or {}).get('use_webrtcvad', use_webrtcvad) if isinstance(state, dict) else use_webrtcvad
-                    vb = (state or {}).get('verbosity', verbosity) if isinstance(state, dict) else verbosity
-                    audio_data = listen_once_auto_v2(device=device, threshold=threshold, use_webrtcvad=bool(uv), verbosity=str(vb))
-                    if audio_data.size == 0:
-                        print("[listen] No audio captured.")
-                        continue
-                    _t0 = time.time()
-                    user_text = stt_transcribe(audio_data)
-                    _t1 = time.time()
-                    try:
-                        perf = (state or {}).setdefault('perf', {}).setdefault('stt', {'count':0,'total_ms':0,'last_ms':0})
-                        perf['count'] += 1
-                        perf['last_ms'] = int((_t1 - _t0)*1000)
-                        perf['total_ms'] += perf['last_ms']
-                    except Exception:
-                        pass
-                    if not user_text:
-                        print("[stt] Empty transcription.")
-                        continue
-                    # allow settings changes pre-wake-word (so "set threshold ..." works with disabled wake word)
-                    msg = _handle_settings(user_text)
-                    if msg:
-                        print(msg)
-                        continue
-
-                    cmd = _extract_after_wake(user_text, wake_word)
-                    if cmd is None:
-                        print(f"[wake] Ignored: {user_text!r}")
-                        continue
-                    user_text = cmd
-                    print(f"[stt] You said: {user_text}")
-                    _g0 = time.time()
-                    response = generate_text(user_text)
-                    _g1 = time.time()
-                    try:
-                        perf = (state or {}).setdefault('perf', {}).setdefault('gen', {'count':0,'total_ms':0,'last_ms':0})
-                        perf['count'] += 1
-                        perf['last_ms'] = int((_g1 - _g0)*1000)
-                        perf['total_ms'] += perf['last_ms']
-                    except Exception:
-                        pass
-                    print(f"[agent] {response}")
-                    if not no_tts and response:
-                        pass
-
+                turn = _capture_turn()
+                if turn is not None:
+                    pipeline.submit(turn)
                 consecutive_errors = 0
 
             except KeyboardInterrupt:
@@ -622,4 +1032,8 @@ def run_voice_loop(
     except Exception as e:
         log.error(f"Fatal error in voice loop: {e}", exc_info=True)
     finally:
+        stop_replay.set()
+        pipeline.stop(timeout=1.0)
+        if capture is not None:
+            capture.stop()
         log.info("Voice loop stopped")
@@ -0,0 +1,194 @@
+# agent/speech/wake_spotter.py
+# On-device wake-word spotter: MFCC templates recorded by the user
+# (--enroll-wake) matched against the first second of each utterance with
+# subsequence DTW, so speech without the wake word is never uploaded.
+# Dependencies: numpy
+
+from __future__ import annotations
+from typing import Optional, Sequence
+import numpy as np
+
+from agent.speech.audio_prep import frame_energies
+
+SR = 16000
+N_FFT = 512
+WIN_LEN = 400               # 25 ms analysis window
+HOP_LEN = 160               # 10 ms hop
+N_MELS = 26
+N_CEPS = 13                 # c0 (loudness) is dropped, c1..c12 are kept
+WAKE_WINDOW_MS = 1000       # audio after onset the spotter looks at
+ENROLL_CLIPS = 5
+MIN_ENROLL_CLIPS = 3
+WAKE_MARGIN = 1.6           # threshold = worst leave-one-out score * margin (leans to accepting)
+OFF_DIAGONAL_WEIGHT = 1.25  # DTW cost multiplier for stretch/compress steps
+ONSET_RATIO = 0.15          # onset = first 10 ms frame above this share of the peak energy
+
+
+def _mel_filters(sr: int = SR, n_fft: int = N_FFT, n_mels: int = N_MELS,
+                 fmin: float = 60.0, fmax: float = 7600.0) -> np.ndarray:
+    def hz_to_mel(f):
+        return 2595.0 * np.log10(1.0 + f / 700.0)
+
+    def mel_to_hz(m):
+        return 700.0 * (10 ** (m / 2595.0) - 1.0)
+
+    edges = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2))
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    lo, mid, hi = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    up = (bins - lo) / (mid - lo)
+    down = (hi - bins) / (hi - mid)
+    return np.maximum(0.0, np.minimum(up, down)).astype(np.float32)
+
+
+def _dct_matrix(n_ceps: int = N_CEPS, n_mels: int = N_MELS) -> np.ndarray:
+    k = np.arange(n_ceps)[:, None]
+    n = np.arange(n_mels)[None, :]
+    m = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+_MEL = _mel_filters()
+_DCT = _dct_matrix()
+_WINDOW = np.hamming(WIN_LEN).astype(np.float32)
+
+
+def mfcc(pcm: np.ndarray) -> np.ndarray:
+    """c1..c12 per 10 ms frame of 16 kHz int16 audio, shape (frames, 12)."""
+    x = pcm.reshape(-1).astype(np.float32) / 32768.0
+    if len(x) < WIN_LEN:
+        x = np.pad(x, (0, WIN_LEN - len(x)))
+    x = np.append(x[0], x[1:] - 0.97 * x[:-1])
+    frames = np.lib.stride_tricks.sliding_window_view(x, WIN_LEN)[::HOP_LEN] * _WINDOW
+    power = np.abs(np.fft.rfft(frames, N_FFT)) ** 2
+    logmel = np.log(power @ _MEL.T + 1e-8)
+    return (logmel @ _DCT.T)[:, 1:]
+
+
+def _voiced_span(pcm: np.ndarray) -> tuple[int, int]:
+    """Sample range from the first to the last 10 ms frame near the peak energy."""
+    e = frame_energies(pcm.reshape(-1), HOP_LEN)
+    if e.size == 0 or e.max() <= 0:
+        return 0, len(pcm)
+    loud = np.flatnonzero(e >= e.max() * ONSET_RATIO)
+    return int(loud[0]) * HOP_LEN, min(len(pcm), (int(loud[-1]) + 1) * HOP_LEN)
+
+
+def subsequence_dtw(template: np.ndarray, query: np.ndarray) -> float:
+    """Mean per-frame cost of the best alignment of template to any stretch of query.
+
+    The path may start and end anywhere in query and advances 0, 1 or 2
+    query frames per template frame (so speaking rate can vary 2x either way).
+    """
+    if len(query) == 0 or len(template) == 0:
+        return float("inf")
+    cost = np.sqrt(((template[:, None, :] - query[None, :, :]) ** 2).sum(axis=2))
+    inf = np.float32(np.inf)
+    d = cost[0].copy()
+    for i in range(1, len(template)):
+        c = cost[i]
+        diag = np.concatenate(([inf], d[:-1]))
+        skip = np.concatenate(([inf, inf], d[:-2]))[:len(d)]
+        d = np.minimum(diag + c, np.minimum(d, skip) + OFF_DIAGONAL_WEIGHT * c)
+    return float(d.min() / len(template))
+
+
+class WakeSpotter:
+    """Keyword spotter for one wake word, built from a few enrolled recordings."""
+
+    def __init__(self, word: str, templates: Sequence[np.ndarray], threshold: float,
+                 window_ms: int = WAKE_WINDOW_MS):
+        if not templates:
+            raise ValueError("wake spotter needs at least one template")
+        self.word = word.strip().lower()
+        self.templates = [np.asarray(t, dtype=np.float32) for t in templates]
+        self.threshold = float(threshold)
+        self.window_ms = int(window_ms)
+
+    @classmethod
+    def enroll(cls, word: str, clips: Sequence[np.ndarray], margin: float = WAKE_MARGIN,
+               window_ms: int = WAKE_WINDOW_MS) -> "WakeSpotter":
+        """Build templates from 16 kHz int16 clips of the wake word spoken alone.
+
+        The threshold is calibrated by scoring each clip against the others.
+        """
+        if len(clips) < MIN_ENROLL_CLIPS:
+            raise ValueError(f"need at least {MIN_ENROLL_CLIPS} enrollment clips, got {len(clips)}")
+        templates = []
+        for clip in clips:
+            a, b = _voiced_span(clip)
+            templates.append(mfcc(clip[a:b]))
+        spotter = cls(word, templates, threshold=np.inf, window_ms=window_ms)
+        loo = []
+        for k, clip in enumerate(clips):
+            others = cls(word, templates[:k] + templates[k + 1:], threshold=np.inf, window_ms=window_ms)
+            loo.append(others.score(clip))
+        spotter.threshold = float(max(loo) * margin)
+        return spotter
+
+    def score(self, pcm: np.ndarray, sr: int = SR) -> float:
+        """Best template distance over the first window_ms after speech onset (lower is closer)."""
+        if sr != SR:
+            raise ValueError("wake spotter expects 16 kHz audio")
+        pcm = pcm.reshape(-1)
+        head = pcm[:int(SR * (self.window_ms + 500) / 1000)]
+        start, _ = _voiced_span(head)
+        start = max(0, start - HOP_LEN * 5)
+        feats = mfcc(pcm[start:start + int(SR * self.window_ms / 1000)])
+        return min(subsequence_dtw(t, feats) for t in self.templates)
+
+    def check(self, pcm: np.ndarray, sr: int = SR) -> tuple[bool, float]:
+        """Return (accepted, score)."""
+        s = self.score(pcm, sr)
+        return s <= self.threshold, s
+
+    def save(self, path: str) -> None:
+        arrays = {f"t{i}": t for i, t in enumerate(self.templates)}
+        np.savez(path, word=np.array(self.word), threshold=np.array(self.threshold),
+                 window_ms=np.array(self.window_ms), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "WakeSpotter":
+        with np.load(path) as z:
+            n = sum(1 for k in z.files if k.startswith("t") and k[1:].isdigit())
+            return cls(str(z["word"]), [z[f"t{i}"] for i in range(n)], float(z["threshold"]),
+                       int(z["window_ms"]))
+
+
+def evaluate(spotter: WakeSpotter, positives: Sequence[np.ndarray], negatives: Sequence[np.ndarray],
+             thresholds: Optional[Sequence[float]] = None) -> dict:
+    """False-accept / false-reject rates on labelled 16 kHz clips.
+
+    Returns far/frr at the spotter's threshold, the equal-error point and a
+    sweep of (threshold, far, frr) rows.
+    """
+    pos = np.array([spotter.score(c) for c in positives], dtype=np.float64)
+    neg = np.array([spotter.score(c) for c in negatives], dtype=np.float64)
+
+    def rates(thr: float) -> tuple[float, float]:
+        far = float((neg <= thr).mean()) if neg.size else 0.0
+        frr = float((pos > thr).mean()) if pos.size else 0.0
+        return far, frr
+
+    if thresholds is None:
+        finite = np.concatenate([pos, neg])
+        finite = finite[np.isfinite(finite)]
+        thresholds = np.unique(finite) if finite.size else [spotter.threshold]
+    sweep = [(float(t), *rates(float(t))) for t in thresholds]
+    i = min(range(len(sweep)), key=lambda k: (abs(sweep[k][1] - sweep[k][2]), sweep[k][1] + sweep[k][2]))
+    eer_threshold = sweep[i][0]
+    if i + 1 < len(sweep):  # same rates anywhere up to the next score; take the middle of the gap
+        eer_threshold = (eer_threshold + sweep[i + 1][0]) / 2
+    far, frr = rates(spotter.threshold)
+    return {
+        "threshold": spotter.threshold,
+        "far": far,
+        "frr": frr,
+        "eer": (sweep[i][1] + sweep[i][2]) / 2,
+        "eer_threshold": eer_threshold,
+        "positives": int(pos.size),
+        "negatives": int(neg.size),
+        "pos_scores": pos.tolist(),
+        "neg_scores": neg.tolist(),
+        "sweep": sweep,
+    }
@@ -0,0 +1,76 @@
+"""Per-turn decision-engine overhead: a process per prompt vs a warm worker.
+
+    python scripts/bench_engine.py [--turns 20] [--backend echo|ollama] [--goose]
+
+'spawn' starts `python -m agent.engine_worker --once PROMPT` for every turn,
+the same shape as the old `goose run PROMPT` (interpreter start, backend
+init, one request, exit); with the echo backend it measures the process
+cost alone, which is a lower bound for goose. 'worker' sends the same
+prompts to one warm agent/engine_worker.py over its pipe. --goose also
+times real `goose run` calls when Goose is on PATH. With --backend ollama
+both paths include the model's generation time, and the difference is the
+per-turn setup that the worker removes.
+"""
+from pathlib import Path
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from agent.decision_engine import EngineWorker
+
+
+def timed(fn, turns):
+    out = []
+    for i in range(turns):
+        t0 = time.perf_counter()
+        fn(f"USER: bench turn {i}\nASSISTANT:")
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def report(name, ms):
+    ms = sorted(ms)
+    p95 = ms[min(len(ms) - 1, int(0.95 * len(ms)))]
+    print(f"{name:<28}{statistics.mean(ms):>10.2f}{statistics.median(ms):>10.2f}{p95:>10.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Decision engine per-turn overhead benchmark")
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--backend", choices=["echo", "ollama"], default="echo")
+    ap.add_argument("--goose", action="store_true", help="also time `goose run` (needs Goose on PATH)")
+    args = ap.parse_args()
+
+    def spawn(prompt):
+        subprocess.run([sys.executable, "-m", "agent.engine_worker", "--backend", args.backend, "--once", prompt],
+                       check=True, capture_output=True, text=True, cwd=ROOT)
+
+    print(f"{args.turns} turns, backend={args.backend}")
+    print(f"{'path':<28}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    report("spawn per turn", timed(spawn, args.turns))
+    w = EngineWorker(args.backend)
+    t0 = time.perf_counter()
+    w.start()
+    start_ms = (time.perf_counter() - t0) * 1000
+    try:
+        report("warm worker", timed(lambda p: w.ask(p, timeout=600), args.turns))
+    finally:
+        w.kill()
+    print(f"{'(worker start, once)':<28}{start_ms:>10.1f}")
+    if args.goose:
+        if shutil.which("goose") is None:
+            print("goose not on PATH; skipped")
+        else:
+            report("goose run per turn",
+                   timed(lambda p: subprocess.run(["goose", "run", p], capture_output=True, text=True), args.turns))
+
+
+if __name__ == "__main__":
+    main()
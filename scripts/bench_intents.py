@@ -0,0 +1,110 @@
+"""How many model calls the intent router saves, and how fast it decides.
+
+    python scripts/bench_intents.py [--corpus scripts/intent_corpus.txt] [--log logs/agent.log]
+
+The corpus lists transcripts with the intent each should get ('-' for the
+model). For every line the script compares the router with the old exact
+checks (the `if t_norm in (...)` chain in agent_main and the settings
+regexes in voice_loop) and prints the misroutes. --log runs the router over
+the "YOU:" lines of your own agent.log instead (no expected intents there,
+so it only reports how many commands it would answer without the model).
+"""
+from pathlib import Path
+import argparse
+import re
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from agent.intents import ROUTER
+
+# The matching rules before the router, as they were in agent_main.generate_text / voice_loop._handle_settings
+LEGACY_EXACT = {
+    "repeat": ("agent repeat", "agent repeat last", "repeat last", "repeat"),
+    "status": ("agent status", "status"),
+    "help": ("agent help", "help"),
+    "save_settings": ("agent save settings", "save settings"),
+    "reload_macros": ("agent reload macros", "reload macros"),
+    "audio_device": ("agent audio device", "audio device"),
+    "disable_wake_word": ("disable wake word", "turn off wake word", "wake word off"),
+    "enable_vad": ("enable vad", "enable webrtc vad", "use webrtc vad"),
+    "disable_vad": ("disable vad", "disable webrtc vad", "use amplitude vad"),
+}
+LEGACY_RE = {
+    "history": r"^(?:agent\s+)?history(?:\s+last\s+(\d+))?$",
+    "set_threshold": r"^set (?:the )?threshold (?:to|=)\s*(\d{2,5})$",
+    "set_wake_word": r"^set (?:the )?wake\s*word (?:to|=)\s*(.+)$",
+    "set_device": r"^set (?:the )?input\s*device (?:to|=)\s*(\d{1,4})$",
+    "set_verbosity": r"^set (?:the )?verbosity (?:to|=)\s*(quiet|normal|verbose)$",
+}
+
+
+def legacy(text):
+    raw = (text or "").strip().lower()
+    settings = re.sub(r"\s+", " ", re.sub(r"[^\w\s']", " ", raw)).strip()   # voice_loop._normalize
+    for name, phrases in LEGACY_EXACT.items():
+        if raw in phrases or settings in phrases and name in ("disable_wake_word", "enable_vad", "disable_vad"):
+            return name
+    for name, pat in LEGACY_RE.items():
+        if re.match(pat, raw if name == "history" else settings):
+            return name
+    return "-"
+
+
+def routed(text):
+    m = ROUTER.match(text)
+    return m.intent if m is not None else "-"
+
+
+def load_corpus(path):
+    rows = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip() and not line.startswith("#"):
+            expected, text = line.split("\t", 1)
+            rows.append((expected, text))
+    return rows
+
+
+def load_log(path):
+    pat = re.compile(r"^\[[^\]]+\] YOU: (.*)$")
+    return [("?", m.group(1)) for m in map(pat.match, Path(path).read_text(encoding="utf-8").splitlines()) if m]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", default=str(ROOT / "scripts" / "intent_corpus.txt"))
+    ap.add_argument("--log", help="Use the YOU: lines of an agent.log instead of the corpus")
+    args = ap.parse_args()
+    rows = load_log(args.log) if args.log else load_corpus(args.corpus)
+    if not rows:
+        print("No transcripts found.")
+        return
+
+    t0 = time.perf_counter()
+    reps = 200
+    for _ in range(reps):
+        for _, text in rows:
+            ROUTER.match(text)
+    us = (time.perf_counter() - t0) / (reps * len(rows)) * 1e6
+
+    old = [legacy(t) for _, t in rows]
+    new = [routed(t) for _, t in rows]
+    print(f"{len(rows)} transcripts, router {us:.1f} us per command")
+    print(f"  answered without the model: old rules {sum(o != '-' for o in old)}, router {sum(n != '-' for n in new)}")
+    if args.log:
+        return
+    builtin = sum(e != "-" for e, _ in rows)
+    print(f"  built-in commands in the corpus: {builtin}")
+    print(f"  model calls avoided: old rules {sum(o == e != '-' for (e, _), o in zip(rows, old))}, "
+          f"router {sum(n == e != '-' for (e, _), n in zip(rows, new))}")
+    wrong = [(e, t, n) for (e, t), n in zip(rows, new) if n != e]
+    print(f"  misroutes: {len(wrong)}")
+    for e, t, n in wrong:
+        print(f"    {t!r}: expected {e}, got {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare STT backends by real-time factor (RTF = processing time / audio length).
+
+    python scripts/bench_stt.py [--wav test.wav] [--runs 3] [--threads 4] [--backends local,assemblyai]
+
+RTF < 1 means faster than real time. The local backend is measured warm
+(model load reported separately); the remote path needs ASSEMBLYAI_API_KEY.
+"""
+from pathlib import Path
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from agent.speech.audio_prep import read_wav, to_pcm16
+from agent.speech.stt_backends import get_backend
+
+
+def main():
+    ap = argparse.ArgumentParser(description="STT real-time factor benchmark")
+    ap.add_argument("--wav", default=str(ROOT / "test.wav"))
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=None)
+    ap.add_argument("--backends", default="local,assemblyai")
+    args = ap.parse_args()
+
+    pcm = to_pcm16(*read_wav(args.wav))
+    dur = len(pcm) / 16000
+    print(f"audio: {args.wav} ({dur:.2f}s @16 kHz)")
+    print(f"{'backend':<12}{'median s':>10}{'RTF':>8}  notes")
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        if name == "assemblyai" and not os.getenv("ASSEMBLYAI_API_KEY"):
+            print(f"{name:<12}{'-':>10}{'-':>8}  skipped: ASSEMBLYAI_API_KEY not set")
+            continue
+        try:
+            be = get_backend(name, args.threads)
+            t0 = time.time()
+            be.warm()
+            warm_s = time.time() - t0
+            times, text = [], ""
+            for _ in range(args.runs):
+                t0 = time.time()
+                text = be.transcribe(pcm, 16000)
+                times.append(time.time() - t0)
+        except Exception as e:
+            print(f"{name:<12}{'-':>10}{'-':>8}  skipped: {e}")
+            continue
+        med = statistics.median(times)
+        print(f"{name:<12}{med:>10.3f}{med / dur:>8.3f}  warm-up {warm_s:.2f}s, text={text!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Peak memory and allocations per utterance: list of block copies vs UtteranceBuffer.
+
+    python scripts/bench_utterance.py [--seconds 8] [--ptt-seconds 300]
+
+The old capture paths appended a copy of every 30 ms block to a list and
+finished with np.concatenate(...).astype(np.int16), which copies everything
+twice more. UtteranceBuffer writes each block once into a preallocated
+array (and, for long push-to-talk recordings, spills to disk beyond
+PTT_MEMORY_S). Memory is measured with tracemalloc, which sees NumPy's
+data buffers; 'arrays' is the number of live NumPy allocations once
+capture has finished, before the result is assembled.
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from agent.speech.utterance import PTT_MAX_S, PTT_MEMORY_S, UtteranceBuffer
+
+SR = 16000
+BLOCK = 480
+
+
+def old_path(blocks):
+    frames = []
+    for b in blocks:
+        frames.append(b.copy())
+    return frames, lambda: np.concatenate(frames).astype(np.int16)
+
+
+def new_path(blocks, max_s, spill_s=None):
+    buf = UtteranceBuffer(int(SR * max_s), spill_samples=None if spill_s is None else int(SR * spill_s))
+    for b in blocks:
+        buf.append(b)
+    return buf, buf.view
+
+
+def measure(name, fn, seconds):
+    # one 30 ms block at a time, as delivered by the audio callback (reused, like sounddevice's indata)
+    block = np.zeros(BLOCK, dtype=np.int16)
+    blocks = (block for _ in range(int(seconds * SR / BLOCK)))
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    holder, finish = fn(blocks)
+    live = sum(1 for t in tracemalloc.take_snapshot().traces if t.domain == np.lib.tracemalloc_domain)
+    audio = finish()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<34}{seconds:>8.0f}s{live:>9,}{peak / 1e6:>12.2f} MB{len(audio) * 2 / 1e6:>11.2f} MB{elapsed * 1e3:>9.1f} ms")
+    if isinstance(holder, UtteranceBuffer):
+        holder.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Capture buffer memory benchmark")
+    ap.add_argument("--seconds", type=float, default=8.0, help="auto-mode utterance length")
+    ap.add_argument("--ptt-seconds", type=float, default=300.0, help="long push-to-talk recording")
+    args = ap.parse_args()
+
+    print(f"{'path':<34}{'audio':>9}{'arrays':>9}{'peak':>15}{'result':>14}{'time':>12}")
+    measure("auto: list + concatenate", old_path, args.seconds)
+    measure("auto: UtteranceBuffer", lambda b: new_path(b, args.seconds), args.seconds)
+    measure("ptt: list + concatenate", old_path, args.ptt_seconds)
+    measure(f"ptt: UtteranceBuffer (spill >{PTT_MEMORY_S}s)",
+            lambda b: new_path(b, PTT_MAX_S, PTT_MEMORY_S), args.ptt_seconds)
+
+
+if __name__ == "__main__":
+    main()
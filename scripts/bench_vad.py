@@ -0,0 +1,175 @@
+"""VAD benchmarks: throughput of the amplitude path, and amplitude vs webrtcvad vs hybrid.
+
+    python scripts/bench_vad.py [--wav test.wav] [--seconds 120] [--speech clean.wav]
+
+Throughput: the old loop computed RMS per 30 ms block via an int32 copy.
+EnergyVAD is measured live (one block per call) and on a backlog (32 blocks
+per call, as after a long turn with persistent capture).
+
+Detectors: per-frame decisions of the adaptive amplitude VAD, webrtcvad on
+every frame (the previous --use-webrtcvad path) and HybridVAD, on speech
+mixed with quiet, noisy and loud-fan noise. Reference labels come from the
+clean speech: --speech takes a clean mono recording, otherwise a synthetic
+vowel track is used. CPU % is CPU time relative to the audio duration.
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from agent.speech.audio_prep import read_wav, to_pcm16
+from agent.speech.vad import WEBRTC_AVAILABLE, EnergyVAD, HybridVAD
+
+if WEBRTC_AVAILABLE:
+    import webrtcvad
+
+SR = 16000
+BLOCK = 480
+
+
+def legacy(pcm: np.ndarray, threshold: float = 900) -> int:
+    """The previous _record_utterance energy path, decision logic included."""
+    above = 0
+    for i in range(len(pcm) // BLOCK):
+        x = pcm[i * BLOCK:(i + 1) * BLOCK].astype(np.int32)
+        energy = float(np.sqrt(np.mean((x * x))))
+        above = above + 1 if energy >= threshold else 0
+    return above
+
+
+def batched(pcm: np.ndarray, blocks_per_call: int) -> int:
+    vad = EnergyVAD(BLOCK, 900)
+    above = 0
+    step = blocks_per_call * BLOCK
+    for off in range(0, len(pcm) - step + 1, step):
+        levels = vad.energies(pcm[off:off + step])
+        start = vad.start_threshold
+        for e in levels:
+            above = above + 1 if e >= start else 0
+    return above
+
+
+def run(name: str, fn, pcm: np.ndarray, runs: int = 3) -> None:
+    best_wall, best_cpu = float("inf"), float("inf")
+    for _ in range(runs):
+        w0, c0 = time.perf_counter(), time.process_time()
+        fn(pcm)
+        best_wall = min(best_wall, time.perf_counter() - w0)
+        best_cpu = min(best_cpu, time.process_time() - c0)
+    frames = len(pcm) // BLOCK
+    audio_s = len(pcm) / SR
+    print(f"{name:<22}{frames / best_wall:>14,.0f}{best_cpu / frames * 1e6:>12.1f}{100 * best_cpu / audio_s:>9.3f}%")
+
+
+def synthetic_speech(seconds: float, rng) -> np.ndarray:
+    """Utterances of harmonic 'syllables' (varying pitch/formants) separated by silence."""
+    out = np.zeros(int(seconds * SR), dtype=np.float64)
+    pos = int(rng.uniform(0.5, 1.5) * SR)
+    while pos < len(out) - SR:
+        for _ in range(rng.integers(3, 14)):
+            n = int(rng.uniform(0.1, 0.25) * SR)
+            t = np.arange(n) / SR
+            f0, f1, f2 = rng.uniform(90, 220), rng.uniform(300, 900), rng.uniform(900, 2500)
+            syl = sum((np.exp(-((h * f0 - f1) / 150) ** 2) + 0.6 * np.exp(-((h * f0 - f2) / 250) ** 2) + 0.02)
+                      * np.sin(2 * np.pi * h * f0 * t) for h in range(1, int(4000 / f0)))
+            syl *= np.hanning(n) ** 0.3 * rng.uniform(1500, 6000) / np.abs(syl).max()
+            end = min(len(out), pos + n)
+            out[pos:end] = syl[:end - pos]
+            pos = end + int(rng.uniform(0.0, 0.08) * SR)
+        pos += int(rng.uniform(0.5, 2.5) * SR)
+    return out
+
+
+def labels(clean: np.ndarray) -> np.ndarray:
+    e = EnergyVAD(BLOCK, 900, adaptive=False).energies(clean.astype(np.int16)).copy()
+    return e >= max(50.0, e.max() * 0.05)   # within 26 dB of the loudest frame
+
+
+def noise(kind: str, n: int, rng) -> np.ndarray:
+    t = np.arange(n) / SR
+    if kind == "quiet":
+        return rng.normal(0, 40, n)
+    if kind == "noisy":
+        return rng.normal(0, 300, n) + 200 * np.sin(2 * np.pi * 60 * t)
+    brown = np.cumsum(rng.normal(0, 1, n))
+    brown -= np.convolve(brown, np.ones(800) / 800, mode="same")   # keep it zero-mean
+    return brown / brown.std() * 900 + rng.normal(0, 300, n)        # "loud fan"
+
+
+def detect(name: str, pcm: np.ndarray) -> tuple[np.ndarray, float, str]:
+    """Per-frame speech decisions, fed one live block at a time; returns (decisions, cpu_s, note)."""
+    k = len(pcm) // BLOCK
+    out = np.zeros(k, dtype=bool)
+    note = ""
+    c0 = time.process_time()
+    if name == "amplitude":
+        vad = EnergyVAD(BLOCK, 900)
+        for i in range(k):
+            out[i] = vad.classify(pcm[i * BLOCK:(i + 1) * BLOCK])[2][0]
+    elif name == "webrtcvad":
+        vad = webrtcvad.Vad(2)
+        for i in range(k):
+            frame = pcm[i * BLOCK:(i + 1) * BLOCK]
+            out[i] = vad.is_speech(frame.tobytes(), sample_rate=SR)
+    else:
+        vad = HybridVAD(BLOCK, 900)
+        for i in range(k):
+            out[i] = vad.classify(pcm[i * BLOCK:(i + 1) * BLOCK])[2][0]
+        note = f"webrtc on {vad.vad_calls / vad.frames:.0%} of frames, mode {vad.mode}"
+    return out, time.process_time() - c0, note
+
+
+def compare(clean: np.ndarray) -> None:
+    ref = labels(clean)
+    rng = np.random.default_rng(1)
+    names = ["amplitude"] + (["webrtcvad", "hybrid"] if WEBRTC_AVAILABLE else [])
+    if not WEBRTC_AVAILABLE:
+        print("(webrtcvad not installed: only the amplitude detector is measured)")
+    print(f"{len(clean) / SR:.0f}s track, {ref.mean():.0%} speech frames")
+    print(f"{'noise':<8}{'detector':<11}{'CPU':>8}{'accuracy':>10}{'false+':>8}{'missed':>8}  notes")
+    for kind in ("quiet", "noisy", "fan"):
+        pcm = (clean + noise(kind, len(clean), rng)).clip(-32768, 32767).astype(np.int16)
+        for name in names:
+            hyp, cpu_s, note = detect(name, pcm)
+            hyp = hyp[:len(ref)]
+            fa = (hyp & ~ref).sum() / max(1, (~ref).sum())
+            miss = (~hyp & ref).sum() / max(1, ref.sum())
+            print(f"{kind:<8}{name:<11}{100 * cpu_s / (len(pcm) / SR):>7.3f}%{(hyp == ref).mean():>10.1%}"
+                  f"{fa:>8.1%}{miss:>8.1%}  {note}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="VAD benchmarks")
+    ap.add_argument("--wav", default=str(ROOT / "test.wav"))
+    ap.add_argument("--seconds", type=float, default=120.0)
+    ap.add_argument("--speech", default=None, help="clean mono speech recording for the detector comparison")
+    args = ap.parse_args()
+
+    speech = to_pcm16(*read_wav(args.wav))
+    n = int(args.seconds * SR)
+    rng = np.random.default_rng(0)
+    pcm = np.resize(np.concatenate([speech, np.zeros(SR, np.int16)]), n)
+    pcm = (pcm + rng.normal(0, 200, n)).clip(-32768, 32767).astype(np.int16)
+
+    print(f"{args.seconds:.0f}s of audio, {n // BLOCK} blocks of 30 ms")
+    print(f"{'path':<22}{'frames/s':>14}{'us/frame':>12}{'CPU':>10}")
+    run("old per-block loop", legacy, pcm)
+    run("EnergyVAD live (x1)", lambda x: batched(x, 1), pcm)
+    run("EnergyVAD backlog (x32)", lambda x: batched(x, 32), pcm)
+
+    print()
+    if args.speech:
+        clean = to_pcm16(*read_wav(args.speech)).astype(np.float64)
+    else:
+        clean = synthetic_speech(min(args.seconds, 60.0), np.random.default_rng(0))
+    compare(clean)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""False-accept / false-reject rates of the on-device wake spotter on a labelled clip set.
+
+    python scripts/eval_wake.py --clips DIR [--templates logs/wake_templates.npz]
+    python scripts/eval_wake.py --clips DIR --enroll ENROLL_DIR --word agent
+
+DIR holds WAV files in two sub-folders: wake/ (utterances that start with the
+wake word) and other/ (coughs, TV, side conversation - anything that should
+not be uploaded). Templates come from a --enroll-wake run, or are built from
+ENROLL_DIR (the wake word spoken alone). --save-threshold writes the
+equal-error threshold back into the templates file.
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from agent.speech.audio_prep import read_wav, to_pcm16
+from agent.speech.wake_spotter import WakeSpotter, evaluate
+
+
+def load_dir(path: Path) -> list:
+    return [to_pcm16(*read_wav(str(p))) for p in sorted(path.glob("*.wav"))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Wake spotter FAR/FRR evaluation")
+    ap.add_argument("--clips", required=True, help="folder with wake/ and other/ WAV sub-folders")
+    ap.add_argument("--templates", default=str(ROOT / "logs" / "wake_templates.npz"))
+    ap.add_argument("--enroll", default=None, help="folder of wake-word-only WAVs to enroll from instead")
+    ap.add_argument("--word", default="agent")
+    ap.add_argument("--threshold", type=float, default=None, help="override the stored threshold")
+    ap.add_argument("--save-threshold", action="store_true",
+                    help="store the equal-error threshold in --templates")
+    args = ap.parse_args()
+
+    if args.enroll:
+        spotter = WakeSpotter.enroll(args.word, load_dir(Path(args.enroll)))
+    else:
+        spotter = WakeSpotter.load(args.templates)
+    if args.threshold is not None:
+        spotter.threshold = args.threshold
+
+    clips = Path(args.clips)
+    positives, negatives = load_dir(clips / "wake"), load_dir(clips / "other")
+    if not positives and not negatives:
+        sys.exit(f"no WAV files under {clips}/wake or {clips}/other")
+    t0 = time.time()
+    r = evaluate(spotter, positives, negatives)
+    per_clip_ms = (time.time() - t0) * 1000 / (len(positives) + len(negatives))
+
+    print(f"wake word '{spotter.word}', {len(spotter.templates)} templates, "
+          f"{r['positives']} wake / {r['negatives']} other clips, {per_clip_ms:.1f} ms per check")
+    print(f"threshold {r['threshold']:.3f}: FAR {r['far']:.1%}  FRR {r['frr']:.1%}  "
+          f"(uploads avoided: {1 - r['far']:.1%} of non-wake clips)")
+    print(f"equal error rate {r['eer']:.1%} at threshold {r['eer_threshold']:.3f}")
+    step = max(1, len(r["sweep"]) // 10)
+    print(f"{'threshold':>10}{'FAR':>8}{'FRR':>8}")
+    for thr, far, frr in r["sweep"][::step]:
+        print(f"{thr:>10.3f}{far:>8.1%}{frr:>8.1%}")
+
+    if args.save_threshold:
+        spotter.threshold = r["eer_threshold"]
+        spotter.save(args.templates)
+        print(f"saved threshold {spotter.threshold:.3f} to {args.templates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is importable
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class FakeAssemblyAI:
+    """In-process stand-in for the AssemblyAI REST API (upload + transcript)."""
+
+    def __init__(self):
+        self.uploads: list[bytes] = []
+        self.upload_headers: list[dict] = []
+        self.requests: list[tuple[str, str]] = []
+        self.connections: set = set()
+        self.text = "agent status"
+        self.polls_until_done = 1  # GETs answered "processing" before "completed"
+        self.job_delay = None      # optional fn(job number) -> seconds before that job can complete
+        self.deleted: list[str] = []
+        self._polls: dict[str, int] = {}
+        self._submitted: dict[str, float] = {}
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, obj, code=200):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                fake.connections.add(self.client_address)
+                fake.requests.append(("POST", self.path))
+                n = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(n)
+                if self.path == "/v2/upload":
+                    fake.uploads.append(body)
+                    fake.upload_headers.append(dict(self.headers))
+                    return self._json({"upload_url": f"https://cdn.example/{len(fake.uploads)}"})
+                if self.path == "/v2/transcript":
+                    tid = f"t{len(fake._polls) + 1}"
+                    fake._polls[tid] = 0
+                    fake._submitted[tid] = time.time()
+                    return self._json({"id": tid, "status": "queued"})
+                self._json({"error": "not found"}, 404)
+
+            def do_GET(self):
+                fake.connections.add(self.client_address)
+                fake.requests.append(("GET", self.path))
+                tid = self.path.rsplit("/", 1)[-1].split("?")[0]
+                if tid not in fake._polls:
+                    return self._json({"transcripts": []})
+                fake._polls[tid] += 1
+                ready = fake.job_delay is None or \
+                    time.time() - fake._submitted[tid] >= fake.job_delay(int(tid[1:]))
+                if ready and fake._polls[tid] > fake.polls_until_done:
+                    return self._json({"id": tid, "status": "completed", "text": fake.text})
+                self._json({"id": tid, "status": "processing"})
+
+            def do_DELETE(self):
+                fake.requests.append(("DELETE", self.path))
+                tid = self.path.rsplit("/", 1)[-1]
+                fake.deleted.append(tid)
+                self._json({"id": tid, "status": "error"})
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def fake_aai():
+    srv = FakeAssemblyAI()
+    yield srv
+    srv.close()
+
+
+class FakeWordPress:
+    """In-process stand-in for the WordPress REST posts endpoint (ACF fields included).
+
+    posts are dicts with id, date, modified and acf; GET /wp-json/wp/v2/posts
+    honours per_page, page, modified_after, orderby/order, _fields and status
+    (anything but publish needs an Authorization header). With
+    etags=True responses carry an ETag and If-None-Match gets a 304. down=True
+    answers 503. POST /wp-json/wp/v2/posts creates a post, and
+    /wp-json/batch/v1 runs several (unless batch=False); statuses, if set,
+    gives the HTTP status of each following create (default 201).
+    """
+
+    def __init__(self, etags: bool = False):
+        self.posts: list[dict] = []
+        self.requests: list[tuple[str, str, dict]] = []
+        self.etags = etags
+        self.down = False
+        self.delay_s = 0.0
+        self.batch = True
+        self.statuses: list[int] = []
+        self.created: list[dict] = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body=b"", headers=None):
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                from urllib.parse import parse_qs, urlsplit
+                u = urlsplit(self.path)
+                q = {k: v[-1] for k, v in parse_qs(u.query).items()}
+                fake.requests.append(("GET", self.path, dict(self.headers)))
+                if fake.delay_s:
+                    time.sleep(fake.delay_s)
+                if fake.down:
+                    return self._send(503, b'{"code": "unavailable"}', {"content-type": "application/json"})
+                if u.path != "/wp-json/wp/v2/posts":
+                    return self._send(404)
+                statuses = q.get("status", "publish").split(",")
+                if statuses != ["publish"] and "Authorization" not in self.headers:
+                    return self._send(400, b'{"code": "rest_invalid_param"}', {"content-type": "application/json"})
+                posts = [p for p in fake.posts if p.get("status", "publish") in statuses
+                         and (not q.get("modified_after") or p["modified"] > q["modified_after"])]
+                key = q.get("orderby", "date")
+                posts.sort(key=lambda p: (p[key], p["id"]), reverse=q.get("order", "desc") == "desc")
+                total = len(posts)
+                per_page, page = int(q.get("per_page", 10)), int(q.get("page", 1))
+                posts = posts[(page - 1) * per_page:page * per_page]
+                if "_fields" in q:
+                    keep = q["_fields"].split(",")
+                    posts = [{k: v for k, v in p.items() if k in keep} for p in posts]
+                body = json.dumps(posts).encode()
+                headers = {"content-type": "application/json", "X-WP-Total": str(total),
+                           "X-WP-TotalPages": str(max(1, -(-total // per_page)))}
+                if fake.etags:
+                    etag = '"%x"' % (hash(body) & 0xFFFFFFFF)
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, b"", {"ETag": etag})
+                    headers["ETag"] = etag
+                self._send(200, body, headers)
+
+            def _create(self, body):
+                status = fake.statuses.pop(0) if fake.statuses else 201
+                if status != 201:
+                    return status, {"code": "rest_error", "data": {"status": status}}
+                now = time.strftime("%Y-%m-%dT%H:%M:%S")
+                post = fake.add_post(1000 + len(fake.created), body.get("acf") or {}, date=now)
+                post.update(title={"rendered": body.get("title", "")}, status=body.get("status", "publish"))
+                fake.created.append(post)
+                return 201, post
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("content-length") or 0)) or b"{}")
+                fake.requests.append(("POST", self.path, dict(self.headers)))
+                if fake.down:
+                    return self._send(503, b'{"code": "unavailable"}', {"content-type": "application/json"})
+                if self.path == "/wp-json/wp/v2/posts":
+                    status, out = self._create(body)
+                elif self.path == "/wp-json/batch/v1" and fake.batch:
+                    results = [self._create(r.get("body") or {}) for r in body.get("requests", [])]
+                    status, out = 207, {"responses": [{"status": s, "body": b, "headers": {}} for s, b in results]}
+                else:
+                    status, out = 404, {"code": "rest_no_route"}
+                self._send(status, json.dumps(out).encode(), {"content-type": "application/json"})
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def add_post(self, post_id: int, acf: dict, date: str = "2024-01-01T00:00:00", modified: str = None) -> dict:
+        post = {"id": post_id, "title": {"rendered": f"Brain {post_id}"}, "date": date,
+                "modified": modified or date, "acf": acf}
+        self.posts = [p for p in self.posts if p["id"] != post_id] + [post]
+        return post
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def fake_wp(monkeypatch):
+    srv = FakeWordPress()
+    from agent.memory import wp_client
+    monkeypatch.setattr(wp_client, "WP_BASE_URL", srv.base_url)
+    monkeypatch.setattr(wp_client, "_auth_headers", lambda: {})
+    yield srv
+    srv.close()
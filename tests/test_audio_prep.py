@@ -0,0 +1,49 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("requests")
+
+from agent.speech.audio_prep import decode_mulaw, encode_mulaw_wav, frame_energies, prepare_upload, trim_silence
+
+SR = 16000
+BLOCK = 480
+
+
+def _utterance():
+    tone = (4000 * np.sin(np.arange(SR) / 5)).astype(np.int16)
+    return np.concatenate([np.zeros(SR // 2, np.int16), tone, np.zeros(SR, np.int16)])
+
+
+def test_trim_keeps_padded_speech_region():
+    pcm = _utterance()
+    e = frame_energies(pcm, BLOCK)
+    out = trim_silence(pcm, e, 900, BLOCK, SR)
+    assert out.base is pcm or out.base is pcm.base  # a view, not a copy
+    # 1 s of speech + <= 100 ms lead pad + <= 200 ms tail pad (frame aligned)
+    assert SR <= len(out) <= SR + int(0.3 * SR) + 2 * BLOCK
+    # nothing above threshold -> untouched
+    assert len(trim_silence(pcm, e, 10 ** 6, BLOCK, SR)) == len(pcm)
+
+
+def test_mulaw_wav_halves_bytes_and_round_trips():
+    pcm = _utterance()
+    data = encode_mulaw_wav(pcm, SR)
+    assert data[:4] == b"RIFF" and struct.unpack("<H", data[20:22])[0] == 7
+    assert len(data) < pcm.nbytes // 2 + 100
+    back = decode_mulaw(np.frombuffer(data[58:58 + len(pcm)], dtype=np.uint8)).astype(float)
+    x = pcm.astype(float)
+    snr = 10 * np.log10((x ** 2).sum() / ((x - back) ** 2).sum())
+    assert snr > 30
+
+
+def test_prepare_upload_reports_savings():
+    pcm = _utterance()
+    payload, stats = prepare_upload(pcm, SR, BLOCK, threshold=900, encoding="mulaw")
+    assert isinstance(payload, bytes)
+    assert stats["raw_bytes"] == 44 + pcm.nbytes
+    assert stats["saved_bytes"] == stats["raw_bytes"] - stats["sent_bytes"] > pcm.nbytes // 2
+    assert stats["trimmed_ms"] >= 1000
+    payload, stats = prepare_upload(pcm, SR, BLOCK, threshold=900, encoding="wav", trim=False)
+    assert payload is pcm and stats["saved_bytes"] == 0
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+from agent.memory.brain_cache import BrainCache
+
+
+def _cache(**kw):
+    kw.setdefault("timeout_s", 2)
+    return BrainCache(**kw)
+
+
+def _params(fake_wp):
+    return [path.split("?", 1)[1] for _, path, _ in fake_wp.requests]
+
+
+def test_snapshot_is_parsed_once_and_unchanged_posts_are_not_modified(fake_wp):
+    fake_wp.add_post(1, {"agent_emotions": '{"happiness": 0.8}'}, modified="2024-01-01T10:00:00")
+    c = _cache()
+    assert c.refresh() == "changed"
+    assert c.get()["acf"]["agent_emotions"] == {"happiness": 0.8}
+    assert c.refresh() == "not_modified"
+    assert "modified_after=2024-01-01T10:00:00" in _params(fake_wp)[-1]
+    fake_wp.add_post(1, {"agent_emotions": '{"happiness": 0.2}'}, modified="2024-01-01T11:00:00")
+    assert c.refresh() == "changed"
+    assert c.get()["acf"]["agent_emotions"] == {"happiness": 0.2}
+    s = c.stats()
+    assert (s["refreshes"], s["changed"], s["not_modified"], s["version"]) == (3, 2, 1, 2)
+    assert s["age_s"] is not None and s["breaker"] == "closed"
+
+
+def test_etag_gets_a_304(fake_wp):
+    fake_wp.etags = True
+    fake_wp.add_post(1, {"agent_personality": "calm"})
+    c = _cache()
+    c.refresh()
+    assert c.refresh() == "not_modified"
+    assert fake_wp.requests[-1][2].get("If-None-Match")
+
+
+def test_an_edited_older_post_does_not_replace_the_latest(fake_wp):
+    fake_wp.add_post(1, {"agent_personality": "old"}, date="2024-01-01T00:00:00")
+    fake_wp.add_post(2, {"agent_personality": "new"}, date="2024-02-01T00:00:00")
+    c = _cache()
+    c.refresh()
+    fake_wp.add_post(1, {"agent_personality": "old, edited"}, date="2024-01-01T00:00:00", modified="2024-03-01T00:00:00")
+    c.refresh()
+    assert c.get()["id"] == 2
+
+
+def test_breaker_opens_and_serves_the_last_snapshot(fake_wp):
+    fake_wp.add_post(1, {"agent_personality": "calm"})
+    c = _cache(failures_to_open=2, cooldown_s=0.3)
+    c.refresh()
+    fake_wp.down = True
+    assert [c.refresh(), c.refresh(), c.refresh()] == ["error", "error", "open"]
+    n = len(fake_wp.requests)
+    t0 = time.perf_counter()
+    assert c.get()["acf"]["agent_personality"] == "calm"
+    assert time.perf_counter() - t0 < 0.05
+    s = c.stats()
+    assert (s["breaker"], s["breaker_opens"], s["skipped"], s["failures"]) == ("open", 1, 1, 2)
+    time.sleep(0.35)
+    assert c.breaker() == "half-open"
+    fake_wp.down = False
+    assert c.refresh() == "not_modified" and c.breaker() == "closed"
+    assert len(fake_wp.requests) == n + 1
+
+
+def test_turns_do_not_wait_for_a_slow_wordpress(fake_wp):
+    fake_wp.add_post(1, {"agent_personality": "calm"})
+    c = _cache(refresh_s=0.05, first_wait_s=0.2)
+    c.start()
+    try:
+        assert c.get()["id"] == 1
+        fake_wp.delay_s = 1.0
+        time.sleep(0.1)
+        t0 = time.perf_counter()
+        assert c.get()["id"] == 1
+        assert time.perf_counter() - t0 < 0.05
+    finally:
+        fake_wp.delay_s = 0
+        c.stop()
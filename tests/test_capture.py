@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent.speech.capture import CaptureStream, RingBuffer
+
+
+def test_ring_buffer_wraps_and_reads_by_absolute_index():
+    ring = RingBuffer(10)
+    ring.write(np.arange(7, dtype=np.int16))
+    ring.write(np.arange(7, 15, dtype=np.int16))
+    assert ring.written == 15
+    assert ring.oldest == 5
+    assert ring.read(5, 15).tolist() == list(range(5, 15))
+    assert ring.read(12, 20).tolist() == [12, 13, 14]  # clipped to what exists
+
+
+def test_ring_buffer_rejects_overwritten_samples():
+    ring = RingBuffer(8)
+    ring.write(np.arange(20, dtype=np.int16))
+    assert ring.read(12, 20).tolist() == list(range(12, 20))
+    with pytest.raises(BufferError):
+        ring.read(4, 10)
+
+
+def test_reader_resumes_after_previous_utterance():
+    cap = CaptureStream(sr=16000, block_ms=30, seconds=1)
+    block = np.ones((480, 1), dtype=np.int16)
+
+    def feed():
+        for i in range(10):
+            cap._callback(block * i, 480, None, None)
+
+    t = threading.Thread(target=feed)
+    t.start()
+    with cap.reader() as r:
+        first, _ = r.read(480)
+        second, _ = r.read(480)
+    t.join()
+    assert first[0, 0] == 0 and second[0, 0] == 1
+    assert cap.consumed == 960
+    # Audio captured while the "turn" was being processed is not lost
+    with cap.reader() as r:
+        nxt, overflowed = r.read(480)
+    assert nxt[0, 0] == 2 and not overflowed
+
+
+def test_reader_times_out_without_audio():
+    cap = CaptureStream(sr=16000)
+    assert cap.wait_for(1, timeout=0.05) is False
+
+
+def test_reader_reports_available_samples():
+    cap = CaptureStream(sr=16000, block_ms=30, seconds=1)
+    for _ in range(3):
+        cap._callback(np.zeros((480, 1), dtype=np.int16), 480, None, None)
+    with cap.reader(start=0) as r:
+        assert r.read_available == 1440
+        r.read(960)
+        assert r.read_available == 480
@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from agent.memory import dialogue_index
+from agent.memory.dialogue_index import DialogueIndex, parse_dialogue, parse_knowledge
+
+ACF = {
+    "agent_emotions": "calm",
+    "agent_dialogue": "what's your name => I'm Agent Brain.\nhow are you => Running smoothly, thanks.\n"
+                      "Q: who made you\nA: The Solution Desk.",
+    "agent_knowledge": "office hours: The office is open 9 to 5, Monday to Friday.\n"
+                       "wifi password: The guest Wi-Fi password is on the fridge.",
+}
+
+
+@pytest.fixture
+def index():
+    idx = DialogueIndex()
+    assert idx.update(ACF)
+    return idx
+
+
+def test_parsers_accept_json_and_plain_text():
+    assert parse_dialogue('[{"prompt": "hi", "reply": "Hello."}]') == [("hi", "Hello.")]
+    assert parse_dialogue({"hi": "Hello."}) == [("hi", "Hello.")]
+    assert parse_dialogue("hi | Hello.\nno separator here\nQ: bye\nA: See you.") == [("hi", "Hello."), ("bye", "See you.")]
+    assert parse_knowledge({"hours": "9 to 5"}) == [("hours", "9 to 5")]
+    assert parse_knowledge("hours: 9 to 5\n\nThe printer is upstairs.") == [("hours", "9 to 5"),
+                                                                         ("The printer is upstairs.", "The printer is upstairs.")]
+
+
+@pytest.mark.parametrize("text,reply", [
+    ("What's your name?", "I'm Agent Brain."),
+    ("what is your name", "I'm Agent Brain."),
+    ("who made you", "The Solution Desk."),
+    ("what's the wifi password", "The guest Wi-Fi password is on the fridge."),
+])
+def test_close_matches_answer_from_the_post(index, text, reply):
+    hit = index.lookup(text)
+    assert hit is not None and hit.reply == reply
+
+
+@pytest.mark.parametrize("text", ["summarize the repo", "what's the weather", "name a good book"])
+def test_everything_else_goes_to_the_model(index, text):
+    assert index.lookup(text) is None
+
+
+def test_thresholds_and_margin():
+    idx = DialogueIndex(min_score=1.01)
+    idx.update(ACF)
+    assert idx.lookup("what's your name") is None
+    idx = DialogueIndex(min_margin=0.5)
+    idx.update({"agent_dialogue": "turn on the light => On.\nturn off the light => Off."})
+    assert idx.lookup("turn on the light") is None       # too close to a prompt with another reply
+
+
+def test_update_is_incremental(index, monkeypatch):
+    assert not index.update(ACF)                         # unchanged post: nothing to do
+    calls = []
+    real = dialogue_index.ngrams
+    monkeypatch.setattr(dialogue_index, "ngrams", lambda t, *a: calls.append(t) or real(t, *a))
+    changed = dict(ACF, agent_dialogue=ACF["agent_dialogue"] + "\ngood night => Sleep well.")
+    assert index.update(changed)
+    assert calls == ["good night"]                       # only the new entry is tokenized
+    assert index.lookup("good night").reply == "Sleep well."
+    s = index.stats()
+    assert (s["entries"], s["builds"], s["lookups"], s["hits"]) == (6, 2, 1, 1)
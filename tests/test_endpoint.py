@@ -0,0 +1,78 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent.speech.endpoint import MAX_TAIL_MS, MIN_TAIL_MS, Endpointer, voicing
+
+SR = 16000
+BLOCK = 480
+
+
+def _voiced(amp=5000.0, f0=130.0):
+    t = np.arange(BLOCK) / SR
+    return (amp * np.sin(2 * np.pi * f0 * t)).astype(np.int16)
+
+
+def _noise(amp=300.0, seed=0):
+    return (np.random.default_rng(seed).standard_normal(BLOCK) * amp).astype(np.int16)
+
+
+def _rms(x):
+    return float(np.sqrt(np.mean(x.astype(np.float32) ** 2)))
+
+
+def _run(ep, speech_blocks, tail, threshold=900.0, pause_blocks=0):
+    """Feed speech (optionally split by a pause) then tail frames; return ms of silence at endpoint."""
+    ep.begin()
+    frames = [_voiced()] * speech_blocks
+    if pause_blocks:
+        frames = frames[:speech_blocks // 2] + [_noise()] * pause_blocks + frames[speech_blocks // 2:]
+    for f in frames + tail + [_noise()] * 100:
+        if ep.update(f, _rms(f), _rms(f) >= threshold):
+            ep.end()
+            return ep.last_ms
+    return None
+
+
+def test_voicing_separates_tone_from_noise():
+    assert voicing(_voiced()) > 0.8
+    assert voicing(_noise(3000)) < 0.4
+
+
+def test_lone_wake_word_waits_full_tail():
+    assert MAX_TAIL_MS <= _run(Endpointer(), speech_blocks=15, tail=[]) < MAX_TAIL_MS + 30
+
+
+def test_trailing_off_ends_sooner_than_fixed_tail():
+    ep = Endpointer()
+    for _ in range(3):  # learn short mid-utterance pauses (~150 ms)
+        _run(ep, speech_blocks=60, tail=[], pause_blocks=5)
+    fade = [(_noise(a, seed=i)) for i, a in enumerate((6000, 4000, 2500, 1500))]
+    ms = _run(ep, speech_blocks=60, tail=fade)
+    assert MIN_TAIL_MS <= ms < MAX_TAIL_MS
+    assert ep.stats()["avg_ms"] < MAX_TAIL_MS
+
+
+def test_premature_cut_raises_hangover():
+    ep = Endpointer()
+    for _ in range(3):
+        _run(ep, speech_blocks=60, tail=[], pause_blocks=5)
+    before = ep.hangover_ms()
+    ep.begin()
+    ep.end(end_pos=SR * 10)
+    ep.begin(onset_pos=SR * 10 + SR // 4)   # speech resumed 250 ms after the cut
+    assert ep.premature == 1 and ep.hangover_ms() > before
+    assert ep.stats()["premature_rate"] == pytest.approx(1 / ep.count, abs=1e-3)
+
+
+def test_length_cap_is_not_an_endpoint():
+    ep = Endpointer()
+    _run(ep, speech_blocks=60, tail=[])
+    before = (ep.count, ep.total_ms, ep.hangover_ms())
+    ep.begin()
+    for _ in range(20):
+        ep.update(_voiced(), 5000.0, True)
+    ep.abort()                              # cut at max_utter_ms while still talking
+    ep.begin(onset_pos=SR // 10)
+    assert (ep.count, ep.total_ms, ep.hangover_ms()) == before
+    assert ep.premature == 0 and ep.stats()["forced"] == 1
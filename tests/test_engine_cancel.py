@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from agent import decision_engine
+from agent.decision_engine import CANCELLED_REPLY, TIMEOUT_REPLY, EnginePool, GenerationCancelled
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    p = EnginePool("echo", size=1, timeout_s=10)
+    p.start()
+    monkeypatch.setattr(decision_engine, "_pool", p)
+    yield p
+    p.stop()
+
+
+def _in_thread(fn):
+    out = {}
+
+    def run():
+        t0 = time.time()
+        try:
+            out["result"] = fn()
+        except Exception as e:
+            out["error"] = e
+        out["s"] = time.time() - t0
+
+    t = threading.Thread(target=run)
+    t.start()
+    return t, out
+
+
+def test_cancel_aborts_the_request_and_the_next_turn_starts_warm(pool):
+    t, out = _in_thread(lambda: pool.ask("__sleep 5"))
+    time.sleep(0.3)
+    assert decision_engine.cancel() == 1
+    t.join(2)
+    assert isinstance(out.get("error"), GenerationCancelled) and out["s"] < 1.5
+    t0 = time.time()
+    assert pool.ask("next") == "echo: next"
+    assert time.time() - t0 < 3
+    w = pool.status()["workers"][0]
+    assert w["cancels"] == 1 and w["errors"] == 0
+    assert decision_engine.cancel() == 0        # nothing in flight
+
+
+def test_cancelled_and_overdue_turns_get_short_replies(pool):
+    t, out = _in_thread(lambda: decision_engine._request("__sleep 5", None))
+    time.sleep(0.3)
+    decision_engine.cancel()
+    t.join(2)
+    assert out["result"] == {"ok": False, "cancelled": True, "text": CANCELLED_REPLY}
+    t0 = time.time()
+    assert decision_engine._request("__sleep 5", None, deadline_s=0.5)["text"] == TIMEOUT_REPLY
+    assert time.time() - t0 < 1.5
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a shell script as a stand-in goose CLI")
+def test_cancel_kills_a_running_goose(tmp_path, monkeypatch):
+    goose = tmp_path / "goose"
+    goose.write_text("#!/bin/sh\nsleep 5\necho late\n")
+    goose.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    t, out = _in_thread(lambda: decision_engine.goose_prompt("hello", timeout=10))
+    time.sleep(0.3)
+    assert decision_engine.cancel() == 1
+    t.join(2)
+    assert isinstance(out.get("error"), GenerationCancelled) and out["s"] < 1.5
+
+
+def _gone(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] == "Z"    # exited, not reaped yet
+    except FileNotFoundError:
+        return True
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="checks the goose process through /proc")
+def test_a_killed_goose_worker_takes_its_goose_run_with_it(tmp_path, monkeypatch):
+    from agent.engine_worker import GooseBackend
+    pidfile = tmp_path / "goose.pid"
+    goose = tmp_path / "goose"
+    goose.write_text(f"#!/bin/sh\necho $$ > {pidfile}\nexec sleep 30\n")
+    goose.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    with pytest.raises(Exception, match="timed out"):
+        GooseBackend().ask("hello", timeout=0.3)
+    pidfile.unlink()
+    p = EnginePool("goose", size=1, timeout_s=10)
+    p.start()
+    try:
+        with pytest.raises(TimeoutError):
+            p.ask("hello", timeout=1)
+        pid = int(pidfile.read_text())
+        deadline = time.time() + 2
+        while not _gone(pid) and time.time() < deadline:
+            time.sleep(0.05)
+        assert _gone(pid)
+    finally:
+        p.stop()
+
+
+def test_windows_kills_the_process_tree(monkeypatch):
+    runs, killed = [], []
+
+    class Proc:
+        pid = 4242
+
+        def kill(self):
+            killed.append(True)
+
+    monkeypatch.setattr(decision_engine.os, "name", "nt")
+    monkeypatch.setattr(decision_engine.subprocess, "run",
+                        lambda args, **kw: runs.append(args) or type("R", (), {"returncode": len(runs) - 1})())
+    decision_engine._kill_tree(Proc())
+    assert runs == [["taskkill", "/T", "/F", "/PID", "4242"]] and not killed
+    decision_engine._kill_tree(Proc())                   # taskkill failed: kill proc itself at least
+    assert killed == [True]
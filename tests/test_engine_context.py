@@ -0,0 +1,125 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+from agent import decision_engine
+from agent.decision_engine import ConversationSession, EnginePool, EngineWorker
+
+
+class StubOllama:
+    """Non-streaming /api/generate that keeps context like Ollama: one token per word.
+
+    Prefill cost is proportional to the words it has to read: the whole prompt
+    without a context, only the new prompt when the context is passed back.
+    """
+
+    def __init__(self):
+        self.bodies = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+                stub.bodies.append(body)
+                words = len(body["prompt"].split())
+                context = list(body.get("context") or []) + [1] * (words + 2)
+                data = json.dumps({"response": "Okay then.", "done": True, "context": context,
+                                   "prompt_eval_count": words,
+                                   "prompt_eval_duration": words * 1_000_000}).encode()
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def test_context_is_carried_and_prefill_stays_flat(monkeypatch):
+    stub = StubOllama()
+    monkeypatch.setenv("OLLAMA_HOST", stub.url)
+    w = EngineWorker("ollama")
+    sess = ConversationSession(budget_tokens=10_000)
+    try:
+        w.start()
+        for i in range(6):
+            prompt, context = sess.build(f"USER: tell me about item number {i}\nASSISTANT:")
+            sess.record(f"item {i}", w.request(prompt, timeout=10, context=context))
+    finally:
+        w.kill()
+        stub.close()
+    turns = [b for b in stub.bodies if b["prompt"]]
+    assert "context" not in turns[0]
+    assert all(len(b["context"]) > len(a.get("context", [])) for a, b in zip(turns, turns[1:]))
+    s = sess.stats()
+    assert s["turns"] == 6 and s["compactions"] == 0
+    assert len(set(s["recent_prompt_eval_ms"])) == 1      # the same cost on turn 6 as on turn 1
+    assert s["context_tokens"] == len(turns[-1]["context"]) + s["last_prompt_eval_tokens"] + 2
+
+
+def test_over_budget_context_is_replaced_by_a_recap():
+    sess = ConversationSession(budget_tokens=50, keep_turns=2)
+    for i in range(5):
+        prompt, context = sess.build(f"USER: question {i}\nASSISTANT:")
+        assert prompt.startswith("USER:") and len(context) == 10 * i
+        sess.record(f"question {i}", {"text": f"answer {i}", "context": [0] * (10 * (i + 1))})
+    prompt, context = sess.build("USER: question 5\nASSISTANT:")
+    assert context == [] and sess.compactions == 1
+    recap, *recent = prompt.split("\n", 1)
+    assert "question 0" in recap and "question 3" not in recap
+    assert "USER: question 3\nASSISTANT: answer 3\nUSER: question 4\nASSISTANT: answer 4" in recent[0]
+    assert prompt.endswith("USER: question 5\nASSISTANT:")
+
+
+def test_respond_continues_the_session_until_reset(monkeypatch):
+    pool = EnginePool("echo", size=1, timeout_s=5)
+    monkeypatch.setattr(decision_engine, "_pool", pool)
+    monkeypatch.setattr(decision_engine, "_session", ConversationSession(budget_tokens=1000))
+    monkeypatch.setattr(decision_engine, "RESPONSE_CACHE_SIZE", 0)
+    try:
+        assert decision_engine.respond("hello there").endswith("USER: hello there\nASSISTANT:")
+        first = decision_engine.session_stats()["context_tokens"]
+        decision_engine.respond("and again")
+        s = decision_engine.session_stats()
+        assert s["turns"] == 2 and s["context_tokens"] > first
+        assert s["last_prompt_eval_tokens"] == 4           # only the new turn was read
+        decision_engine.reset_session()
+        assert decision_engine.session_stats()["context_tokens"] == 0
+    finally:
+        pool.stop()
+
+
+def test_overlapping_turns_generate_side_by_side_and_are_both_kept(monkeypatch):
+    both, calls = threading.Barrier(2, timeout=2), []
+
+    def request(prompt, on_chunk, context=None, deadline_s=None):
+        calls.append(list(context or []))
+        both.wait()                                      # only returns once the other turn is generating too
+        return {"ok": True, "text": f"reply {len(calls)}", "context": [1] * 10}
+
+    monkeypatch.setattr(decision_engine, "_request", request)
+    monkeypatch.setattr(decision_engine, "_session", ConversationSession(budget_tokens=1000))
+    monkeypatch.setattr(decision_engine, "RESPONSE_CACHE_SIZE", 0)
+    threads = [threading.Thread(target=decision_engine.respond, args=(f"question {i}",)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(3)
+    s = decision_engine.session_stats()
+    assert s["turns"] == 2 and s["overlaps"] == 1 and s["context_tokens"] == 0
+    prompt, _ = decision_engine._session.build("USER: next\nASSISTANT:")
+    assert "question 0" in prompt and "question 1" in prompt
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+from agent.decision_engine import EngineWorker
+from agent.engine_worker import SentenceChunker
+
+TOKENS = ["Sure", ".", " The", " lights", " are", " on", ".", " Anything", " else", "?"]
+
+
+class StubOllama:
+    """Streams TOKENS as NDJSON, one chunked-encoding chunk per token, delay seconds apart."""
+
+    def __init__(self, delay=0.05):
+        self.bodies = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _chunk(self, obj):
+                data = (json.dumps(obj) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+                stub.bodies.append(body)
+                self.send_response(200)
+                self.send_header("content-type", "application/x-ndjson")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+                tokens = TOKENS if body["prompt"] else []
+                for tok in tokens:
+                    time.sleep(delay)
+                    self._chunk({"response": tok, "done": False})
+                self._chunk({"response": "", "done": True})
+                self.wfile.write(b"0\r\n\r\n")
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def test_chunker_splits_sentences_but_not_decimals():
+    c = SentenceChunker(max_chars=40)
+    out = []
+    for tok in ["It is 3.5 ", "degrees. ", "Next\n", "a " * 30]:
+        out += c.feed(tok)
+    assert out[:2] == ["It is 3.5 degrees.", "Next"] and len(out[2]) <= 42
+    assert c.flush() and c.flush() == []
+
+
+def test_sentences_arrive_before_generation_finishes(monkeypatch):
+    stub = StubOllama(delay=0.05)
+    monkeypatch.setenv("OLLAMA_HOST", stub.url)
+    w = EngineWorker("ollama")
+    got = []
+    try:
+        w.start()
+        t0 = time.time()
+        text = w.ask("turn on the lights", timeout=10, on_chunk=lambda c: got.append((c, time.time() - t0)))
+        total = time.time() - t0
+    finally:
+        w.kill()
+        stub.close()
+    assert text == "Sure. The lights are on. Anything else?"
+    assert [c for c, _ in got] == ["Sure.", "The lights are on.", "Anything else?"]
+    assert got[0][1] < total - 0.3                   # first sentence well before the last token
+    assert 30 <= w.last_ttft_ms < 300
+    assert stub.bodies[-1]["stream"] is True and stub.bodies[-1]["keep_alive"]
+
+
+def test_controller_streams_dictate_reply(monkeypatch):
+    from fastapi.testclient import TestClient
+    import agent.server as server
+
+    def fake_handle(text, on_chunk=None):
+        for chunk in ("One.", "Two."):
+            on_chunk(chunk)
+        return {"ok": True, "result": "One. Two."}
+
+    monkeypatch.setattr(server, "AGENT_TOKEN", "")
+    monkeypatch.setattr(server, "AGENT_SIGNING_KEY", b"")
+    monkeypatch.setattr(server.bridge, "handle_text", fake_handle)
+    r = TestClient(server.app).post("/api/command", json={"action": "dictate", "payload": {"text": "hi", "stream": True}})
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert [l.get("chunk") for l in lines[:2]] == ["One.", "Two."]
+    assert lines[-1]["ok"] and lines[-1]["result"] == "One. Two." and lines[-1]["ttft_ms"] is not None
+
+
+@pytest.mark.parametrize("streamed, emitted", [([], ["Sure. The lights are on."]), (["Sure."], ["Sure."])])
+def test_goose_fallback_does_not_repeat_streamed_sentences(monkeypatch, streamed, emitted):
+    from agent import decision_engine
+    from agent.decision_engine import EngineError
+
+    class DroppedPool:
+        backend = "ollama"
+
+        def request(self, prompt, timeout, on_chunk=None, context=None):
+            for c in streamed:
+                on_chunk(c)
+            raise EngineError("connection dropped", True)
+
+    monkeypatch.setattr(decision_engine, "get_pool", lambda: DroppedPool())
+    monkeypatch.setattr(decision_engine, "goose_prompt", lambda prompt, timeout: "Sure. The lights are on.")
+    got = []
+    assert decision_engine.ask("lights", on_chunk=got.append) == "Sure. The lights are on."
+    assert got == emitted
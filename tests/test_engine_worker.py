@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from agent.decision_engine import EngineError, EnginePool, EngineWorker
+
+
+@pytest.fixture
+def pool():
+    p = EnginePool("echo", size=2, timeout_s=5)
+    yield p
+    p.stop()
+
+
+def test_worker_stays_warm_between_turns(pool):
+    assert pool.ask("hello") == "echo: hello"
+    pid = pool.workers[0].status()["pid"] or pool.workers[1].status()["pid"]
+    for i in range(5):
+        assert pool.ask(f"turn {i}") == f"echo: turn {i}"
+    pids = {w.status()["pid"] for w in pool.workers} - {None}
+    assert pid in pids and sum(w.starts for w in pool.workers) <= 2
+
+
+def test_timeout_and_crash_restart_the_worker(pool):
+    with pytest.raises(TimeoutError):
+        pool.ask("__sleep 5", timeout=0.5)
+    with pytest.raises(EngineError):
+        pool.ask("__crash")
+    assert pool.ask("again") == "echo: again"
+    s = pool.status()
+    assert sum(w["timeouts"] for w in s["workers"]) == 1
+    assert sum(w["errors"] for w in s["workers"]) == 2
+    assert sum(w["restarts"] for w in s["workers"]) >= 1
+
+
+def test_pool_serves_turns_in_parallel(pool):
+    pool.start()
+    out = []
+    t0 = time.time()
+    threads = [threading.Thread(target=lambda: out.append(pool.ask("__sleep 0.5"))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(out) == 2 and time.time() - t0 < 0.9
+
+
+def test_ollama_backend_keeps_model_loaded_and_flags_unreachable(monkeypatch):
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+            seen.append(body)
+            out = json.dumps({"response": f" model says {body['prompt']} "}).encode()
+            self.send_response(200)
+            self.send_header("content-length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OLLAMA_HOST", f"http://127.0.0.1:{srv.server_address[1]}")
+    w = EngineWorker("ollama")
+    try:
+        assert w.ask("hi", timeout=10) == "model says hi"
+        assert seen[0]["prompt"] == "" and all(b["keep_alive"] for b in seen)    # warm-up loads the model
+        srv.shutdown()
+        srv.server_close()
+        with pytest.raises(EngineError) as exc:
+            w.ask("hi", timeout=10)
+        assert exc.value.unreachable and w.alive
+    finally:
+        w.kill()
+
+
+
+def test_the_request_timeout_reaches_the_backend_call():
+    import io
+    import requests
+    from agent.config.settings import ENGINE_TIMEOUT_S
+    from agent.engine_worker import OllamaBackend, serve
+    calls = []
+
+    class Session:
+        def post(self, url, timeout, json):
+            calls.append(timeout)
+            raise requests.exceptions.ConnectionError("down")
+
+    backend = OllamaBackend(host="http://127.0.0.1:9")
+    backend._session = Session()
+    backend.warm = lambda: None
+    out = io.StringIO()
+    serve(backend, io.StringIO('{"id": 1, "prompt": "hi", "timeout": 7}\n{"id": 2, "prompt": "hi"}\n'), out)
+    replies = [json.loads(line) for line in out.getvalue().splitlines()][1:]
+    assert calls == [7.0, ENGINE_TIMEOUT_S] and all(r["unreachable"] for r in replies)
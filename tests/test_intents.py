@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from agent.intents import IntentRouter, ROUTER
+
+CORPUS = Path(__file__).resolve().parents[1] / "scripts" / "intent_corpus.txt"
+
+
+@pytest.mark.parametrize("text,intent,slots,kind", [
+    ("agent status", "status", {}, "exact"),
+    ("Status.", "status", {}, "exact"),
+    ("agent what's my status", "status", {}, "fuzzy"),
+    ("reload macro", "reload_macros", {}, "fuzzy"),
+    ("Set the threshold to 1,100.", "set_threshold", {"value": "1100"}, "pattern"),
+    ("history last five", "history", {"n": "5"}, "pattern"),
+    ("set wake word to computer", "set_wake_word", {"word": "computer"}, "pattern"),
+])
+def test_builtins_and_near_misses(text, intent, slots, kind):
+    m = ROUTER.match(text)
+    assert (m.intent, m.slots, m.kind) == (intent, slots, kind)
+
+
+@pytest.mark.parametrize("text", ["git status", "what's the status of my build", "top", "tell me a joke",
+                                  "repeat after me hello world", "stop the server on port 8000"])
+def test_everything_else_goes_to_the_model(text):
+    assert ROUTER.match(text) is None
+
+
+def test_groups_and_fuzzy_switch():
+    assert ROUTER.match("set threshold to 900", group="builtin") is None
+    assert ROUTER.match("status", group="settings") is None
+    assert ROUTER.match("please disable the wake word", group="settings").intent == "disable_wake_word"
+    assert ROUTER.match("please disable the wake word", group="settings", fuzzy=False) is None
+
+
+def test_corpus_routes_as_labelled():
+    for line in CORPUS.read_text(encoding="utf-8").splitlines():
+        if line.strip() and not line.startswith("#"):
+            expected, text = line.split("\t", 1)
+            m = ROUTER.match(text)
+            assert (m.intent if m else "-") == expected, text
+
+
+def test_stats_count_each_command_once():
+    r = IntentRouter()
+    for text in ["status", "stat us", "summarize the repo"]:
+        r.record(r.match(text))
+    s = r.stats()
+    assert (s["commands"], s["builtin"], s["to_model"], s["exact"], s["fuzzy"]) == (3, 2, 1, 1, 1)
+    assert s["hit_rate"] == 0.667 and s["by_intent"] == {"status": 2}
@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+from agent.memory.memory_store import MemoryStore
+
+
+def _post(fake_wp, i, memory, modified, knowledge=""):
+    acf = {"agent_memory": memory, "agent_knowledge": knowledge, "agent_constants": {"n": i}}
+    return fake_wp.add_post(i, acf, date=f"2024-01-{i:02d}T00:00:00", modified=modified)
+
+
+NOTES = ["likes green tea", "walks the dog at seven", "works on the garden shed", "plays chess on Sundays",
+         "is learning Spanish", "backs up the laptop monthly", "prefers short answers"]
+
+
+@pytest.fixture
+def store(fake_wp, tmp_path):
+    for i, note in enumerate(NOTES, 1):
+        _post(fake_wp, i, f"The user {note}.", f"2024-02-01T00:00:{i:02d}")
+    return MemoryStore(str(tmp_path / "memory.db"), page_size=3)
+
+
+def _pages(fake_wp):
+    return [path for _, path, _ in fake_wp.requests]
+
+
+def test_first_sync_pages_through_every_post(store, fake_wp):
+    assert store.sync() == 7
+    assert len(fake_wp.requests) == 3                    # 3 + 3 + 1
+    assert len(store) == 7
+    assert store.latest()[0]["id"] == 7
+    assert store.get(2)["acf"]["agent_constants"] == {"n": 2}
+    assert [v for _, v in store.field("agent_constants", limit=2)] == ['{"n": 7}', '{"n": 6}']
+    assert store.stats()["cursor"] == "2024-02-01T00:00:07"
+
+
+def test_later_syncs_fetch_only_modified_posts(store, fake_wp):
+    store.sync()
+    fake_wp.requests.clear()
+    assert store.sync() == 1                             # the last second is asked again
+    assert "modified_after=2024-02-01T00:00:06" in _pages(fake_wp)[0]
+    _post(fake_wp, 1, "The user now prefers coffee.", "2024-03-01T00:00:00")
+    fake_wp.add_post(8, {"agent_memory": "Meeting on Friday."}, date="2024-01-08T00:00:00",
+                     modified="2024-03-01T00:00:01")
+    fake_wp.requests.clear()
+    assert store.sync() == 3 and len(fake_wp.requests) == 1     # post 7 (overlap), 1 and 8
+    assert store.recall("does the user like coffee") == ["The user now prefers coffee."]
+    assert store.recall("green tea") == []
+    assert len(store) == 8
+
+
+def test_full_sync_drops_deleted_posts_and_a_failed_sync_resumes(store, fake_wp, tmp_path):
+    store.sync()
+    fake_wp.posts = [p for p in fake_wp.posts if p["id"] != 5]
+    store.sync(full=True)
+    assert store.get(5) is None and store.recall("spanish lessons") == []
+    fake_wp.down = True
+    _post(fake_wp, 9, "Note 9", "2024-04-01T00:00:00")
+    assert store.sync() == 0 and store.stats()["failures"] == 1
+    fake_wp.down = False
+    reopened = MemoryStore(str(tmp_path / "memory.db"))  # cursor survives a restart
+    assert reopened.sync() == 2 and reopened.get(9)         # post 7 (overlap) and 9
+
+
+def test_recall_feeds_the_prompt(store, monkeypatch):
+    from agent import decision_engine
+    store.sync()
+    prompts = []
+    monkeypatch.setattr(decision_engine, "_memory", store)
+    monkeypatch.setattr(decision_engine, "_cache", None)
+    monkeypatch.setattr(decision_engine, "RESPONSE_CACHE_SIZE", 0)
+    monkeypatch.setattr(decision_engine, "_session", None)
+    monkeypatch.setattr(decision_engine, "_request",
+                        lambda prompt, on_chunk, *a, **kw: prompts.append(prompt) or {"ok": True, "text": "ok"})
+    decision_engine.respond("let's play chess")
+    assert prompts[0] == "[memory=The user plays chess on Sundays.] USER: let's play chess\nASSISTANT:"
+    assert decision_engine.status()["memory"]["posts"] == 7
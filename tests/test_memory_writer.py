@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+from agent.memory.wp_client import MemoryWriter
+
+
+def _posts(fake_wp):
+    return [p for m, p, _ in fake_wp.requests if m == "POST"]
+
+
+def test_interactions_are_coalesced_into_one_batch(fake_wp):
+    written = []
+    w = MemoryWriter(flush_items=3, flush_s=60, on_written=written.extend)
+    for i in range(7):
+        w.add(f"command {i}", f"reply {i}")
+    assert fake_wp.requests == []                        # add() never touches the network
+    assert w.flush() == 7
+    assert _posts(fake_wp) == ["/wp-json/batch/v1"]      # 3 episodes, one request
+    memory = [p["acf"]["agent_memory"] for p in fake_wp.created]
+    assert [m.count("YOU:") for m in memory] == [3, 3, 1]
+    assert "YOU: command 0\n" in memory[0] and memory[2].endswith("AGENT: reply 6")
+    assert all(p["status"] == "private" for p in fake_wp.created)
+    assert [p["id"] for p in written] == [p["id"] for p in fake_wp.created]
+    s = w.stats()
+    assert (s["queued"], s["written"], s["posts"], s["flushes"]) == (0, 7, 3, 1)
+
+
+def test_failures_are_retried_with_backoff_and_rejections_dropped(fake_wp):
+    w = MemoryWriter(flush_items=2, backoff_s=0.2)
+    for i in range(6):
+        w.add(f"c{i}", f"r{i}")
+    fake_wp.statuses = [201, 503, 400]
+    assert w.flush() == 2
+    s = w.stats()
+    assert (s["queued"], s["rejected"], s["retries"]) == (2, 2, 1) and s["retry_in_s"] > 0
+    assert not w._due()                                  # waiting out the backoff
+    fake_wp.down = True
+    time.sleep(0.3)
+    assert w.flush() == 0 and w.stats()["queued"] == 2   # whole request failed: kept, backoff doubles
+    assert w.stats()["retry_in_s"] > 0.25
+    fake_wp.down = False
+    assert w.flush() == 2
+    assert "YOU: c2" in fake_wp.created[-1]["acf"]["agent_memory"]     # the 503 episode, in order
+
+
+def test_sites_without_batch_get_one_post_per_episode(fake_wp):
+    fake_wp.batch = False
+    w = MemoryWriter(flush_items=1)
+    w.add("a", "b")
+    w.add("c", "d")
+    assert w.flush() == 2
+    assert _posts(fake_wp) == ["/wp-json/batch/v1", "/wp-json/wp/v2/posts", "/wp-json/wp/v2/posts"]
+    assert w.stats()["batch"] is False
+
+
+def test_background_flush_on_size_and_age(fake_wp):
+    w = MemoryWriter(flush_items=2, flush_s=0.2)
+    w.start()
+    try:
+        w.add("a", "b")
+        t0 = time.perf_counter()
+        w.add("c", "d")                                  # size threshold: flushed right away
+        assert time.perf_counter() - t0 < 0.01
+        deadline = time.time() + 2
+        while w.stats()["written"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert w.stats()["written"] == 2
+        w.add("e", "f")                                  # age threshold
+        time.sleep(0.5)
+        assert w.stats()["written"] == 3
+    finally:
+        w.stop()
+    assert len(fake_wp.created) == 2 and not any(p.get("status") == "publish" for p in fake_wp.created)
+
+
+def test_private_episodes_sync_to_other_mirrors_but_not_the_brain(fake_wp, monkeypatch):
+    from agent.memory import wp_client
+    from agent.memory.memory_store import MemoryStore
+    fake_wp.add_post(1, {"agent_personality": "calm"})
+    w = MemoryWriter(flush_items=5)
+    w.add("remember the boiler code", "Noted.")
+    assert w.flush() == 1
+    monkeypatch.setattr(wp_client, "_auth_headers", lambda: {"Authorization": "Bearer t"})
+    other = MemoryStore()                                # another machine's mirror
+    assert other.sync(full=True) == 2 and other.sync(full=True) == 2
+    assert other.recall("boiler code") and "status=publish,private" in fake_wp.requests[-1][1]
+    assert wp_client.fetch_brain_post()[1]["id"] == 1
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+requests = pytest.importorskip("requests")
+
+from agent.speech.assemblyai import AssemblyAIClient
+from agent.speech.completion import FixedPolling
+from agent.speech.offline_queue import OfflineQueue, describe, is_unreachable
+
+
+def _pcm(seconds=0.5):
+    return (np.sin(np.arange(int(16000 * seconds)) / 10) * 8000).astype(np.int16)
+
+
+def test_entries_survive_restart_in_order_and_compactly(tmp_path):
+    q = OfflineQueue(str(tmp_path))
+    for i in range(3):
+        q.put(_pcm(), 0.5, created=1000.0 + i)
+    q.put(b"RIFF....WAVEfmt ", 0.2)
+    (tmp_path / "00000009_0000000000000_0.wav.tmp").write_bytes(b"partial")
+    again = OfflineQueue(str(tmp_path))
+    assert [it.seq for it in again._items] == [1, 2, 3, 4]
+    assert again._items[0].created == 1000.0 and again._items[0].audio_s == 0.5
+    assert len(again._items[0].read()) < _pcm().nbytes // 2 + 100        # 8-bit mu-law
+    assert not list(tmp_path.glob("*.tmp"))
+    assert again.put(_pcm(), 0.5).seq == 5
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    q = OfflineQueue(str(tmp_path), max_age_s=60)
+    q.put(_pcm(), 0.5, created=time.time() - 120)
+    q.put(_pcm(), 0.5)
+    results, drained = q.replay(lambda it: f"cmd {it.seq}")
+    assert drained and results[0][1] == "cmd 2" and len(results) == 1
+    assert q.stats()["expired"] == 1 and not list(tmp_path.iterdir())
+
+
+def test_replay_is_parallel_ordered_and_stops_while_unreachable(tmp_path):
+    q = OfflineQueue(str(tmp_path), batch=4)
+    for _ in range(6):
+        q.put(_pcm(), 0.5)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def stt(item):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05 * (7 - item.seq))        # later items finish first
+        with lock:
+            active[0] -= 1
+        if item.seq == 5:
+            raise requests.exceptions.ConnectionError("down")
+        return f"cmd {item.seq}"
+
+    results, drained = q.replay(stt)
+    assert [t for _, t in results] == ["cmd 1", "cmd 2", "cmd 3", "cmd 4"]
+    assert not drained and len(q) == 2 and peak[0] > 1
+    assert describe(q.stats()).startswith("2 commands waiting for connection")
+    results, drained = q.replay(lambda it: f"cmd {it.seq}")
+    assert [t for _, t in results] == ["cmd 5", "cmd 6"] and drained
+    assert describe(q.stats()) == ""
+
+
+def test_network_drop_is_queueable_and_replays_against_server(tmp_path, fake_aai):
+    dead = AssemblyAIClient(api_key="k", base_url="http://127.0.0.1:9")
+    with pytest.raises(requests.exceptions.RequestException) as exc:
+        dead.transcribe_pcm(_pcm(), 16000, deadline_s=2)
+    assert is_unreachable(exc.value)
+    q = OfflineQueue(str(tmp_path))
+    q.put(_pcm(), 0.5)
+    live = AssemblyAIClient(api_key="k", base_url=fake_aai.base_url)
+    live.completion = FixedPolling(50)
+    results, drained = q.replay(lambda it: live.transcribe_bytes(it.read(), audio_s=it.audio_s))
+    assert drained and [t for _, t in results] == ["agent status"]
+    assert fake_aai.uploads[0][20:22] == b"\x07\x00"     # uploaded the stored mu-law WAV as-is
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from agent.speech.pipeline import BargeIn, TurnPipeline
+
+
+def test_turns_complete_in_order_while_the_next_is_captured():
+    done, release = [], threading.Event()
+
+    def gen(x):
+        release.wait()
+        time.sleep(0.05)
+        done.append(x)
+
+    p = TurnPipeline([("stt", lambda x: x * 10), ("gen", gen)]).start()
+    capture = threading.Thread(target=lambda: [p.submit(i) for i in range(4)])
+    capture.start()
+    capture.join(1)
+    assert not capture.is_alive() and done == []     # capture was not held up by generation
+    release.set()
+    p.join()
+    p.stop()
+    assert done == [0, 10, 20, 30]
+    st = p.stats()["stages"]
+    assert st["gen"]["count"] == 4 and st["gen"]["max_wait_ms"] >= 50 and st["gen"]["depth"] == 0
+
+
+def test_full_queues_block_the_producer():
+    release = threading.Event()
+    p = TurnPipeline([("stt", lambda x: x), ("gen", lambda x: release.wait())], depth=1).start()
+    for i in range(4):      # in gen, queued for gen, held by stt (waiting for room), queued for stt
+        p.submit(i)
+    blocked = threading.Thread(target=p.submit, args=(4,))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(1)
+    p.join()
+    assert not blocked.is_alive() and p.stats()["submit_blocked_ms"] >= 100
+
+
+def test_dropped_and_failed_items_do_not_stop_the_pipeline():
+    out = []
+
+    def stt(x):
+        if x == 1:
+            raise RuntimeError("stt down")
+        return None if x == 2 else x
+
+    p = TurnPipeline([("stt", stt), ("gen", out.append)]).start()
+    for i in range(4):
+        p.submit(i, reraise=False)
+    p.join()
+    st = p.stats()["stages"]["stt"]
+    assert out == [0, 3] and st["errors"] == 1 and st["dropped"] == 1
+
+
+def test_a_failing_stt_stage_raises_from_the_next_submit():
+    out = []
+
+    def stt(x):
+        if x == 0:
+            raise ConnectionError("stt unreachable")
+        return x
+
+    p = TurnPipeline([("stt", stt), ("gen", out.append)]).start()
+    p.submit(0)
+    p.join()
+    with pytest.raises(ConnectionError, match="stt unreachable"):
+        p.submit(1)     # the new turn is still queued
+    p.join()
+    p.submit(2)     # reported once
+    p.join()
+    p.stop()
+    assert out == [1, 2] and p.stats()["stages"]["stt"]["errors"] == 1
+
+
+def test_inline_mode_runs_sequentially():
+    calls = []
+    p = TurnPipeline([("stt", lambda x: calls.append(("stt", x)) or x), ("gen", lambda x: calls.append(("gen", x)))],
+                     inline=True).start()
+    p.submit(1)
+    assert calls == [("stt", 1), ("gen", 1)]
+
+
+def test_a_command_during_generation_cancels_the_reply_and_runs_next():
+    cancelled, ran = threading.Event(), []
+    barge = BargeIn(lambda: cancelled.set() or 1)
+
+    def stt(cmd):
+        barge.check(wake_word="agent")
+        return cmd
+
+    def gen(cmd):
+        with barge.generation():
+            if cmd == "long reply" and cancelled.wait(5):   # the engine call returns once cancelled
+                cmd += " (cancelled)"
+        ran.append(cmd)
+
+    p = TurnPipeline([("stt", stt), ("gen", gen)]).start()
+    p.submit("long reply")
+    while not barge.generating.is_set():
+        time.sleep(0.01)
+    p.submit("what time is it")
+    p.join()
+    p.stop()
+    assert cancelled.is_set() and barge.count == 1
+    assert ran == ["long reply (cancelled)", "what time is it"]
+    assert not barge.check(wake_word="agent")            # nothing generating: just queued
+    assert not BargeIn(None).check(wake_word="agent")
@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import agent.speech.capture as capture_mod
+from agent.speech.capture import CaptureStream
+from agent.speech.resample import PolyphaseResampler, resample
+
+
+def _tone(freq, rate, seconds=1.0, amp=10000.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amp * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+@pytest.mark.parametrize("rate", [44100, 48000])
+def test_chunked_stream_matches_one_call(rate):
+    x = _tone(440, rate)
+    whole = PolyphaseResampler(rate).process(x)
+    r = PolyphaseResampler(rate)
+    parts = np.concatenate([r.process(x[i:i + 997]) for i in range(0, len(x), 997)])
+    assert np.array_equal(whole, parts)
+
+
+@pytest.mark.parametrize("rate", [44100, 48000])
+def test_keeps_speech_band_and_rejects_aliases(rate):
+    y = resample(_tone(1000, rate), rate)
+    assert len(y) == 16000
+    ref = 10000 * np.sin(2 * np.pi * 1000 * np.arange(len(y)) / 16000)
+    err = (y - ref)[200:-200]
+    assert 10 * np.log10(np.mean(ref[200:-200] ** 2) / np.mean(err ** 2)) > 60
+    alias = resample(_tone(12000, rate), rate)[200:-200].astype(np.float64)
+    assert np.sqrt(np.mean(alias ** 2)) < 10000 * 1e-3    # > 60 dB down
+
+
+class _FakeStream:
+    def __init__(self, samplerate, blocksize, callback, **kw):
+        self.samplerate, self.blocksize, self.callback = samplerate, blocksize, callback
+
+    def start(self):
+        pass
+
+
+class _FakeSd:
+    InputStream = _FakeStream
+
+    @staticmethod
+    def query_devices(device=None, kind=None):
+        return {"default_samplerate": 48000.0}
+
+
+def test_capture_opens_at_native_rate_and_fills_ring_at_16k(monkeypatch):
+    monkeypatch.setattr(capture_mod, "sd", _FakeSd)
+    cap = CaptureStream(sr=16000, block_ms=30).start()
+    assert cap.device_rate == 48000 and cap._stream.blocksize == 1440
+    for _ in range(10):
+        cap._callback(_tone(1000, 48000, 0.03).reshape(-1, 1), 1440, None, None)
+    assert cap.position == 4800
+    fixed = CaptureStream(sr=16000, native_rate=False).start()
+    assert fixed.device_rate == 16000 and fixed._stream.samplerate == 16000
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from agent import decision_engine
+from agent.decision_engine import EnginePool
+from agent.response_cache import ResponseCache, cache_key
+
+
+def test_lru_eviction_and_ttl():
+    c = ResponseCache(max_items=2, ttl_s=0.2)
+    c.put("a", "A", 100)
+    c.put("b", "B", 100)
+    assert c.get("a") == "A"           # a is now the most recent
+    c.put("c", "C", 100)
+    assert c.get("b") is None and c.get("a") == "A" and c.get("c") == "C"
+    time.sleep(0.25)
+    assert c.get("a") is None
+    s = c.stats()
+    assert (s["hits"], s["misses"], s["evictions"], s["expired"], s["saved_ms"]) == (3, 2, 1, 1, 300)
+
+
+def test_key_ignores_case_spacing_and_punctuation_but_not_persona():
+    assert cache_key("Summarize  the repo.") == cache_key("summarize the repo")
+    assert cache_key("summarize the repo", persona="pirate") != cache_key("summarize the repo")
+    assert cache_key("summarize the repo", mood="calm") != cache_key("summarize the repo", mood="happy")
+
+
+def test_disk_store_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.json")
+    ResponseCache(path=path).put("k", "reply", 1200)
+    ResponseCache(ttl_s=0, path=path).put("old", "gone", 1)
+    c = ResponseCache(path=path)
+    assert c.get("k") == "reply" and c.get("old") is None
+
+
+def test_bypass_phrase():
+    c = ResponseCache()
+    assert c.split_bypass("no cache, summarize the repo") == ("summarize the repo", True)
+    assert c.split_bypass("summarize the repo no cache.") == ("summarize the repo", True)
+    assert c.split_bypass("is there no caching here") == ("is there no caching here", False)
+
+
+def test_respond_answers_repeats_from_the_cache(monkeypatch):
+    pool = EnginePool("echo", size=1, timeout_s=5)
+    cache = ResponseCache()
+    monkeypatch.setattr(decision_engine, "_pool", pool)
+    monkeypatch.setattr(decision_engine, "_session", None)
+    monkeypatch.setattr(decision_engine, "_cache", cache)
+    try:
+        first = decision_engine.respond("summarize the repo", persona="dev")
+        requests = pool.workers[0].requests
+        chunks = []
+        assert decision_engine.respond("Summarize the repo.", persona="dev", on_chunk=chunks.append) == first
+        assert chunks == [first] and pool.workers[0].requests == requests
+        decision_engine.respond("no cache summarize the repo", persona="dev")
+        assert pool.workers[0].requests == requests + 1
+    finally:
+        pool.stop()
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["bypassed"], s["size"]) == (1, 1, 1, 1)
+
+
+def test_follow_ups_skip_the_cache_and_hits_join_the_session(monkeypatch):
+    from agent.decision_engine import ConversationSession
+    prompts = []
+    monkeypatch.setattr(decision_engine, "_request", lambda prompt, on_chunk, *a, **kw:
+                        prompts.append(prompt) or {"ok": True, "text": f"reply {len(prompts)}", "context": [1, 2]})
+    monkeypatch.setattr(decision_engine, "_session", ConversationSession(budget_tokens=1000))
+    monkeypatch.setattr(decision_engine, "_cache", ResponseCache())
+    assert decision_engine.respond("what is on today") == "reply 1"
+    assert decision_engine.respond("what is on today") == "reply 2"        # a follow-up: not from the cache
+    decision_engine.reset_session()
+    assert decision_engine.respond("what is on today") == "reply 1"        # fresh session: cached
+    assert decision_engine.session_stats()["turns"] == 1 and len(prompts) == 2
+    decision_engine.respond("and tomorrow")
+    assert prompts[-1].startswith("USER: what is on today\nASSISTANT: reply 1\n")
@@ -0,0 +1,84 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("requests")
+
+from agent.speech import stt_backends
+from agent.speech.audio_prep import read_wav
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class FakeWhisper:
+    loads = 0
+
+    def __init__(self, name, device, compute_type, cpu_threads):
+        FakeWhisper.loads += 1
+        self.kwargs = dict(name=name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        self.calls = []
+
+    def transcribe(self, audio, **kw):
+        self.calls.append((audio, kw))
+        return iter([SimpleNamespace(text=" open "), SimpleNamespace(text="notepad ")]), None
+
+
+def test_read_wav_bundled_sample():
+    x, sr = read_wav(str(ROOT / "test.wav"))
+    assert sr == 44100 and x.dtype == np.float32 and len(x) == 3 * sr
+
+
+def test_local_backend_loads_once_and_reuses_model(monkeypatch):
+    monkeypatch.setattr(stt_backends, "WHISPER_AVAILABLE", True)
+    monkeypatch.setattr(stt_backends, "WhisperModel", FakeWhisper)
+    monkeypatch.setattr(stt_backends, "_backends", {})
+    FakeWhisper.loads = 0
+    be = stt_backends.get_backend("local", threads=2)
+    assert stt_backends.get_backend("local", threads=2) is be
+    pcm = np.full(16000, 16384, dtype=np.int16)
+    assert be.transcribe(pcm) == "open notepad"
+    assert be.transcribe(pcm) == "open notepad"
+    assert FakeWhisper.loads == 1
+    assert be._model.kwargs["cpu_threads"] == 2
+    audio, kw = be._model.calls[0]
+    assert audio.dtype == np.float32 and audio[0] == pytest.approx(0.5)
+    assert kw["beam_size"] == 1
+    assert be.last_timings["audio_ms"] == 1000
+
+
+def test_backend_errors(monkeypatch):
+    monkeypatch.setattr(stt_backends, "WHISPER_AVAILABLE", False)
+    monkeypatch.setattr(stt_backends, "_backends", {})
+    with pytest.raises(RuntimeError):
+        stt_backends.get_backend("local")
+    with pytest.raises(ValueError):
+        stt_backends.get_backend("nope")
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+        self.last_timings = {}
+
+    def transcribe_pcm(self, pcm, sr, deadline_s=None):
+        self.calls.append(("pcm", len(pcm), deadline_s))
+        self.last_timings = {"upload_ms": 1}
+        return "pcm text"
+
+    def transcribe_bytes(self, data, audio_s=0.0, deadline_s=None):
+        self.calls.append(("bytes", audio_s, deadline_s))
+        self.last_timings = {"upload_ms": 2}
+        return "encoded text"
+
+
+def test_assemblyai_backend_takes_pcm_and_encoded_audio():
+    client = FakeClient()
+    be = stt_backends.AssemblyAIBackend(client)
+    assert be.transcribe(np.zeros(1600, dtype=np.int16), deadline_s=5) == "pcm text"
+    assert be.transcribe(b"fLaC", audio_s=1.5) == "encoded text"
+    assert client.calls == [("pcm", 1600, 5), ("bytes", 1.5, None)]
+    assert be.last_timings == {"upload_ms": 2}
+    with pytest.raises(TypeError):
+        stt_backends.SttBackend()
@@ -0,0 +1,49 @@
+import wave
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("requests")
+
+from agent.speech.assemblyai import AssemblyAIClient, PcmWavBody
+
+
+def test_pcm_body_is_valid_wav_without_copying():
+    pcm = (np.arange(1600, dtype=np.int16) - 800) * 20
+    body = PcmWavBody(pcm, 16000)
+    chunk = body.read(8192)
+    assert isinstance(chunk, memoryview)
+    raw = bytes(chunk)
+    while True:
+        chunk = body.read(8192)
+        if not chunk:
+            break
+        assert chunk.obj is memoryview(pcm).cast("B").obj  # a view over the caller's array
+        raw += bytes(chunk)
+    assert len(raw) == len(body) == 44 + pcm.nbytes
+    with wave.open(io.BytesIO(raw)) as wf:
+        assert (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) == (1, 2, 16000)
+        assert np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).tolist() == pcm.tolist()
+
+
+def test_transcribe_pcm_reuses_connection_and_reports_phases(fake_aai):
+    client = AssemblyAIClient(api_key="k", base_url=fake_aai.base_url)
+    pcm = np.zeros(3200, dtype=np.int16)
+    for _ in range(3):
+        assert client.transcribe_pcm(pcm, 16000) == "agent status"
+    assert fake_aai.uploads[0][:4] == b"RIFF" and len(fake_aai.uploads[0]) == 44 + pcm.nbytes
+    assert fake_aai.upload_headers[0].get("Content-Length") == str(44 + pcm.nbytes)
+    # one pooled keep-alive connection serves every request across turns
+    assert len(fake_aai.connections) == 1
+    assert {p for _, p in fake_aai.requests if not p.startswith("/v2/transcript/")} == {"/v2/upload", "/v2/transcript"}
+    t = client.last_timings
+    assert {"bytes", "upload_ms", "submit_ms", "wait_ms", "total_ms", "polls"} <= set(t)
+    assert t["polls"] == 2
+
+
+def test_transcribe_url_deadline(fake_aai):
+    fake_aai.polls_until_done = 100
+    client = AssemblyAIClient(api_key="k", base_url=fake_aai.base_url)
+    with pytest.raises(TimeoutError):
+        client.transcribe_url("https://cdn.example/x", poll_ms=10, deadline_s=0.1)
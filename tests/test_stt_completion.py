@@ -0,0 +1,88 @@
+import importlib
+import itertools
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from agent.speech import completion
+from agent.speech.completion import AdaptivePolling, FixedPolling, LatencyModel, WebhookCompletion, WebhookRegistry
+
+
+def _fetch_sequence(*statuses):
+    it = iter(statuses)
+    calls = []
+
+    def fetch():
+        calls.append(time.time())
+        return {"status": next(it), "text": "ok"}
+
+    return fetch, calls
+
+
+def test_first_check_is_immediate():
+    fetch, calls = _fetch_sequence("completed")
+    t0 = time.time()
+    j, polls = FixedPolling(800).wait(fetch, "t1", 1.0, t0 + 5)
+    assert j["status"] == "completed" and polls == 1
+    assert calls[0] - t0 < 0.05
+
+
+def test_adaptive_schedule_tracks_observed_latency():
+    model = LatencyModel(min_samples=3)
+    for lat in (0.9, 1.0, 1.1, 1.2, 1.5):
+        model.add(1.5, lat)
+    delays = list(itertools.islice(AdaptivePolling(model).delays(1.5), 8))
+    assert delays[0] == pytest.approx(1.1)           # sleep to the median first
+    assert max(delays[1:4]) < 0.5                     # dense checks through the p50..p90 window
+    assert delays[-1] > delays[4]                     # then back off
+    assert max(delays) <= 2.0
+
+
+def test_cold_start_sleeps_only_to_the_predicted_latency():
+    model = LatencyModel(base_s=0.6, rtf=0.25)
+    assert model.quantile(2.0, 0.5) == pytest.approx(1.1) == model.quantile(2.0, 0.1)
+    assert model.quantile(2.0, 0.9) == pytest.approx(1.1 * 1.4)
+    delays = list(itertools.islice(AdaptivePolling(model).delays(2.0), 2))
+    assert delays[0] == pytest.approx(1.1)           # first check at the prior, not 1.5x it
+    assert delays[1] < 0.2
+
+
+def test_deadline_and_cancel():
+    fetch, _ = _fetch_sequence(*(["processing"] * 100))
+    with pytest.raises(TimeoutError):
+        FixedPolling(50).wait(fetch, "t1", 1.0, time.time() + 0.2)
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    fetch, _ = _fetch_sequence(*(["processing"] * 100))
+    t0 = time.time()
+    with pytest.raises(CancelledError):
+        FixedPolling(5000).wait(fetch, "t1", 1.0, time.time() + 10, cancel)
+    assert time.time() - t0 < 1.0
+
+
+def test_webhook_wakes_waiter_before_fallback_poll():
+    reg = WebhookRegistry()
+    strat = WebhookCompletion("https://example/api/stt/webhook", registry=reg, fallback_poll_ms=5000)
+    assert strat.submit_params()["webhook_auth_header_value"] == reg.secret
+    fetch, calls = _fetch_sequence("processing", "completed")
+    threading.Timer(0.2, reg.deliver, args=("t9", {"status": "completed"})).start()
+    t0 = time.time()
+    j, polls = strat.wait(fetch, "t9", 1.0, t0 + 10)
+    assert j["status"] == "completed" and polls == 2
+    assert time.time() - t0 < 1.0
+
+
+def test_webhook_route_requires_secret():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    server = importlib.import_module("agent.server")
+    client = TestClient(server.app)
+    body = {"transcript_id": "abc", "status": "completed"}
+    r = client.post("/api/stt/webhook", json=body)
+    assert r.status_code == 401
+    r = client.post("/api/stt/webhook", json=body,
+                    headers={completion.WEBHOOK_AUTH_HEADER: completion.webhooks.secret})
+    assert r.status_code == 200
+    assert completion.webhooks.wait("abc", 0.1) == body
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from agent.speech.assemblyai import AssemblyAIClient
+from agent.speech.completion import FixedPolling, HedgePolicy
+
+
+def _client(fake, policy=None):
+    client = AssemblyAIClient(api_key="k", base_url=fake.base_url)
+    client.completion = FixedPolling(50)
+    client.hedging = policy
+    return client
+
+
+def test_slow_job_is_hedged_and_loser_deleted(fake_aai):
+    fake_aai.job_delay = lambda n: 3.0 if n == 1 else 0.2     # first job stuck in the tail
+    policy = HedgePolicy(min_delay_s=0.4)
+    for _ in range(5):
+        policy.model.add(1.0, 0.2)         # p90 for 1 s of audio ~0.2 s, so the floor applies
+    client = _client(fake_aai, policy)
+    t0 = time.time()
+    assert client.transcribe_url("https://cdn.example/1", audio_s=1.0) == "agent status"
+    elapsed = time.time() - t0
+    assert 0.5 < elapsed < 1.5
+    assert 350 <= client.last_timings["hedge_ms"] < 700
+    deadline = time.time() + 2
+    while "t1" not in fake_aai.deleted and time.time() < deadline:
+        time.sleep(0.02)
+    assert fake_aai.deleted == ["t1"]
+    s = policy.stats()
+    assert (s["requests"], s["hedged"], s["hedge_wins"], s["hedge_rate"]) == (1, 1, 1, 1.0)
+    assert s["p90_ms"] < 1500
+
+
+def test_fast_jobs_are_not_hedged(fake_aai):
+    policy = HedgePolicy(min_delay_s=0.5)
+    client = _client(fake_aai, policy)
+    for _ in range(3):
+        assert client.transcribe_url("https://cdn.example/1", audio_s=1.0) == "agent status"
+    assert [p for m, p in fake_aai.requests if m == "POST"] == ["/v2/transcript"] * 3
+    assert policy.stats()["hedge_rate"] == 0.0 and not fake_aai.deleted
+
+
+def test_hedge_delay_follows_p90_and_budget_limits_load():
+    policy = HedgePolicy(min_delay_s=0.1, max_rate=0.2)
+    assert policy.delay(1.0) > 1.0                      # prior until there is history
+    for lat in (0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 2.5):
+        policy.record(1.0, lat, hedged=False, hedge_won=False)
+    assert policy.delay(1.0) == pytest.approx(2.5)
+    policy.record(1.0, 1.0, hedged=True, hedge_won=True)
+    assert policy.allow()
+    policy.record(1.0, 1.0, hedged=True, hedge_won=False)
+    policy.record(1.0, 1.0, hedged=True, hedge_won=False)
+    assert not policy.allow()                           # 3 of 13 recent requests already hedged
+    assert policy.stats()["hedge_rate"] == pytest.approx(3 / 13, abs=1e-3)
+
+
+def test_deadline_bounds_hedged_wait(fake_aai):
+    fake_aai.job_delay = lambda n: 10.0
+    client = _client(fake_aai, HedgePolicy(min_delay_s=0.2))
+    t0 = time.time()
+    with pytest.raises(TimeoutError):
+        client.transcribe_url("https://cdn.example/1", audio_s=1.0, deadline_s=0.6)
+    assert time.time() - t0 < 1.2
@@ -0,0 +1,106 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("websockets")
+from websockets.sync.server import serve
+
+from agent.speech.assemblyai import AssemblyAIClient, StreamingSession
+
+
+class FakeStreamingServer:
+    """Minimal stand-in for the AssemblyAI v3 streaming endpoint."""
+
+    def __init__(self):
+        self.audio_bytes = 0
+        self.chunks = 0
+        self.auth = None
+        self.query = None
+        self.connections = 0
+        self.turn = 0
+        self._srv = serve(self._handler, "127.0.0.1", 0)
+        self.url = f"ws://127.0.0.1:{self._srv.socket.getsockname()[1]}/v3/ws"
+        threading.Thread(target=self._srv.serve_forever, daemon=True).start()
+
+    def _handler(self, ws):
+        self.auth = ws.request.headers.get("Authorization")
+        self.connections += 1
+        self.query = ws.request.path
+        ws.send(json.dumps({"type": "Begin", "id": "s1"}))
+        for msg in ws:
+            if isinstance(msg, bytes):
+                self.audio_bytes += len(msg)
+                self.chunks += 1
+                if self.chunks == 1:
+                    ws.send(json.dumps({"type": "Turn", "turn_order": 0, "transcript": "agent",
+                                        "end_of_turn": False, "turn_is_formatted": False}))
+                continue
+            if json.loads(msg).get("type") == "ForceEndpoint":
+                ws.send(json.dumps({"type": "Turn", "turn_order": self.turn, "transcript": f"command {self.turn}",
+                                    "end_of_turn": True, "turn_is_formatted": False}))
+                ws.send(json.dumps({"type": "Turn", "turn_order": self.turn, "transcript": f"Command {self.turn}.",
+                                    "end_of_turn": True, "turn_is_formatted": True}))
+                self.turn += 1
+                continue
+            if json.loads(msg).get("type") == "Terminate":
+                ws.send(json.dumps({"type": "Turn", "turn_order": 0, "transcript": "Agent, status.",
+                                    "end_of_turn": True, "turn_is_formatted": True}))
+                ws.send(json.dumps({"type": "Termination"}))
+                return
+
+    def close(self):
+        self._srv.shutdown()
+
+
+@pytest.fixture
+def server():
+    srv = FakeStreamingServer()
+    yield srv
+    srv.close()
+
+
+def test_streaming_partials_and_final(server):
+    partials = []
+    client = AssemblyAIClient(api_key="k", streaming_url=server.url)
+    sess = client.stream(16000, on_partial=partials.append).start()
+    frame = bytes(960)  # 30 ms of int16 silence at 16 kHz
+    for _ in range(10):
+        sess.push(frame)
+    text = sess.finish(timeout=5)
+    assert text == "Agent, status."
+    assert partials == ["agent"]
+    assert server.audio_bytes == 10 * 960
+    assert server.chunks == 5  # 30 ms frames are coalesced into 60 ms chunks
+    assert server.auth == "k"
+    assert "sample_rate=16000" in server.query
+    assert "connect_ms" in sess.timings
+
+
+def test_streaming_connect_failure_raises():
+    client = AssemblyAIClient(api_key="k", streaming_url="ws://127.0.0.1:9/v3/ws")
+    sess = client.stream(16000).start()
+    sess.push(bytes(960))
+    with pytest.raises(RuntimeError):
+        sess.finish(timeout=5)
+
+
+def test_one_connection_carries_many_utterances(server):
+    client = AssemblyAIClient(api_key="k", streaming_url=server.url)
+    sess = client.stream(16000).start()
+    texts = []
+    for _ in range(3):
+        for _ in range(4):
+            sess.push(bytes(960))
+        texts.append(sess.end_utterance(timeout=5))
+    assert texts == ["Command 0.", "Command 1.", "Command 2."]
+    assert server.connections == 1 and sess.alive
+    assert "connect_ms" not in sess.timings          # later utterances skip the handshake
+
+
+def test_idle_session_closes_itself(server):
+    sess = StreamingSession("k", server.url, 16000, idle_s=0.2).start()
+    sess.push(bytes(960))
+    assert sess.end_utterance(timeout=5) == "Command 0."
+    sess._done.wait(3)
+    assert not sess.alive
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent.speech.capture import RingBuffer
+from agent.speech.utterance import UtteranceBuffer
+
+
+def _blocks(n, size=480):
+    return [np.full(size, i, dtype=np.int16) for i in range(n)]
+
+
+def test_append_returns_views_of_one_preallocated_array():
+    buf = UtteranceBuffer(480 * 10)
+    stored = [buf.append(b) for b in _blocks(4)]
+    audio = buf.view()
+    assert len(audio) == 4 * 480 and audio[480] == 1
+    assert all(np.shares_memory(s, audio) for s in stored)
+    assert buf.stats()["allocations"] == 1 and not buf.full
+
+
+def test_cap_drops_samples_beyond_max():
+    buf = UtteranceBuffer(1000)
+    for b in _blocks(4):
+        buf.append(b)
+    assert buf.full and len(buf.view()) == 1000
+    assert buf.view()[-1] == 2
+
+
+def test_spills_to_disk_beyond_memory_capacity(tmp_path):
+    buf = UtteranceBuffer(480 * 100, spill_samples=480 * 3, spill_dir=str(tmp_path))
+    for b in _blocks(10):
+        buf.append(b)
+    assert buf.capacity == 480 * 3 and os.path.exists(buf.path)
+    audio = buf.view()
+    assert len(audio) == 4800 and np.array_equal(audio[::480], np.arange(10))
+    assert buf.stats()["spilled_bytes"] == 4800 * 2
+    del audio
+    buf.close()
+    assert not os.path.exists(buf.path)
+
+
+def test_a_still_mapped_spill_file_is_removed_later(tmp_path, monkeypatch):
+    from agent.speech import utterance
+    buf = UtteranceBuffer(480 * 10, spill_samples=480, spill_dir=str(tmp_path))
+    for b in _blocks(3):
+        buf.append(b)
+    audio = buf.view()
+    real_remove = os.remove
+
+    def mapped(path):                                    # what Windows does while audio maps the file
+        raise PermissionError(path)
+
+    monkeypatch.setattr(utterance.os, "remove", mapped)
+    buf.close()
+    assert os.path.exists(buf.path) and audio[480] == 1
+    monkeypatch.setattr(utterance.os, "remove", real_remove)
+    del audio
+    UtteranceBuffer(10).close()                          # any later close() retries
+    assert not os.path.exists(buf.path) and not utterance._unlink_pending
+
+
+def test_ring_reads_straight_into_reserved_space():
+    ring = RingBuffer(2000)
+    ring.write(np.arange(1500, dtype=np.int16))
+    buf = UtteranceBuffer(1000)
+    chunk = ring.read(100, 700, out=buf.reserve(600))
+    assert np.shares_memory(chunk, buf.view()) and buf.view()[0] == 100 and len(buf) == 600
@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent.speech.vad import MIN_START, WEBRTC_AVAILABLE, EnergyVAD, HybridVAD
+
+BLOCK = 480
+
+
+def _noise(seconds, rms, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(16000 * seconds)) * rms).astype(np.int16)
+
+
+def _feed(vad, pcm, blocks_per_call=1):
+    step = BLOCK * blocks_per_call
+    for off in range(0, len(pcm) - step + 1, step):
+        vad.classify(pcm[off:off + step])
+
+
+def test_energies_match_per_block_rms_without_reallocating():
+    vad = EnergyVAD(BLOCK, 900, adaptive=False)
+    pcm = _noise(0.3, 2000)
+    ref = np.sqrt((pcm[:10 * BLOCK].astype(np.float64).reshape(10, BLOCK) ** 2).mean(axis=1))
+    batch = vad.energies(pcm)
+    assert np.allclose(batch, ref, rtol=1e-4)
+    one = vad.energies(pcm[:BLOCK])
+    assert one[0] == pytest.approx(ref[0], rel=1e-4)
+    assert np.shares_memory(batch, one)  # same preallocated buffer
+    assert vad.start_threshold == vad.stop_threshold == 900
+
+
+def test_thresholds_follow_noise_floor():
+    vad = EnergyVAD(BLOCK, 900)
+    assert vad.start_threshold == pytest.approx(900)       # seeded from the configured value
+    _feed(vad, _noise(6, 300))
+    quiet = vad.start_threshold
+    assert 500 < quiet < 1500 and vad.stop_threshold < quiet
+    _feed(vad, _noise(6, 1500, seed=1), blocks_per_call=8)  # fan switched on
+    assert vad.start_threshold > 2 * quiet
+    _feed(vad, np.zeros(16000 * 6, np.int16))               # digital silence
+    assert vad.start_threshold == MIN_START
+    vad.set_threshold(1100)                                 # "set threshold to 1100" pins it
+    _feed(vad, _noise(6, 300))
+    assert not vad.adaptive and vad.start_threshold == 1100
+
+
+def _voiced(seconds, amp=4000.0):
+    t = np.arange(int(16000 * seconds)) / 16000
+    x = sum(np.sin(2 * np.pi * h * 140 * t) / h for h in range(1, 20))
+    return (x / np.abs(x).max() * amp).astype(np.int16)
+
+
+@pytest.mark.skipif(not WEBRTC_AVAILABLE, reason="webrtcvad not installed")
+def test_hybrid_only_calls_webrtcvad_above_the_gate():
+    vad = HybridVAD(BLOCK, 900)
+    _feed(vad, _noise(6, 40))                      # quiet room: everything stays under the gate
+    assert vad.vad_calls == 0 and vad.mode == 1
+    e, start, speech = vad.classify(_voiced(0.3))
+    assert vad.vad_calls == 10 and speech.all()
+    _feed(vad, _noise(6, 1500, seed=1), blocks_per_call=8)  # loud fan: stricter webrtcvad
+    assert vad.mode == 3
+    assert vad.stats()["webrtc_share"] < 0.6
@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent.speech.wake_spotter import WakeSpotter, evaluate
+
+SR = 16000
+WAKE = [(500, 1500), (800, 1200), (300, 2300)]   # formant pairs of three 150 ms "syllables"
+OTHER = [(600, 1000), (400, 2000), (700, 1800)]
+
+
+def _say(rng, formants, lead_s=None):
+    """Harmonic 'vowel' sequence with random rate, pitch, loudness and lead-in silence."""
+    f0, stretch = rng.uniform(100, 140), rng.uniform(0.8, 1.25)
+    segs = []
+    for f1, f2 in formants:
+        t = np.arange(int(0.15 * stretch * SR)) / SR
+        seg = np.zeros_like(t)
+        for f in f0 * np.arange(1, 50):
+            if f > 7000:
+                break
+            amp = np.exp(-((f - f1) / 150) ** 2) + 0.7 * np.exp(-((f - f2) / 200) ** 2) + 0.02
+            seg += amp * np.sin(2 * np.pi * f * t + rng.uniform(0, 6))
+        segs.append(seg)
+    x = np.concatenate(segs)
+    x *= rng.uniform(2000, 12000) / np.abs(x).max()
+    lead = rng.uniform(0.05, 0.4) if lead_s is None else lead_s
+    x = np.concatenate([np.zeros(int(lead * SR)), x, np.zeros(SR // 2)])
+    return (x + rng.standard_normal(len(x)) * 50).astype(np.int16)
+
+
+@pytest.fixture(scope="module")
+def spotter():
+    rng = np.random.default_rng(0)
+    return WakeSpotter.enroll("Agent", [_say(rng, WAKE) for _ in range(5)])
+
+
+def test_spotter_separates_wake_word_from_other_speech(spotter):
+    rng = np.random.default_rng(1)
+    # wake word followed by a command vs. reordered syllables, other words and noise bursts
+    positives = [np.concatenate([_say(rng, WAKE), _say(rng, OTHER)]) for _ in range(10)]
+    negatives = ([_say(rng, WAKE[::-1]) for _ in range(5)] + [_say(rng, OTHER) for _ in range(5)]
+                 + [(rng.standard_normal(SR) * 3000).astype(np.int16) for _ in range(3)])
+    r = evaluate(spotter, positives, negatives)
+    assert r["far"] == 0.0 and r["frr"] <= 0.1
+    assert r["eer"] == 0.0
+    assert max(r["pos_scores"]) < min(r["neg_scores"])
+
+
+def test_save_load_round_trip(spotter, tmp_path):
+    path = str(tmp_path / "wake.npz")
+    spotter.save(path)
+    loaded = WakeSpotter.load(path)
+    assert loaded.word == "agent" and loaded.threshold == pytest.approx(spotter.threshold)
+    clip = _say(np.random.default_rng(2), WAKE)
+    assert loaded.check(clip) == spotter.check(clip)
+
+
+def test_enroll_needs_several_clips():
+    rng = np.random.default_rng(3)
+    with pytest.raises(ValueError):
+        WakeSpotter.enroll("agent", [_say(rng, WAKE)])